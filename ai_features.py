@@ -1,54 +1,127 @@
 """
 AI Features Module for Anvesh
-Includes OCR, Object Detection, Face Detection, and Face Matching
+Includes OCR, Object Detection, Face Detection, and Face Matching.
+The AI libraries and the YOLO model are only loaded on first use (or by
+warm_up()), so importing this module is instant. Results are remembered by
+file contents, so identical images and videos are analyzed once
 """
+import functools
 import os
-import cv2
-import numpy as np
-from typing import List, Dict, Optional, Tuple
-import base64
-from PIL import Image
-import io
-import json
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+import content_hash
+from lazy_import import LazyModule, is_installed
+
+# OpenCV is required; the rest are optional. Whether they're installed is
+# checked without importing them.
+if not is_installed("cv2"):
+    raise ImportError("AI features need OpenCV (pip install opencv-python)")
+cv2 = LazyModule("cv2")
+pytesseract = LazyModule("pytesseract")
+face_recognition = LazyModule("face_recognition")
+ultralytics = LazyModule("ultralytics")
+
+TESSERACT_AVAILABLE = pytesseract.available
+FACE_RECOGNITION_AVAILABLE = face_recognition.available
+YOLO_AVAILABLE = ultralytics.available
+
+# Analysis results (and face encodings) remembered, by file contents
+RESULT_CACHE_ENTRIES = 512
 
-# Try to import AI libraries
-try:
-    import pytesseract
-    TESSERACT_AVAILABLE = True
-except ImportError:
-    TESSERACT_AVAILABLE = False
+def by_content(method):
+    """Remember a method's successful results by the contents of its file (its first argument).
 
-try:
-    import face_recognition
-    FACE_RECOGNITION_AVAILABLE = True
-except ImportError:
-    FACE_RECOGNITION_AVAILABLE = False
+    A copy of a file analyzed before, under any path, gets the same result
+    without running the model again.
+    """
+    @functools.wraps(method)
+    def wrapper(self, path: str, *args, **kwargs):
+        digest = content_hash.digests.digest(path) if content_hash.ENABLED else None
+        if digest is None:
+            return method(self, path, *args, **kwargs)
+        key = (method.__name__, digest, args, tuple(sorted(kwargs.items())))
+        cached = self._results.get(key)
+        if cached is not None:
+            content_hash.record_saved("ai", os.path.getsize(path))
+            return cached
+        result = method(self, path, *args, **kwargs)
+        if result.get("success"):
+            self._results.put(key, result)
+        return result
+    return wrapper
 
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
-    YOLO_AVAILABLE = False
+class ContentCache:
+    """A bounded map (least recently used dropped), safe across threads"""
+    
+    def __init__(self, max_entries: int = RESULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
 class AIFeatures:
     """AI-powered features for Anvesh"""
     
     def __init__(self):
-        self.face_encodings_cache = {}
+        self.face_encodings_cache = ContentCache()  # Digest -> face encodings of an image
+        self._results = ContentCache()  # (method, digest, arguments) -> result
         self.yolo_model = None
-        self._load_models()
+        self._yolo_failed = False
+        self._model_lock = threading.Lock()
     
-    def _load_models(self):
-        """Load AI models"""
-        if YOLO_AVAILABLE:
-            try:
-                # Use YOLOv8n (nano) for speed, can be upgraded to YOLOv8s/m/l/x
-                self.yolo_model = YOLO('yolov8n.pt')  # Will download on first use
-            except Exception as e:
-                print(f"Warning: Could not load YOLO model: {e}")
-                self.yolo_model = None
+    def _yolo(self):
+        """The YOLO model, loaded on first use (None if it can't be)"""
+        if self.yolo_model is None and YOLO_AVAILABLE and not self._yolo_failed:
+            with self._model_lock:
+                if self.yolo_model is None and not self._yolo_failed:
+                    try:
+                        # Use YOLOv8n (nano) for speed, can be upgraded to YOLOv8s/m/l/x
+                        self.yolo_model = ultralytics.YOLO('yolov8n.pt')  # Will download on first use
+                    except Exception as e:
+                        print(f"Warning: Could not load YOLO model: {e}")
+                        self._yolo_failed = True
+        return self.yolo_model
     
+    def warm_up(self):
+        """Import the installed AI libraries and load the YOLO model now, so the first request doesn't wait"""
+        for module in (cv2, pytesseract, face_recognition):
+            if module.available:
+                try:
+                    module.load()
+                except ImportError:
+                    pass  # Reported by load(); the feature answers with an error instead
+        self._yolo()
+    
+    def _face_encodings(self, image_path: str) -> list:
+        """Face encodings of an image, computed once per contents"""
+        digest = content_hash.digests.digest(image_path) if content_hash.ENABLED else None
+        if digest is not None:
+            encodings = self.face_encodings_cache.get(digest)
+            if encodings is not None:
+                content_hash.record_saved("ai", os.path.getsize(image_path))
+                return encodings
+        encodings = face_recognition.face_encodings(face_recognition.load_image_file(image_path))
+        if digest is not None:
+            self.face_encodings_cache.put(digest, encodings)
+        return encodings
+    
+    @by_content
     def extract_text_from_image(self, image_path: str) -> Dict:
         """Extract text from image using OCR"""
         if not TESSERACT_AVAILABLE:
@@ -91,6 +164,7 @@ class AIFeatures:
         except Exception as e:
             return {"error": str(e)}
     
+    @by_content
     def extract_text_from_video(self, video_path: str, frame_interval: int = 30) -> Dict:
         """Extract text from video frames using OCR"""
         if not TESSERACT_AVAILABLE:
@@ -138,13 +212,15 @@ class AIFeatures:
         except Exception as e:
             return {"error": str(e)}
     
+    @by_content
     def detect_objects(self, image_path: str, confidence_threshold: float = 0.25) -> Dict:
         """Detect objects in image using YOLO"""
-        if not YOLO_AVAILABLE or self.yolo_model is None:
+        yolo_model = self._yolo()
+        if yolo_model is None:
             return {"error": "YOLO model not available"}
         
         try:
-            results = self.yolo_model(image_path, conf=confidence_threshold)
+            results = yolo_model(image_path, conf=confidence_threshold)
             
             detections = []
             for result in results:
@@ -173,6 +249,7 @@ class AIFeatures:
         except Exception as e:
             return {"error": str(e)}
     
+    @by_content
     def detect_faces(self, image_path: str) -> Dict:
         """Detect faces in image"""
         if not FACE_RECOGNITION_AVAILABLE:
@@ -204,6 +281,7 @@ class AIFeatures:
         except Exception as e:
             return {"error": str(e)}
     
+    @by_content
     def detect_faces_in_video(self, video_path: str, frame_interval: int = 30) -> Dict:
         """Detect faces in video"""
         if not FACE_RECOGNITION_AVAILABLE:
@@ -263,12 +341,9 @@ class AIFeatures:
             return {"error": "Face recognition not available"}
         
         try:
-            # Load and encode faces from both images
-            img1 = face_recognition.load_image_file(image1_path)
-            img2 = face_recognition.load_image_file(image2_path)
-            
-            encodings1 = face_recognition.face_encodings(img1)
-            encodings2 = face_recognition.face_encodings(img2)
+            # Encode faces from both images
+            encodings1 = self._face_encodings(image1_path)
+            encodings2 = self._face_encodings(image2_path)
             
             if len(encodings1) == 0:
                 return {"error": "No faces found in first image"}
@@ -307,8 +382,7 @@ class AIFeatures:
         
         try:
             # Load reference face
-            ref_img = face_recognition.load_image_file(reference_image_path)
-            ref_encodings = face_recognition.face_encodings(ref_img)
+            ref_encodings = self._face_encodings(reference_image_path)
             
             if len(ref_encodings) == 0:
                 return {"error": "No faces found in reference image"}
@@ -324,8 +398,7 @@ class AIFeatures:
                     if Path(file).suffix.lower() in image_extensions:
                         image_path = os.path.join(root, file)
                         try:
-                            img = face_recognition.load_image_file(image_path)
-                            encodings = face_recognition.face_encodings(img)
+                            encodings = self._face_encodings(image_path)
                             
                             for encoding in encodings:
                                 distance = face_recognition.face_distance([ref_encoding], encoding)[0]
@@ -358,8 +431,9 @@ class AIFeatures:
         return {
             "ocr": TESSERACT_AVAILABLE,
             "face_detection": FACE_RECOGNITION_AVAILABLE,
-            "object_detection": YOLO_AVAILABLE and self.yolo_model is not None,
-            "face_matching": FACE_RECOGNITION_AVAILABLE
+            "object_detection": YOLO_AVAILABLE and not self._yolo_failed,
+            "face_matching": FACE_RECOGNITION_AVAILABLE,
+            "models_loaded": self.yolo_model is not None
         }
 
 # Global instance
@@ -26,11 +26,17 @@ a = Analysis(
         'uvicorn.loops.auto',
         'uvicorn.loops.asyncio',
         'uvicorn.loops.uvloop',
-        'docx',
         'openpyxl',
-        'pptx',
+        'openpyxl.styles.numbers',  # Format libraries are imported by name on first use (lazy_import.py)
+        'openpyxl.utils.datetime',
         'PyPDF2',
+        'pypdf',
+        'pymupdf',
+        'fitz',
+        'pypdfium2',
         'aiofiles',
+        'xxhash',
+        'extra_formats',  # Extractor plugin, imported by name from ANVESH_EXTRACTORS
         'cv2',
         'pytesseract',
         'face_recognition',
@@ -1,8 +1,8 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, AsyncGenerator
+from typing import List, Optional, AsyncGenerator, AsyncIterator, Iterable, Iterator, Tuple, Dict, Union
 import os
 import sys
 import asyncio
@@ -11,8 +11,13 @@ import re
 from datetime import datetime
 import json
 import time
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-# Import AI features
+# Import AI features (the AI libraries and models themselves load on first use or at warm-up)
 try:
     from ai_features import ai_features
     AI_FEATURES_AVAILABLE = True
@@ -20,32 +25,43 @@ except ImportError:
     AI_FEATURES_AVAILABLE = False
     ai_features = None
 
-# File type handlers
-try:
-    from docx import Document
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
+from search_index import SearchIndex
+from extraction_cache import ExtractionCache
+from folder_watcher import FolderWatcher
+from text_scanner import scan_text_file
+from file_walker import FileWalker, is_hidden_path
+from file_catalog import FileCatalog
+from result_cache import CachedSearch, ResultCache, folder_key
+from search_history import SearchHistory
+from event_stream import MSGPACK_AVAILABLE, STREAM_FORMATS, StreamCompressor, coalesce_results, encode_event, negotiate_encoding, serialize_results
+from matchers import MATCH_MODES, PatternError, SubstringMatcher, get_matcher, get_matcher_set
+from ranking import Bm25Scorer, TopK
+import metrics
+import profiling
+import content_hash
+from content_hash import ContentGroups, rebase_chunks, record_saved
 
-try:
-    from openpyxl import load_workbook
-    XLSX_AVAILABLE = True
-except ImportError:
-    XLSX_AVAILABLE = False
+# File type handlers by extension/MIME type: Word, Excel and PowerPoint text is streamed straight from
+# the zip parts; modules named in ANVESH_EXTRACTORS (e.g. extra_formats) register more formats
+import extractors
+from extractors import Extractor, PdfPagesExtractor
+DOCX_AVAILABLE = XLSX_AVAILABLE = PPTX_AVAILABLE = True
 
-try:
-    from pptx import Presentation
-    PPTX_AVAILABLE = True
-except ImportError:
-    PPTX_AVAILABLE = False
+# PDF text comes from the fastest installed backend (PyMuPDF, pypdfium2, pypdf or PyPDF2)
+from pdf_text import PdfExtractor, get_backend
+from file_sniffer import PDF_MAGIC
+PDF_AVAILABLE = get_backend() is not None
+import ooxml_text
 
-try:
-    import PyPDF2
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
+# Format libraries and AI models are imported on first use, so the server starts at once.
+# ANVESH_WARMUP_DELAY seconds after startup (once the server is listening) a background
+# thread loads them ahead of the first search; ANVESH_WARMUP=0 turns that off.
+WARMUP = os.environ.get("ANVESH_WARMUP", "1") != "0"
+WARMUP_DELAY = float(os.environ.get("ANVESH_WARMUP_DELAY", "2"))
 
 app = FastAPI(title="Anvesh - Advanced File Search")
+# Request counts and timings per route for /api/metrics
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Helper function to get resource path (works for both script and executable)
 def resource_path(relative_path):
@@ -58,231 +74,322 @@ def resource_path(relative_path):
         base_path = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(base_path, relative_path)
 
+# Helper function to get data file path (history, index...)
+def data_path(filename):
+    """Get path for persistent data files, kept next to the executable or script (or in ANVESH_DATA_DIR)"""
+    if os.environ.get("ANVESH_DATA_DIR"):
+        base_path = os.environ["ANVESH_DATA_DIR"]
+    elif getattr(sys, 'frozen', False):
+        # Running as executable - save data next to the .exe file
+        base_path = os.path.dirname(sys.executable)
+    else:
+        # Running as script - save in script directory
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, filename)
+
 # Mount static files
 static_path = resource_path("static")
 if os.path.exists(static_path):
     app.mount("/static", StaticFiles(directory=static_path), name="static")
 
 class SearchRequest(BaseModel):
-    query: str
+    query: str = ""
     folders: List[str]
+    terms: List[str] = []  # Search for many terms in one pass (used instead of query)
+    exact_match: bool = False  # Whole words only (same as match_mode "whole_word")
+    match_mode: Optional[str] = None  # "substring", "whole_word", "exact" (whole line/cell) or "regex"
+    case_sensitive: bool = False
+    search_filenames: bool = False
+    use_index: bool = True  # Answer from the search index when it covers all folders
+    workers: Optional[int] = None  # Parallel search processes (default: ANVESH_SEARCH_WORKERS, 1 = no pool)
+    ordered: bool = False  # Stream results in file order instead of as soon as each file finishes
+    include: List[str] = []  # Only files matching these globs (name or path relative to the folder)
+    exclude: List[str] = []  # Skip files and folders matching these globs
+    max_depth: Optional[int] = None  # How many folder levels below each folder to enter
+    skip_hidden: bool = True  # Skip hidden files/folders and folders like node_modules
+    max_file_size_mb: Optional[float] = None  # Skip files larger than this
+    max_matches_per_file: Optional[int] = None  # Stop reading a file after this many matching lines
+    file_timeout: Optional[float] = None  # Seconds a file may take before it's skipped (default: ANVESH_FILE_TIMEOUT, 0 = no limit)
+    limit: Optional[int] = None  # Return only the N most relevant files, best first
+    offset: int = 0  # Skip this many of the most relevant files (paging with limit)
+    stream_format: str = "sse"  # /api/search response: "sse", "ndjson" or "msgpack" (needs msgpack installed)
+    profile: bool = False  # Time every file (skips the result cache); the summary comes with the results, the trace from /api/search/{id}/trace
+    collapse_duplicates: bool = False  # List files with identical contents under the first one instead of as results of their own
+
+class BatchQuery(BaseModel):
+    """One search of a batch: the query fields of SearchRequest"""
+    id: Optional[str] = None  # Labels this query's output lines (default: its position in the batch)
+    query: str = ""
+    terms: List[str] = []
     exact_match: bool = False
+    match_mode: Optional[str] = None
     case_sensitive: bool = False
     search_filenames: bool = False
+    max_matches_per_file: Optional[int] = None
+    limit: Optional[int] = None
+    offset: int = 0
+
+class BatchSearchRequest(BaseModel):
+    """Many searches over the same folders, run in one pass over the files"""
+    folders: List[str]
+    queries: List[BatchQuery]
+    include: List[str] = []
+    exclude: List[str] = []
+    max_depth: Optional[int] = None
+    skip_hidden: bool = True
+    max_file_size_mb: Optional[float] = None
+    workers: Optional[int] = None
+    file_timeout: Optional[float] = None
+    output: Optional[str] = None  # Write the NDJSON lines to this new file (a name in BATCH_OUTPUT_FOLDER) in the background instead of streaming them
 
 class SearchResult(BaseModel):
     file_path: str
     line_number: Optional[int]
     content: str
     occurrences: int
+    terms: Optional[Dict[str, int]] = None  # Occurrences per matched term (multi-term searches)
 
 class FileResult(BaseModel):
     file_path: str
     total_occurrences: int
     matches: List[SearchResult]
+    term_counts: Optional[Dict[str, int]] = None  # Occurrences per term in this file (multi-term searches)
+    score: Optional[float] = None  # Relevance (ranked searches)
+    duplicate_of: Optional[str] = None  # A file with identical contents, found first (its matches were reused)
+    duplicates: Optional[List[str]] = None  # Files with identical contents (searches collapsing duplicates)
 
-def search_txt(file_path: str, query: str, exact_match: bool, case_sensitive: bool) -> List[SearchResult]:
-    """Search in plain text files"""
-    results = []
-    try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-            for line_num, line in enumerate(lines, 1):
-                if case_sensitive:
-                    search_line = line
-                    search_query = query
-                else:
-                    search_line = line.lower()
-                    search_query = query.lower()
-                
-                if exact_match:
-                    if search_query in search_line:
-                        results.append(SearchResult(
-                            file_path=file_path,
-                            line_number=line_num,
-                            content=line.strip(),
-                            occurrences=search_line.count(search_query)
-                        ))
-                else:
-                    if search_query in search_line:
-                        results.append(SearchResult(
-                            file_path=file_path,
-                            line_number=line_num,
-                            content=line.strip()[:200],  # Limit preview
-                            occurrences=search_line.count(search_query)
-                        ))
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
-    return results
+class SkippedFile(BaseModel):
+    file_path: str
+    reason: str  # e.g. not a valid PDF, timed out
 
-def search_docx(file_path: str, query: str, exact_match: bool, case_sensitive: bool) -> List[SearchResult]:
-    """Search in Word documents"""
-    if not DOCX_AVAILABLE:
-        return []
-    
-    results = []
+def search_terms(search_request: SearchRequest) -> Tuple[str, ...]:
+    """The terms a request searches for: its term list, or else its query"""
+    terms = tuple(dict.fromkeys(term for term in search_request.terms if term))
+    return terms or (search_request.query,)
+
+def search_mode(search_request: SearchRequest) -> str:
+    """How terms are matched: match_mode if given, else whole words for exact_match"""
+    if search_request.match_mode:
+        return search_request.match_mode
+    return "whole_word" if search_request.exact_match else "substring"
+
+def search_matcher(search_request: SearchRequest):
+    """The request's matcher (compiled once per process and cached across searches)"""
+    return get_matcher(search_terms(search_request), search_request.case_sensitive, search_mode(search_request))
+
+def validate_search(search_request: SearchRequest):
+    """Reject unknown match modes and bad or dangerous patterns before searching"""
+    if search_mode(search_request) not in MATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"match_mode must be one of: {', '.join(MATCH_MODES)}")
     try:
-        doc = Document(file_path)
-        line_num = 0
-        for paragraph in doc.paragraphs:
-            line_num += 1
-            text = paragraph.text
-            if case_sensitive:
-                search_text = text
-                search_query = query
-            else:
-                search_text = text.lower()
-                search_query = query.lower()
-            
-            if search_query in search_text:
-                count = search_text.count(search_query)
-                results.append(SearchResult(
-                    file_path=file_path,
-                    line_number=line_num,
-                    content=text.strip()[:200],
-                    occurrences=count
-                ))
-    except Exception as e:
-        print(f"Error reading DOCX {file_path}: {e}")
-    return results
+        search_matcher(search_request)
+    except PatternError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if search_request.limit is not None and search_request.limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    if search_request.offset < 0:
+        raise HTTPException(status_code=400, detail="offset can't be negative")
+    if search_request.max_matches_per_file is not None and search_request.max_matches_per_file < 1:
+        raise HTTPException(status_code=400, detail="max_matches_per_file must be at least 1")
+    if search_request.file_timeout is not None and search_request.file_timeout < 0:
+        raise HTTPException(status_code=400, detail="file_timeout can't be negative")
 
-def search_xlsx(file_path: str, query: str, exact_match: bool, case_sensitive: bool) -> List[SearchResult]:
-    """Search in Excel files"""
-    if not XLSX_AVAILABLE:
-        return []
-    
+def is_backtracking(search_request: SearchRequest) -> bool:
+    """Whether the request's regex runs on the re module, so only in a worker process with a time limit"""
+    return search_matcher(search_request).backtracking if search_mode(search_request) == "regex" else False
+
+def search_label(search_request: SearchRequest) -> str:
+    """Human readable query, for history and status messages"""
+    return search_request.query or ", ".join(search_terms(search_request))
+
+def sum_term_counts(counts_list: Iterable[Optional[Dict[str, int]]]) -> Dict[str, int]:
+    """Add up per-term occurrence counts"""
+    total = {}
+    for counts in counts_list:
+        for term, count in (counts or {}).items():
+            total[term] = total.get(term, 0) + count
+    return total
+
+def chunk_match(location: str, line_number: Optional[int], text: str, counts: Dict[str, int], multi_term: bool) -> SearchResult:
+    """A matching chunk as a search result"""
+    return SearchResult(
+        file_path=location,
+        line_number=line_number,
+        content=text.strip()[:200],  # Limit preview
+        occurrences=sum(counts.values()),
+        terms=counts if multi_term else None
+    )
+
+def match_chunks(chunks: Iterable[Tuple[str, Optional[int], str]], matcher, max_matches: Optional[int] = None) -> List[SearchResult]:
+    """Match (location, line_number, text) chunks produced by an extractor.
+
+    Stops consuming chunks after max_matches matching ones, so lazy
+    extractors (PDF pages) never extract the rest of the file.
+    """
+    multi_term = len(matcher.terms) > 1
     results = []
-    try:
-        wb = load_workbook(file_path, data_only=True)
-        line_num = 0
-        for sheet_name in wb.sheetnames:
-            sheet = wb[sheet_name]
-            for row in sheet.iter_rows():
-                for cell in row:
-                    if cell.value:
-                        line_num += 1
-                        text = str(cell.value)
-                        if case_sensitive:
-                            search_text = text
-                            search_query = query
-                        else:
-                            search_text = text.lower()
-                            search_query = query.lower()
-                        
-                        if search_query in search_text:
-                            count = search_text.count(search_query)
-                            results.append(SearchResult(
-                                file_path=f"{file_path} (Sheet: {sheet_name})",
-                                line_number=line_num,
-                                content=text.strip()[:200],
-                                occurrences=count
-                            ))
-    except Exception as e:
-        print(f"Error reading XLSX {file_path}: {e}")
+    for location, line_number, text in chunks:
+        counts = matcher.term_counts(text)
+        if counts:
+            results.append(chunk_match(location, line_number, text, counts, multi_term))
+            if max_matches is not None and len(results) >= max_matches:
+                break
     return results
 
-def search_pptx(file_path: str, query: str, exact_match: bool, case_sensitive: bool) -> List[SearchResult]:
-    """Search in PowerPoint files"""
-    if not PPTX_AVAILABLE:
-        return []
-    
-    results = []
+def extract_file(file_path: str) -> Iterator[Tuple[str, Optional[int], str]]:
+    """Extract (location, line_number, text) chunks from any supported file, by its sniffed format"""
+    extractor, reason = extractors.resolve(file_path, MAX_PARSE_BYTES or None)
+    if extractor is None:
+        print(f"Skipping {file_path}: {reason}")
+        return iter(())
+    return iter(extract_chunks(extractor, file_path))
+
+# Per-file budgets: parsed formats (not plain text) larger than this are skipped, and a file
+# searched for longer than FILE_TIMEOUT seconds is abandoned along with its worker process
+MAX_PARSE_BYTES = int(float(os.environ.get("ANVESH_MAX_PARSE_MB", "256")) * 1024 * 1024)
+FILE_TIMEOUT = float(os.environ.get("ANVESH_FILE_TIMEOUT", "60"))
+
+# Regexes on the re module (RE2 not installed, or a pattern it can't run) can backtrack for
+# a very long time and can't be interrupted, so they only ever run in worker processes that
+# are killed after this many seconds (per file, or for a whole index query), whatever file_timeout says
+REGEX_TIMEOUT = float(os.environ.get("ANVESH_REGEX_TIMEOUT", "10"))
+
+# Bump when extractor output changes so cached text is re-extracted
+EXTRACTOR_VERSION = 1
+
+# Cache of extracted text for parsed formats (DOCX/XLSX/PPTX/PDF); plain text is cheap to re-read
+extraction_cache = ExtractionCache(
+    data_path("extraction_cache.db"),
+    int(os.environ.get("ANVESH_EXTRACTION_CACHE_MB", "512")) * 1024 * 1024
+)
+
+# PDFs read by the server process are split across this many page worker processes (page by page)
+pdf_extractor = PdfExtractor(
+    cache=extraction_cache,
+    version=str(EXTRACTOR_VERSION),
+    workers=int(os.environ.get("ANVESH_PDF_WORKERS", str(os.cpu_count() or 1))),
+    dedup=content_hash.ENABLED
+)
+extractors.register(PdfPagesExtractor(pdf_extractor))
+extractors.load_plugins(os.environ.get("ANVESH_EXTRACTORS", "").split(","))
+
+def cached_extract(extractor: Extractor, file_path: str) -> List[Tuple[str, Optional[int], str]]:
+    """Run an extractor through the extraction cache"""
     try:
-        prs = Presentation(file_path)
-        slide_num = 0
-        for slide in prs.slides:
-            slide_num += 1
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text = shape.text
-                    if case_sensitive:
-                        search_text = text
-                        search_query = query
-                    else:
-                        search_text = text.lower()
-                        search_query = query.lower()
-                    
-                    if search_query in search_text:
-                        count = search_text.count(search_query)
-                        results.append(SearchResult(
-                            file_path=f"{file_path} (Slide: {slide_num})",
-                            line_number=slide_num,
-                            content=text.strip()[:200],
-                            occurrences=count
-                        ))
-    except Exception as e:
-        print(f"Error reading PPTX {file_path}: {e}")
-    return results
+        stat = os.stat(file_path)
+    except OSError:
+        return list(extractor.chunks(file_path))
+    
+    version = f"{extractor.name}-{extractor.version}:{EXTRACTOR_VERSION}"
+    chunks = extraction_cache.get(file_path, stat.st_size, stat.st_mtime_ns, version)
+    if chunks is None and content_hash.ENABLED:
+        # An identical file's cached text will do
+        copy = extraction_cache.find_copy(file_path, stat.st_size, stat.st_mtime_ns)
+        if copy is not None:
+            source, source_mtime_ns = copy
+            source_chunks = extraction_cache.get(source, stat.st_size, source_mtime_ns, version)
+            if source_chunks is not None:
+                chunks = rebase_chunks(source_chunks, source, file_path)
+                record_saved("extraction", stat.st_size)
+                extraction_cache.put(file_path, stat.st_size, stat.st_mtime_ns, version, chunks)
+    if chunks is None:
+        chunks = list(extractor.chunks(file_path))
+        extraction_cache.put(file_path, stat.st_size, stat.st_mtime_ns, version, chunks)
+    return chunks
 
-def search_pdf(file_path: str, query: str, exact_match: bool, case_sensitive: bool) -> List[SearchResult]:
-    """Search in PDF files"""
-    if not PDF_AVAILABLE:
-        return []
+def extract_chunks(extractor: Extractor, file_path: str) -> Iterable[Tuple[str, Optional[int], str]]:
+    """A file's chunks, extracted once: searches, index builds and the cache all share them.
+
+    Parsed formats come from (or go into) the extraction cache; plain text
+    and PDF pages stream lazily, so a search that stops early reads no further.
+    """
+    if extractor.cacheable:
+        return cached_extract(extractor, file_path)
+    return extractor.chunks(file_path)
+
+def match_file(extractor: Extractor, file_path: str, matcher, max_matches: Optional[int] = None) -> List[SearchResult]:
+    """Search a file's contents: the matcher stage over its extractor's chunks.
+
+    Plain text searched for a single term skips extraction and scans the
+    file memory-mapped instead, so huge files are fine. Extraction and
+    matching are timed separately for /api/metrics and search profiles (the
+    memory-mapped scan does both in one pass and counts as matching).
+    """
+    with profiling.phase("stat"):
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            size = None
+    if size is not None:
+        metrics.inc("anvesh_bytes_read_total", size, extractor=extractor.name)
+    profiling.note(extractor.name, size)
+    start_time = time.time()
+    start = time.perf_counter()
+    if not (extractor.plain_text and isinstance(matcher, SubstringMatcher)):
+        chunks = metrics.TimedIterator(extract_chunks(extractor, file_path), time.perf_counter() - start)
+        results = match_chunks(chunks, matcher, max_matches)
+        match_seconds = time.perf_counter() - start - chunks.seconds
+        metrics.observe("anvesh_extract_seconds", chunks.seconds, extractor=extractor.name)
+        metrics.observe("anvesh_match_seconds", match_seconds, matcher=type(matcher).__name__)
+        profiling.add_phase("extract", start_time, chunks.seconds)
+        profiling.add_phase("match", start_time + chunks.seconds, match_seconds)
+        return results
     
     results = []
     try:
-        with open(file_path, 'rb') as f:
-            pdf_reader = PyPDF2.PdfReader(f)
-            page_num = 0
-            for page in pdf_reader.pages:
-                page_num += 1
-                text = page.extract_text()
-                if case_sensitive:
-                    search_text = text
-                    search_query = query
-                else:
-                    search_text = text.lower()
-                    search_query = query.lower()
-                
-                if search_query in search_text:
-                    lines = text.split('\n')
-                    for line_idx, line in enumerate(lines, 1):
-                        if case_sensitive:
-                            search_line = line
-                        else:
-                            search_line = line.lower()
-                        
-                        if search_query in search_line:
-                            count = search_line.count(search_query)
-                            results.append(SearchResult(
-                                file_path=f"{file_path} (Page: {page_num})",
-                                line_number=line_idx,
-                                content=line.strip()[:200],
-                                occurrences=count
-                            ))
+        for line_num, line, occurrences in scan_text_file(file_path, matcher.terms[0], matcher.case_sensitive):
+            results.append(SearchResult(
+                file_path=file_path,
+                line_number=line_num,
+                content=line.strip()[:200],  # Limit preview
+                occurrences=occurrences
+            ))
+            if max_matches is not None and len(results) >= max_matches:
+                break
     except Exception as e:
-        print(f"Error reading PDF {file_path}: {e}")
+        print(f"Error reading {extractor.description} {file_path}: {e}")
+        metrics.inc("anvesh_extract_errors_total", extractor=extractor.name)
+    match_seconds = time.perf_counter() - start
+    metrics.observe("anvesh_match_seconds", match_seconds, matcher=type(matcher).__name__)
+    profiling.add_phase("match", start_time, match_seconds)
     return results
 
+def is_supported_file(file_path: str) -> bool:
+    """Check whether a registered extractor handles the file's extension"""
+    return extractors.is_supported(file_path)
+
 def get_supported_files(folder_path: str) -> List[str]:
     """Get all supported files from a folder recursively"""
-    supported_extensions = {'.txt', '.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt', '.pdf'}
-    files = []
-    
-    try:
-        for root, dirs, filenames in os.walk(folder_path):
-            for filename in filenames:
-                ext = os.path.splitext(filename)[1].lower()
-                if ext in supported_extensions:
-                    file_path = os.path.join(root, filename)
-                    files.append(file_path)
-    except Exception as e:
-        print(f"Error walking directory {folder_path}: {e}")
-    
-    return files
+    return [entry.path for entry in FileWalker(is_supported_file).walk([folder_path])]
+
+def has_walk_filters(search_request: SearchRequest) -> bool:
+    """Whether the request walks folders differently from get_supported_files"""
+    return bool(search_request.include or search_request.exclude or search_request.max_depth is not None
+                or not search_request.skip_hidden or search_request.max_file_size_mb is not None)
+
+def make_walker(search_request: SearchRequest) -> FileWalker:
+    """Directory walker with the request's filters"""
+    max_size = search_request.max_file_size_mb
+    return FileWalker(
+        is_supported_file,
+        include=search_request.include,
+        exclude=search_request.exclude,
+        max_depth=search_request.max_depth,
+        skip_hidden=search_request.skip_hidden,
+        max_file_size=int(max_size * 1024 * 1024) if max_size is not None else None
+    )
+
+# Search history, in the same directory as the executable (for persistence); entries are
+# appended by a background thread and the newest ANVESH_HISTORY_MAX_ENTRIES are kept
+search_history = SearchHistory(
+    data_path("search_history.db"),
+    max_entries=int(os.environ.get("ANVESH_HISTORY_MAX_ENTRIES", "10000")),
+    legacy_json=data_path("search_history.json")
+)
 
 def log_search_history(query: str, folders: List[str], results_count: int, exact_match: bool, case_sensitive: bool, search_filenames: bool):
-    """Log search history to local file"""
-    # History file should be in the same directory as the executable (for persistence)
-    if getattr(sys, 'frozen', False):
-        # Running as executable - save history next to the .exe file
-        base_path = os.path.dirname(sys.executable)
-    else:
-        # Running as script - save in script directory
-        base_path = os.path.dirname(os.path.abspath(__file__))
-    
-    log_file = os.path.join(base_path, "search_history.json")
-    history_entry = {
+    """Log search history (queued; doesn't wait for the write)"""
+    search_history.add({
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "query": query,
         "folders": folders,
@@ -290,167 +397,1107 @@ def log_search_history(query: str, folders: List[str], results_count: int, exact
         "exact_match": exact_match,
         "case_sensitive": case_sensitive,
         "search_filenames": search_filenames
-    }
+    })
+
+# Persistent search index, kept next to the search history
+search_index = SearchIndex(data_path("search_index.db"), dedup=content_hash.ENABLED)
+
+# Catalog of every file's name and metadata, for instant filename search
+file_catalog = FileCatalog(data_path("file_catalog.db"))
+
+# Cataloged folders the watcher doesn't keep current are refreshed (in the background) when older than this
+CATALOG_MAX_AGE = float(os.environ.get("ANVESH_CATALOG_MAX_AGE", "300"))
+
+# Finished searches, replayed at once when repeated until something in their folders changes
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("ANVESH_RESULT_CACHE_ENTRIES", "128")),
+    max_results=int(os.environ.get("ANVESH_RESULT_CACHE_MAX_RESULTS", "10000"))
+)
+
+def catalog_walk(folders: List[str]):
+    """Walk folders for the file catalog (all file types, hidden folders skipped)"""
+    return FileWalker(lambda name: True).walk(folders)
+
+def filename_match(file_path: str, matcher) -> Optional[SearchResult]:
+    """Match search terms against a file's name"""
+    filename = os.path.basename(file_path)
+    counts = matcher.term_counts(filename)
+    if counts:
+        return SearchResult(
+            file_path=file_path,
+            line_number=None,
+            content=f"Filename match: {filename}",
+            occurrences=sum(counts.values()),
+            terms=counts if len(matcher.terms) > 1 else None
+        )
+    return None
+
+def make_file_result(file_path: str, matches: List[SearchResult], multi_term: bool) -> FileResult:
+    """Combine a file's matches into its result"""
+    return FileResult(
+        file_path=file_path,
+        total_occurrences=sum(m.occurrences for m in matches),
+        matches=matches,
+        term_counts=sum_term_counts(m.terms for m in matches) if multi_term else None
+    )
+
+def use_search_index(search_request: SearchRequest) -> bool:
+    """Whether the request can be answered from the search index"""
+    # The index holds what get_supported_files finds, so filtered walks search live
+    return search_request.use_index and not has_walk_filters(search_request) and search_index.covers(search_request.folders)
+
+def search_from_index(search_request: SearchRequest) -> List[FileResult]:
+    """Answer a search from the search index without opening any files"""
+    terms = search_terms(search_request)
+    matcher = search_matcher(search_request)
+    matches_by_file = {}
+    
+    if search_request.search_filenames:
+        for file_path in search_index.file_paths(search_request.folders):
+            match = filename_match(file_path, matcher)
+            if match:
+                matches_by_file[file_path] = [match]
+    
+    candidates = search_index.candidates(search_request.folders, list(terms), search_mode(search_request), search_request.case_sensitive)
+    for file_path, chunks in candidates:
+        content_matches = match_chunks(chunks, matcher, search_request.max_matches_per_file)
+        if content_matches:
+            matches_by_file.setdefault(file_path, []).extend(content_matches)
+    
+    return [
+        make_file_result(file_path, matches, len(terms) > 1)
+        for file_path, matches in sorted(matches_by_file.items())
+    ]
+
+def content_term_counts(file_result: FileResult, terms: Tuple[str, ...], name_counts: Dict[str, int], search_filenames: bool) -> Dict[str, int]:
+    """Occurrences per term in a result's contents (without its filename match)"""
+    counts = dict(file_result.term_counts) if file_result.term_counts is not None else {terms[0]: file_result.total_occurrences}
+    if search_filenames:
+        for term, count in name_counts.items():
+            counts[term] = counts.get(term, 0) - count
+    return counts
+
+def filename_counts(file_result: FileResult, terms: Tuple[str, ...]) -> Dict[str, int]:
+    """Occurrences per term in a result's file name, from its filename match (none if names weren't searched)"""
+    for match in file_result.matches:
+        if match.line_number is None and match.content.startswith("Filename match: "):
+            return dict(match.terms) if match.terms else {terms[0]: match.occurrences}
+    return {}
+
+def rank_from_index(search_request: SearchRequest) -> List[FileResult]:
+    """The most relevant limit results (after offset) from the search index.
+
+    Candidate files are visited best possible score first; that bound comes
+    from a file's text length, name, age and the terms its trigrams allow,
+    all known without reading its text. Once the top results can't be beaten
+    by the next file's bound, the remaining files are never read.
+    """
+    terms = search_terms(search_request)
+    matcher = search_matcher(search_request)
+    search_filenames = search_request.search_filenames
+    
+    def name_counts(file_path: str) -> Dict[str, int]:
+        return matcher.term_counts(os.path.basename(file_path))
+    
+    found = search_index.ranking_candidates(
+        search_request.folders, list(terms), search_mode(search_request), search_request.case_sensitive,
+        include=(lambda file_path: bool(name_counts(file_path))) if search_filenames else None
+    )
+    scorer = Bm25Scorer(terms, dict(zip(terms, found.document_counts)), found.total_files, found.average_length)
+    
+    visits = []
+    for indexed in found.files:
+        names = name_counts(indexed.path)
+        mtime = indexed.mtime_ns / 1e9
+        possible = found.possible_queries.get(indexed.file_id)
+        possible_terms = None if possible is None else [terms[i] for i in possible]
+        bound = scorer.upper_bound(indexed.text_length, names, mtime, possible_terms)
+        visits.append((bound, indexed, names, mtime))
+    visits.sort(key=lambda visit: (-visit[0], visit[1].path))
+    
+    top = TopK(search_request.offset + search_request.limit)
+    offered_digests = set()  # With collapse_duplicates, copies of a result aren't read (they're listed with it)
+    for bound, indexed, names, mtime in visits:
+        if top.is_settled(bound):
+            break
+        if search_request.collapse_duplicates and indexed.digest in offered_digests:
+            continue
+        matches = []
+        if search_filenames and names:
+            matches.append(filename_match(indexed.path, matcher))
+        matches.extend(match_chunks(search_index.file_chunks(indexed.file_id), matcher, search_request.max_matches_per_file))
+        if not matches:
+            continue
+        file_result = make_file_result(indexed.path, matches, len(terms) > 1)
+        file_result.score = round(scorer.score(
+            content_term_counts(file_result, terms, names, search_filenames), indexed.text_length, names, mtime
+        ), 4)
+        top.offer(file_result.score, file_result)
+        if indexed.digest:
+            offered_digests.add(indexed.digest)
+    return top.results()[search_request.offset:]
+
+def rank_results(search_request: SearchRequest, file_results: List[FileResult], files_searched: int) -> List[FileResult]:
+    """Score the results of a live scan and return the requested page, best first.
+
+    A scan doesn't know how long the files it didn't match are, so scores
+    are not normalized for length.
+    """
+    terms = search_terms(search_request)
+    matcher = search_matcher(search_request)
+    search_filenames = search_request.search_filenames
+    
+    backtracking = is_backtracking(search_request)
+    scored = []
+    for file_result in sorted(file_results, key=lambda r: r.file_path):  # Ties go to the first path
+        if backtracking:
+            names = filename_counts(file_result, terms)  # Not matched again here, on the server
+        else:
+            names = matcher.term_counts(os.path.basename(file_result.file_path))
+        scored.append((file_result, names, content_term_counts(file_result, terms, names, search_filenames)))
+    document_counts = {term: sum(1 for _, _, counts in scored if counts.get(term)) for term in terms}
+    scorer = Bm25Scorer(terms, document_counts, files_searched)
+    
+    top = TopK(search_request.offset + search_request.limit)
+    for file_result, names, counts in scored:
+        try:
+            mtime = os.path.getmtime(file_result.file_path)
+        except OSError:
+            mtime = None
+        file_result.score = round(scorer.score(counts, None, names, mtime), 4)
+        top.offer(file_result.score, file_result)
+    return top.results()[search_request.offset:]
+
+def search_file(file_path: str, terms: Tuple[str, ...], mode: str, case_sensitive: bool, search_filenames: bool,
+                max_matches: Optional[int] = None) -> Optional[Union[FileResult, SkippedFile]]:
+    """Search one file's name and contents (runs in-process or in a search worker process).
+
+    Returns a SkippedFile when the contents can't be searched (and the name didn't match).
+    """
+    # Matchers are cached per process, so each worker builds a search's matcher only once
+    matcher = get_matcher(terms, case_sensitive, mode)
+    matches = []
+    
+    # If filename search was requested, check filename match
+    if search_filenames:
+        match = filename_match(file_path, matcher)
+        if match:
+            matches.append(match)
     
+    # Search file contents by their real format, whatever the extension says
+    with profiling.phase("open"):
+        extractor, reason = extractors.resolve(file_path, MAX_PARSE_BYTES or None)
+    if extractor is not None:
+        matches.extend(match_file(extractor, file_path, matcher, max_matches))
+    elif not matches:
+        profiling.note(outcome=f"skipped: {reason}")
+        return SkippedFile(file_path=file_path, reason=reason)
+    
+    if not matches:
+        return None
+    return make_file_result(file_path, matches, len(terms) > 1)
+
+# One search of a batch, as search worker processes get it: (terms, mode, case_sensitive, search_filenames, max_matches)
+BatchJob = Tuple[Tuple[str, ...], str, bool, bool, Optional[int]]
+
+def search_file_batch(file_path: str, jobs: Tuple[BatchJob, ...]) -> Union[List[Optional[FileResult]], SkippedFile]:
+    """Search one file for many searches, extracting it only once (runs in-process or in a search worker process).
+
+    Returns each search's FileResult (None for no match), or a SkippedFile
+    when the contents can't be searched and no search matched the name.
+    Stops reading once every search has its max_matches.
+    """
+    matcher_set = get_matcher_set(tuple((terms, case_sensitive, mode) for terms, mode, case_sensitive, _, _ in jobs))
+    matchers = matcher_set.matchers
+    matches = [[] for _ in jobs]
+    
+    for index, (_, _, _, search_filenames, _) in enumerate(jobs):
+        if search_filenames:
+            match = filename_match(file_path, matchers[index])
+            if match:
+                matches[index].append(match)
+    
+    extractor, reason = extractors.resolve(file_path, MAX_PARSE_BYTES or None)
+    if extractor is None:
+        if not any(matches):
+            return SkippedFile(file_path=file_path, reason=reason)
+    else:
+        limits = [max_matches for _, _, _, _, max_matches in jobs]
+        found = [0] * len(jobs)  # Content matches per search
+        unfinished = len(jobs)  # Searches that still want more matches
+        try:
+            metrics.inc("anvesh_bytes_read_total", os.path.getsize(file_path), extractor=extractor.name)
+        except OSError:
+            pass
+        start = time.perf_counter()
+        chunks = metrics.TimedIterator(extract_chunks(extractor, file_path), time.perf_counter() - start)
+        for location, line_number, text in chunks:
+            for index in matcher_set.candidates(text):
+                if limits[index] is not None and found[index] >= limits[index]:
+                    continue
+                counts = matchers[index].term_counts(text)
+                if counts:
+                    matches[index].append(chunk_match(location, line_number, text, counts, len(matchers[index].terms) > 1))
+                    found[index] += 1
+                    if found[index] == limits[index]:
+                        unfinished -= 1
+            if not unfinished:
+                break
+        metrics.observe("anvesh_extract_seconds", chunks.seconds, extractor=extractor.name)
+        metrics.observe("anvesh_match_seconds", time.perf_counter() - start - chunks.seconds, matcher=type(matcher_set).__name__)
+    
+    return [
+        make_file_result(file_path, file_matches, len(job[0]) > 1) if file_matches else None
+        for file_matches, job in zip(matches, jobs)
+    ]
+
+def copy_file_result(result: Optional[Union[FileResult, SkippedFile]], original: str, file_path: str,
+                     terms: Tuple[str, ...], mode: str, case_sensitive: bool, search_filenames: bool,
+                     max_matches: Optional[int] = None) -> Optional[Union[FileResult, SkippedFile]]:
+    """search_file's result for file_path, made from the result of original, a file with identical contents.
+
+    The content matches are original's, moved to file_path; the name is
+    matched on its own, since a copy can be named differently.
+    """
+    matches = []
+    if search_filenames:
+        match = filename_match(file_path, get_matcher(terms, case_sensitive, mode))
+        if match:
+            matches.append(match)
+    if isinstance(result, SkippedFile):
+        if not matches:
+            return SkippedFile(file_path=file_path, reason=result.reason)
+    elif result is not None:
+        for match in result.matches:
+            if match.file_path == original and match.line_number is None and match.content.startswith("Filename match: "):
+                continue
+            if match.file_path.startswith(original):
+                match = match.model_copy(update={"file_path": file_path + match.file_path[len(original):]})
+            matches.append(match)
+    if not matches:
+        return None
+    file_result = make_file_result(file_path, matches, len(terms) > 1)
+    file_result.duplicate_of = original
+    return file_result
+
+def copy_batch_result(result: Optional[Union[List[Optional[FileResult]], SkippedFile]], original: str, file_path: str,
+                      jobs: Tuple[BatchJob, ...]) -> Union[List[Optional[FileResult]], SkippedFile]:
+    """search_file_batch's result for file_path, made from the result of original, a file with identical contents"""
+    if isinstance(result, SkippedFile):
+        results = [copy_file_result(result, original, file_path, *job) for job in jobs]
+        if all(isinstance(file_result, SkippedFile) for file_result in results):
+            return results[0]
+        return [file_result if isinstance(file_result, FileResult) else None for file_result in results]
+    return [copy_file_result(file_result, original, file_path, *job) for file_result, job in zip(result or [None] * len(jobs), jobs)]
+
+def collapse_duplicates(file_results: List[FileResult]) -> List[FileResult]:
+    """Fold the results of copies into the duplicates of their original, when it's among the results"""
+    by_path = {file_result.file_path: file_result for file_result in file_results}
+    kept = []
+    for file_result in file_results:
+        original = by_path.get(file_result.duplicate_of) if file_result.duplicate_of else None
+        if original is None:
+            kept.append(file_result)
+        else:
+            original.duplicates = (original.duplicates or []) + [file_result.file_path]
+    return kept
+
+def duplicate_stub(file_result: FileResult) -> FileResult:
+    """A copy's result as streamed when collapsing duplicates: no matches, just which file it duplicates"""
+    return FileResult(file_path=file_result.file_path, total_occurrences=file_result.total_occurrences, matches=[],
+                      term_counts=file_result.term_counts, duplicate_of=file_result.duplicate_of)
+
+class ActiveSearch:
+    """A running search that can be listed and cancelled by its id"""
+    
+    def __init__(self, search_request: SearchRequest):
+        self.id = uuid.uuid4().hex
+        self.query = search_label(search_request)
+        self.folders = search_request.folders
+        self.started_at = time.time()
+        self.files_processed = 0
+        self.total_files = 0
+        self.cancelled = threading.Event()
+    
+    def to_dict(self) -> Dict:
+        return {
+            "search_id": self.id,
+            "query": self.query,
+            "folders": self.folders,
+            "started_at": self.started_at,
+            "files_processed": self.files_processed,
+            "total_files": self.total_files,
+            "cancelled": self.cancelled.is_set()
+        }
+
+active_searches: Dict[str, ActiveSearch] = {}
+
+# Profiles of the last PROFILES_KEPT profiled searches, for /api/search/{search_id}/trace
+PROFILES_KEPT = 20
+search_profiles: "OrderedDict[str, profiling.SearchProfile]" = OrderedDict()
+
+def keep_profile(profiler: profiling.SearchProfile):
+    search_profiles[profiler.search_id] = profiler
+    while len(search_profiles) > PROFILES_KEPT:
+        search_profiles.popitem(last=False)
+
+# Worker processes for content search; 1 searches files one at a time in the server process
+# Matching files are streamed in batches of up to STREAM_BATCH_RESULTS, each sent at most
+# STREAM_BATCH_DELAY seconds after its first file; streams are gzip/deflate compressed
+# for clients that accept it (ANVESH_STREAM_COMPRESSION=0 turns that off)
+STREAM_BATCH_RESULTS = max(1, int(os.environ.get("ANVESH_STREAM_BATCH_RESULTS", "100")))
+STREAM_BATCH_DELAY = float(os.environ.get("ANVESH_STREAM_BATCH_MS", "50")) / 1000
+STREAM_COMPRESSION_LEVEL = int(os.environ.get("ANVESH_STREAM_COMPRESSION", "1"))
+
+SEARCH_WORKERS = max(1, int(os.environ.get("ANVESH_SEARCH_WORKERS", str(os.cpu_count() or 1))))
+_search_pool = None
+
+# Times a file is retried after its worker died while other files were in flight
+WORKER_RETRIES = 2
+
+def get_search_pool() -> ProcessPoolExecutor:
+    """Shared process pool for content search, created on first parallel search"""
+    global _search_pool
+    if _search_pool is None:
+        # Workers start with empty metrics (forked ones would otherwise send back the server's)
+        _search_pool = ProcessPoolExecutor(max_workers=SEARCH_WORKERS, initializer=metrics.reset)
+    return _search_pool
+
+def recycle_search_pool(pool: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    """Kill a pool's worker processes (one is stuck, e.g. hung in a C parser) and start a fresh pool.
+
+    Files in flight on the old pool fail with BrokenProcessPool and are retried.
+    """
+    global _search_pool
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+    if _search_pool is pool:
+        _search_pool = None
+    return get_search_pool()
+
+# PDFs at least this large are searched from a server thread, one at a time, so their pages are
+# split across pdf_extractor's page workers (search worker processes read a PDF on their own)
+PDF_SPLIT_BYTES = int(float(os.environ.get("ANVESH_PDF_SPLIT_MB", "2")) * 1024 * 1024)
+
+def splits_pdf_pages(file_path: str) -> bool:
+    """Whether a file is a PDF big enough to search from the server, its pages split across the page workers"""
+    if not PDF_SPLIT_BYTES or not file_path.lower().endswith(".pdf") or not pdf_extractor.can_parallelize():
+        return False
     try:
-        # Read existing history
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
+        if os.path.getsize(file_path) < PDF_SPLIT_BYTES:
+            return False
+        with open(file_path, "rb") as f:
+            return f.read(len(PDF_MAGIC)) == PDF_MAGIC
+    except OSError:
+        return False
+
+def run_on_server(function, *args):
+    """metrics.run_collecting for a file searched on a server thread, whose metrics are already recorded here"""
+    return function(*args), {"counters": {}, "histograms": {}}
+
+def file_timeout(search_request: SearchRequest) -> float:
+    """Seconds a file may take (0 = no limit)"""
+    return FILE_TIMEOUT if search_request.file_timeout is None else search_request.file_timeout
+
+async def walk_files(walker: FileWalker, folders: List[str], search: Optional[ActiveSearch] = None,
+                     groups: Optional[ContentGroups] = None) -> AsyncGenerator[str, None]:
+    """Stream file paths from a walk running on a background thread.
+
+    Files are added to groups (if given) before they're yielded, with the
+    size and mtime the walk already has; the walk itself never reads a file.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    
+    def produce():
+        start = time.perf_counter()
+        found = 0
+        try:
+            for entry in walker.walk(folders):
+                if stop.is_set() or (search and search.cancelled.is_set()):
+                    break
+                found += 1
+                if groups is not None:
+                    groups.add(entry.path, entry.st_size, entry.st_mtime_ns)
+                loop.call_soon_threadsafe(queue.put_nowait, entry.path)
+        except Exception as e:
+            print(f"Error walking folders: {e}")
+            metrics.inc("anvesh_errors_total", component="walk")
+        finally:
+            metrics.observe("anvesh_walk_seconds", time.perf_counter() - start)
+            metrics.inc("anvesh_walk_files_total", found)
+            metrics.inc("anvesh_skipped_files_total", walker.files_skipped, stage="walk")
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+            except RuntimeError:
+                pass  # Event loop already closed
+    
+    loop.run_in_executor(None, produce)
+    try:
+        while True:
+            file_path = await queue.get()
+            if file_path is None:
+                return
+            yield file_path
+    finally:
+        stop.set()
+
+async def iter_file_results(search_request: SearchRequest,
+                            file_paths: AsyncIterator[str],
+                            search: Optional[ActiveSearch] = None,
+                            search_function=search_file,
+                            args: Optional[tuple] = None,
+                            profiler: Optional[profiling.SearchProfile] = None,
+                            groups: Optional[ContentGroups] = None,
+                            copy_function=copy_file_result,
+                            backtracking: Optional[bool] = None) -> AsyncGenerator[Optional[Union[FileResult, SkippedFile]], None]:
+    """Yield one FileResult, None (no match) or SkippedFile per file.
+
+    file_paths is consumed as it streams in (see walk_files), so searching
+    starts with the first file found. Files fan out to the search process
+    pool and results are yielded as each file finishes, or in file order when
+    search_request.ordered is set; a file over its time budget is skipped and
+    its worker process killed, so even a parser hung in C can't stall the
+    search. With one worker and no time budget files are searched in this
+    process instead, except for backtracking regexes (backtracking, by
+    default is_backtracking(search_request)), which always run in the pool
+    with at least REGEX_TIMEOUT. A large PDF (see splits_pdf_pages) is
+    searched on a server thread instead of the pool, one at a time, so its
+    pages are split across pdf_extractor's page workers; those are killed if
+    it runs over time. Files are never parsed on the event loop thread. Stops
+    early once the search is cancelled; if the consumer goes away (client
+    disconnect), files still queued are cancelled.
+    
+    Files go to search_function(file_path, *args) (default: search_file with
+    the request's search), whose return value is yielded. Metrics recorded
+    in the worker processes come back with each result and are merged here,
+    as do the file profiles of a profiled search (added to profiler).
+    
+    Files that groups (filled by walk_files) finds to be copies of an
+    earlier file are not searched: copy_function(original's result,
+    original, file_path, *args) makes their result once the original's is
+    in. Finding out may hash the file, which runs on a thread, alongside the
+    files being searched.
+    """
+    global _search_pool
+    if args is None:
+        args = (search_terms(search_request), search_mode(search_request), search_request.case_sensitive, search_request.search_filenames,
+                search_request.max_matches_per_file)
+    workers = min(search_request.workers or SEARCH_WORKERS, SEARCH_WORKERS)
+    timeout = file_timeout(search_request)
+    if backtracking is None:
+        backtracking = is_backtracking(search_request)
+    if backtracking:
+        timeout = min(timeout, REGEX_TIMEOUT) if timeout else REGEX_TIMEOUT
+    
+    loop = asyncio.get_running_loop()
+    # What runs per file: search_function itself, or wrapped to record the file's profile
+    call = (profiling.run_profiled, search_function) if profiler else (search_function,)
+    originals = {}  # Path -> result (None results left out), for the copies of files searched so far
+    
+    def copy_of(original: str, file_path: str):
+        result = copy_function(originals.get(original), original, file_path, *args)
+        if isinstance(result, SkippedFile):
+            metrics.inc("anvesh_skipped_files_total", stage="search")
+        return result
+    
+    async def original_of(file_path: str) -> Optional[str]:
+        """The file file_path is a copy of, if any (hashed off the event loop when it has to be)"""
+        if groups is None or backtracking:
+            return None  # A copy's own name would be matched here, on the server
+        if groups.may_be_copy(file_path):
+            return await loop.run_in_executor(None, groups.resolve, file_path)
+        return groups.resolve(file_path)
+    
+    async def next_file() -> Tuple[str, Optional[str], bool]:
+        file_path = await file_paths.__anext__()
+        original = await original_of(file_path)
+        split = original is None and not backtracking and await loop.run_in_executor(None, splits_pdf_pages, file_path)
+        return file_path, original, split
+    
+    if workers <= 1 and not timeout:
+        async for file_path in file_paths:
+            if search and search.cancelled.is_set():
+                return
+            original = await original_of(file_path)
+            if original is not None:
+                yield copy_of(original, file_path)
+                continue
+            result = await loop.run_in_executor(None, *call, file_path, *args)
+            if profiler:
+                result, file_profile = result
+                profiler.add(file_profile)
+            if isinstance(result, SkippedFile):
+                metrics.inc("anvesh_skipped_files_total", stage="search")
+            if groups is not None and result is not None:
+                originals[file_path] = result
+            yield result
+        return
+    
+    pool = get_search_pool()
+    pending = {}  # future -> file index
+    paths = {}  # file index -> path
+    started = {}  # file index -> (pool, start time) of its current attempt
+    attempts = {}  # file index -> attempts lost to a dead worker
+    finished = {}  # file index -> result, for ordered output
+    next_index = 0  # Next file to yield, for ordered output
+    submitted = 0  # Files taken from the walk so far (their indexes)
+    waiting_copies = {}  # Path of a file in flight -> indexes of its copies
+    next_path = None  # task waiting for the walk to produce the next path (whether it's a copy, and a large PDF)
+    walk_done = False
+    on_server = None  # Index of the large PDF being searched on a server thread
+    
+    def submit(index: int, split: bool = False):
+        nonlocal on_server
+        started[index] = (pool, time.monotonic())
+        if split and on_server is None:
+            on_server = index
+            pending[loop.run_in_executor(None, run_on_server, *call, paths[index], *args)] = index
         else:
-            history = []
-        
-        # Append new entry
-        history.append(history_entry)
-        
-        # Keep only last 100 entries
-        if len(history) > 100:
-            history = history[-100:]
-        
-        # Write back
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error logging search history: {e}")
+            pending[loop.run_in_executor(pool, metrics.run_collecting, *call, paths[index], *args)] = index
+    
+    try:
+        while not (search and search.cancelled.is_set()):
+            # Keep at most `workers` files in flight
+            if next_path is None and not walk_done and len(pending) < max(workers, 1):
+                next_path = asyncio.ensure_future(next_file())
+            waiting = set(pending)
+            if next_path is not None:
+                waiting.add(next_path)
+            if not waiting:
+                break
+            
+            # Wake up regularly so a cancel request or an overdue file is noticed promptly
+            done, _ = await asyncio.wait(waiting, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+            completed = []  # (file index, result)
+            if next_path in done:
+                try:
+                    file_path, original, split = next_path.result()
+                except StopAsyncIteration:
+                    walk_done = True
+                else:
+                    index = submitted
+                    submitted += 1
+                    paths[index] = file_path
+                    if original is None:
+                        submit(index, split)
+                        if groups is not None:
+                            waiting_copies[file_path] = []
+                    elif original in waiting_copies:
+                        waiting_copies[original].append(index)
+                    else:
+                        completed.append((index, copy_of(original, file_path)))
+                next_path = None
+            
+            for future in done:
+                if future not in pending:
+                    continue
+                index = pending.pop(future)
+                if index == on_server:
+                    on_server = None
+                try:
+                    result, recorded = future.result()
+                    metrics.merge(recorded)
+                    if profiler:
+                        result, file_profile = result
+                        profiler.add(file_profile)
+                except BrokenProcessPool as e:
+                    # A worker died: a parser crashed, or a pool was recycled after a timeout.
+                    # Whatever was in flight gets another try on a fresh pool.
+                    broken_pool = started[index][0]
+                    if _search_pool is broken_pool:
+                        _search_pool = None
+                        metrics.inc("anvesh_worker_restarts_total", reason="crash")
+                    pool = get_search_pool()
+                    attempts[index] = attempts.get(index, 0) + 1
+                    if attempts[index] <= WORKER_RETRIES:
+                        submit(index)
+                        continue
+                    print(f"Search worker crashed while searching {paths[index]}: {e}")
+                    result = SkippedFile(file_path=paths[index], reason="the search worker crashed while reading it")
+                    if profiler:
+                        profiler.add_unfinished(paths[index], time.monotonic() - started[index][1], result.reason)
+                except Exception as e:
+                    print(f"Error searching {paths[index]}: {e}")
+                    metrics.inc("anvesh_errors_total", component="search")
+                    result = None
+                if isinstance(result, SkippedFile):
+                    metrics.inc("anvesh_skipped_files_total", stage="search")
+                completed.append((index, result))
+            
+            # Abandon files over their time budget; killing the pool is the only way to stop the parser
+            if timeout:
+                now = time.monotonic()
+                overdue = [future for future, index in pending.items() if now - started[index][1] > timeout]
+                pool_overdue = False
+                for future in overdue:
+                    future.cancel()  # Nobody waits for it any more
+                    index = pending.pop(future)
+                    if index == on_server:
+                        # Its thread stops once the page workers reading the PDF are gone
+                        on_server = None
+                        pdf_extractor.kill()
+                    else:
+                        pool_overdue = True
+                    print(f"Timed out searching {paths[index]} after {timeout:g}s")
+                    completed.append((index, SkippedFile(file_path=paths[index], reason=f"timed out after {timeout:g}s")))
+                    if profiler:
+                        profiler.add_unfinished(paths[index], time.monotonic() - started[index][1], f"timed out after {timeout:g}s")
+                    metrics.inc("anvesh_skipped_files_total", stage="search")
+                if pool_overdue:
+                    pool = recycle_search_pool(pool)
+                    metrics.inc("anvesh_worker_restarts_total", reason="timeout")
+            
+            for index, result in completed:  # Copies of these files are appended as they're made
+                file_path = paths.pop(index)
+                started.pop(index, None)
+                attempts.pop(index, None)
+                if groups is not None:
+                    if result is not None:
+                        originals[file_path] = result
+                    for copy_index in waiting_copies.pop(file_path, ()):
+                        completed.append((copy_index, copy_of(file_path, paths[copy_index])))
+                if not search_request.ordered:
+                    yield result
+                    continue
+                finished[index] = result
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+    finally:
+        for future in pending:
+            future.cancel()
+        if next_path is not None:
+            next_path.cancel()  # Stops the walk too
+
+def result_cache_key(search_request: SearchRequest, source: str, response: str = "stream") -> str:
+    """Requests that give the same results share a key (workers, stream_format and profile only change the speed and encoding)"""
+    data = search_request.model_dump(exclude={"workers", "stream_format", "profile"})
+    data["folders"] = [folder_key(folder) for folder in search_request.folders]
+    data["source"] = source
+    data["response"] = response
+    return json.dumps(data, sort_keys=True)
+
+def is_watched_folder(folder: str) -> bool:
+    """Whether the folder watcher reports every change below the folder"""
+    if not folder_watcher.is_running():
+        return False
+    folder = folder_key(folder)
+    return any(folder == watched or folder.startswith(watched + os.sep)
+               for watched in map(folder_key, folder_watcher.folders()))
+
+def walk_fingerprint(search_request: SearchRequest) -> int:
+    """Fingerprint (see FileWalker) of the files the request would search, without reading them"""
+    walker = make_walker(search_request)
+    for _ in walker.walk(search_request.folders):
+        pass
+    return walker.fingerprint
+
+def cached_search(search_request: SearchRequest, source: str, cache_key: str) -> Optional[CachedSearch]:
+    """The cached result of a request, if still fresh (may walk the folders: call off the event loop).
 
-async def search_files_streaming(search_request: SearchRequest):
-    """Search for query in all files and yield results as they're found"""
-    all_files = []
+    Watched folders are fresh until a watcher event bumps their generation;
+    other folders are re-walked (stat only) and compared with the files the
+    cached search saw. Index answers are fresh until the index is written.
+    """
+    if source == "index":
+        def is_fresh(entry: CachedSearch) -> bool:
+            return entry.stamp == search_index.commits
+    elif all(is_watched_folder(folder) for folder in search_request.folders):
+        is_fresh = None
+    else:
+        def is_fresh(entry: CachedSearch) -> bool:
+            return entry.stamp == walk_fingerprint(search_request)
+    return result_cache.get(cache_key, search_request.folders, is_fresh)
+
+async def run_in_worker(seconds: float, function, *args):
+    """function(*args) in a search worker process, which is killed if it takes longer than seconds.
+
+    Raises asyncio.TimeoutError then; for work that can't be interrupted
+    in-process, like a backtracking regex (which also holds the GIL).
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(WORKER_RETRIES + 1):
+        pool = get_search_pool()
+        future = loop.run_in_executor(pool, metrics.run_collecting, function, *args)
+        try:
+            result, recorded = await asyncio.wait_for(future, seconds)
+        except asyncio.TimeoutError:
+            recycle_search_pool(pool)
+            metrics.inc("anvesh_worker_restarts_total", reason="timeout")
+            raise
+        except BrokenProcessPool:
+            # Another search recycled the pool under us
+            recycle_search_pool(pool)
+            if attempt == WORKER_RETRIES:
+                raise
+            continue
+        metrics.merge(recorded)
+        return result
+
+async def index_query(search_request: SearchRequest, profiler: Optional[profiling.SearchProfile] = None) -> Optional[List[FileResult]]:
+    """Answer a request from the search index (off the event loop).
+
+    A backtracking regex is matched in a worker process; if it takes longer
+    than REGEX_TIMEOUT this returns None, and the caller scans the files
+    instead, where each file has its own time limit and slow ones are skipped.
+    """
+    start_time = time.time()
+    start = time.perf_counter()
+    query = rank_from_index if search_request.limit is not None else search_from_index
+    if is_backtracking(search_request):
+        try:
+            file_results = await run_in_worker(REGEX_TIMEOUT, query, search_request)
+        except asyncio.TimeoutError:
+            print(f"Regex index query timed out after {REGEX_TIMEOUT:g}s; scanning files instead: {search_label(search_request)}")
+            return None
+    else:
+        file_results = await asyncio.to_thread(query, search_request)
+    if content_hash.ENABLED and file_results:
+        file_results = await asyncio.to_thread(mark_index_duplicates, search_request, file_results)
+    if profiler:
+        profiler.source = "index"
+        profiler.add_span("index query", start_time, time.perf_counter() - start)
+    return file_results
+
+def mark_index_duplicates(search_request: SearchRequest, file_results: List[FileResult]) -> List[FileResult]:
+    """Mark index results that are copies of each other (the first path of a group is the original).
+
+    With collapse_duplicates, only the first result of each group is kept,
+    listing the group's other paths in its duplicates.
+    """
+    digests = search_index.content_digests([r.file_path for r in file_results])
+    if not digests:
+        return file_results
+    groups = search_index.copies(search_request.folders, digests.values())
+    kept = []
+    seen = set()
+    for file_result in file_results:
+        digest = digests.get(file_result.file_path)
+        group = groups.get(digest, [])
+        if len(group) < 2:
+            kept.append(file_result)
+        elif not search_request.collapse_duplicates:
+            if file_result.file_path != group[0]:
+                file_result.duplicate_of = group[0]
+            kept.append(file_result)
+        elif digest not in seen:
+            seen.add(digest)
+            file_result.duplicates = [path for path in group if path != file_result.file_path]
+            kept.append(file_result)
+    return kept
+
+def record_search(source: str, start: float):
+    """Count a finished search and its time for /api/metrics (source: cache, index or scan)"""
+    metrics.inc("anvesh_searches_total", source=source)
+    metrics.observe("anvesh_search_seconds", time.perf_counter() - start, source=source)
+
+async def search_files_streaming(search_request: SearchRequest, search: Optional[ActiveSearch] = None,
+                                 profiler: Optional[profiling.SearchProfile] = None):
+    """Search for query in all files and yield events as results are found.
     
-    # Collect all files from selected folders
-    for folder in search_request.folders:
-        if os.path.isdir(folder):
-            all_files.extend(get_supported_files(folder))
+    Events are dicts; matching files come as "results" events holding
+    FileResult objects, which the endpoint batches and encodes. A profiled
+    search never replays the result cache, and records its files in profiler.
+    """
+    start = time.perf_counter()
+    search_id = search.id if search else None
+    # Totals per term are reported on completion for multi-term searches
+    term_totals = {} if len(search_terms(search_request)) > 1 else None
+    # With a limit, results are ranked by relevance and only the requested page is sent
+    ranked = search_request.limit is not None
+    
+    # A repeated search whose folders haven't changed is replayed from the result cache
+    source = "index" if use_search_index(search_request) else "scan"
+    cache_key = result_cache_key(search_request, source)
+    generations = result_cache.generations(search_request.folders)
+    cached = None if profiler else await asyncio.to_thread(cached_search, search_request, source, cache_key)
+    if cached is not None:
+        yield {'type': 'status', 'search_id': search_id, 'total_files': cached.files_processed, 'files_processed': 0, 'cached': True, 'message': 'Showing cached results...'}
+        for file_path, reason in cached.skipped:
+            yield {'type': 'skipped', 'file_path': file_path, 'reason': reason}
+        yield {'type': 'results', 'data': cached.results}
+        yield {'type': 'progress', 'files_processed': cached.files_processed, 'total_files': cached.files_processed, 'progress': 100, 'results_found': len(cached.results)}
+        yield {**cached.complete, 'cached': True}
+        record_search("cache", start)
+        return
     
-    total_files = len(all_files)
+    if source == "index":
+        index_stamp = search_index.commits
+        total_files = await asyncio.to_thread(search_index.count_files, search_request.folders)
+        yield {'type': 'status', 'search_id': search_id, 'total_files': total_files, 'files_processed': 0, 'message': f'Searching index of {total_files} files...'}
+        file_results = await index_query(search_request, profiler)
+        if file_results is None:  # Regex too slow over the whole index: scan, with a time limit per file
+            source = "scan"
+            cache_key = result_cache_key(search_request, source)
+        else:
+            yield {'type': 'results', 'data': file_results}
+            yield {'type': 'progress', 'files_processed': total_files, 'total_files': total_files, 'progress': 100, 'results_found': len(file_results)}
+            complete = {'type': 'complete', 'total_results': len(file_results)}
+            if term_totals is not None:
+                complete['term_counts'] = sum_term_counts(r.term_counts for r in file_results)
+            if ranked:
+                complete['ranked'] = True
+            yield complete
+            record_search("index", start)
+            result_cache.put(cache_key, CachedSearch(file_results, [], complete, total_files, generations, index_stamp), search_request.folders)
+            return
+    
+    # Walk the selected folders in the background; searching starts with the first file found,
+    # so the total is a running estimate until the walk finishes
+    walker = make_walker(search_request)
+    groups = ContentGroups() if content_hash.ENABLED else None
+    collapse = search_request.collapse_duplicates
     files_processed = 0
     results_count = 0
+    skipped_count = 0
+    ranking_pool = []  # Every match of a ranked search, scored once the scan is done
+    sent_results = []  # For the result cache
+    sent_skipped = []
+    sent_paths = set()  # Files sent as results of their own, which copies can be collapsed into
     
     # Send initial status
-    yield f"data: {json.dumps({'type': 'status', 'total_files': total_files, 'files_processed': 0, 'message': f'Found {total_files} files to search...'})}\n\n"
+    yield {'type': 'status', 'search_id': search_id, 'total_files': 0, 'files_processed': 0, 'estimated': True, 'message': 'Searching...'}
     
-    # Search in each file
-    for file_path in all_files:
+    # Search files (in parallel when workers are enabled); results stream as each file finishes
+    file_paths = walk_files(walker, search_request.folders, search, groups)
+    async for file_result in iter_file_results(search_request, file_paths, search, profiler=profiler, groups=groups):
         files_processed += 1
-        ext = os.path.splitext(file_path)[1].lower()
-        matches = []
+        total_files = max(walker.estimate_total(), files_processed)
+        if search:
+            search.files_processed = files_processed
+            search.total_files = total_files
         
-        # If filename search was requested, check filename match
-        if search_request.search_filenames:
-            filename = os.path.basename(file_path)
-            if search_request.case_sensitive:
-                search_filename = filename
-                search_query = search_request.query
-            else:
-                search_filename = filename.lower()
-                search_query = search_request.query.lower()
-            
-            if search_query in search_filename:
-                count = search_filename.count(search_query)
-                matches.append(SearchResult(
-                    file_path=file_path,
-                    line_number=None,
-                    content=f"Filename match: {filename}",
-                    occurrences=count
-                ))
-        
-        # Always search file contents
-        if ext == '.txt':
-            content_matches = search_txt(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
-        elif ext in ['.docx', '.doc']:
-            content_matches = search_docx(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
-        elif ext in ['.xlsx', '.xls']:
-            content_matches = search_xlsx(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
-        elif ext in ['.pptx', '.ppt']:
-            content_matches = search_pptx(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
-        elif ext == '.pdf':
-            content_matches = search_pdf(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
+        # Files too large, unreadable or too slow to search are reported, not silently dropped
+        skipped = [(file_result.file_path, file_result.reason)] if isinstance(file_result, SkippedFile) else []
+        skipped.extend(walker.take_skipped())
+        for file_path, reason in skipped:
+            skipped_count += 1
+            sent_skipped.append((file_path, reason))
+            yield {'type': 'skipped', 'file_path': file_path, 'reason': reason}
+        if isinstance(file_result, SkippedFile):
+            file_result = None
         
-        # If file has matches, send it immediately
-        if matches:
+        # If file has matches, send it immediately (ranked searches send theirs at the end).
+        # When collapsing duplicates, a copy of a file already sent comes without its matches.
+        if file_result and collapse and not ranked and file_result.duplicate_of in sent_paths:
+            file_result = duplicate_stub(file_result)
+            sent_results.append(file_result)
+            yield {'type': 'results', 'data': [file_result]}
+        elif file_result:
             results_count += 1
-            total_occurrences = sum(m.occurrences for m in matches)
-            file_result = FileResult(
-                file_path=file_path,
-                total_occurrences=total_occurrences,
-                matches=matches
-            )
-            yield f"data: {json.dumps({'type': 'result', 'data': file_result.model_dump()})}\n\n"
+            if term_totals is not None:
+                term_totals = sum_term_counts([term_totals, file_result.term_counts])
+            if ranked:
+                ranking_pool.append(file_result)
+            else:
+                sent_results.append(file_result)
+                sent_paths.add(file_result.file_path)
+                yield {'type': 'results', 'data': [file_result]}
         
-        # Send progress update every 10 files or on last file
-        if files_processed % 10 == 0 or files_processed == total_files:
-            progress = int((files_processed / total_files) * 100) if total_files > 0 else 0
-            yield f"data: {json.dumps({'type': 'progress', 'files_processed': files_processed, 'total_files': total_files, 'progress': progress, 'results_found': results_count})}\n\n"
+        # Send progress update every 10 files
+        if files_processed % 10 == 0:
+            progress = int((files_processed / total_files) * 100)
+            if not walker.done:
+                progress = min(progress, 99)
+            yield {'type': 'progress', 'files_processed': files_processed, 'total_files': total_files, 'estimated': not walker.done, 'progress': progress, 'results_found': results_count}
+    
+    for file_path, reason in walker.take_skipped():
+        skipped_count += 1
+        sent_skipped.append((file_path, reason))
+        yield {'type': 'skipped', 'file_path': file_path, 'reason': reason}
+    
+    # Final progress (the walk is finished unless the search was cancelled)
+    total_files = max(walker.estimate_total(), files_processed)
+    progress = 100 if walker.done else int((files_processed / total_files) * 100) if total_files else 0
+    yield {'type': 'progress', 'files_processed': files_processed, 'total_files': total_files, 'estimated': not walker.done, 'progress': progress, 'results_found': results_count}
+    
+    if ranked:
+        if collapse:
+            ranking_pool = collapse_duplicates(ranking_pool)
+            results_count = len(ranking_pool)
+        file_results = rank_results(search_request, ranking_pool, files_processed)
+        sent_results = file_results
+        yield {'type': 'results', 'data': file_results}
     
     # Send completion
-    yield f"data: {json.dumps({'type': 'complete', 'total_results': results_count})}\n\n"
+    complete = {'type': 'complete', 'total_results': len(file_results) if ranked else results_count}
+    if term_totals is not None:
+        complete['term_counts'] = term_totals
+    if skipped_count:
+        complete['skipped'] = skipped_count
+    if groups is not None and groups.copies:
+        complete['duplicates'] = groups.stats()
+    if ranked:
+        complete['ranked'] = True
+        complete['matching_files'] = results_count
+    if search and search.cancelled.is_set():
+        complete['cancelled'] = True
+    yield complete
+    record_search("scan", start)
+    if walker.done and not complete.get('cancelled'):
+        cached = CachedSearch(sent_results, sent_skipped, complete, files_processed, generations, walker.fingerprint)
+        result_cache.put(cache_key, cached, search_request.folders)
 
-async def search_files(search_request: SearchRequest) -> List[FileResult]:
+async def search_files(search_request: SearchRequest, search: Optional[ActiveSearch] = None,
+                       profiler: Optional[profiling.SearchProfile] = None) -> List[FileResult]:
     """Search for query in all files across selected folders (non-streaming version for compatibility)"""
-    all_files = []
+    start = time.perf_counter()
+    ranked = search_request.limit is not None
+    source = "index" if use_search_index(search_request) else "scan"
+    cache_key = result_cache_key(search_request, source, "list")
+    generations = result_cache.generations(search_request.folders)
+    cached = None if profiler else await asyncio.to_thread(cached_search, search_request, source, cache_key)
+    if cached is not None:
+        record_search("cache", start)
+        return cached.results
     
-    # Collect all files from selected folders
-    for folder in search_request.folders:
-        if os.path.isdir(folder):
-            all_files.extend(get_supported_files(folder))
+    if source == "index":
+        index_stamp = search_index.commits
+        file_results = await index_query(search_request, profiler)
+        if file_results is not None:
+            result_cache.put(cache_key, CachedSearch(file_results, [], {}, 0, generations, index_stamp), search_request.folders)
+            record_search("index", start)
+            return file_results
+        source = "scan"  # Regex too slow over the whole index: scan, with a time limit per file
+        cache_key = result_cache_key(search_request, source, "list")
     
+    walker = make_walker(search_request)
+    groups = ContentGroups() if content_hash.ENABLED else None
     file_results = []
+    files_searched = 0
     
     # Search in each file
-    for file_path in all_files:
-        ext = os.path.splitext(file_path)[1].lower()
-        matches = []
+    file_paths = walk_files(walker, search_request.folders, search, groups)
+    async for file_result in iter_file_results(search_request, file_paths, search, profiler=profiler, groups=groups):
+        files_searched += 1
+        if search:
+            search.files_processed = files_searched
+            search.total_files = max(walker.estimate_total(), files_searched)
+        if isinstance(file_result, FileResult):
+            file_results.append(file_result)
+    
+    if search_request.collapse_duplicates:
+        file_results = collapse_duplicates(file_results)
+    if ranked:
+        file_results = rank_results(search_request, file_results, files_searched)
+    if walker.done and not (search and search.cancelled.is_set()):
+        result_cache.put(cache_key, CachedSearch(file_results, [], {}, files_searched, generations, walker.fingerprint), search_request.folders)
+    record_search("scan", start)
+    return file_results
+
+def batch_walk_request(batch: BatchSearchRequest) -> SearchRequest:
+    """The settings a batch's searches share (folders, walk filters, workers), as a SearchRequest"""
+    return SearchRequest(**batch.model_dump(include={
+        "folders", "include", "exclude", "max_depth", "skip_hidden", "max_file_size_mb", "workers", "file_timeout"
+    }))
+
+def batch_search_requests(batch: BatchSearchRequest) -> List[SearchRequest]:
+    """Each query of a batch as a full SearchRequest; raises 400 for a bad query"""
+    if not batch.queries:
+        raise HTTPException(status_code=400, detail="queries can't be empty")
+    ids = [query.id or str(index) for index, query in enumerate(batch.queries)]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Query ids must be unique")
+    
+    shared = batch_walk_request(batch).model_dump()
+    search_requests = []
+    for query_id, query in zip(ids, batch.queries):
+        search_request = SearchRequest(**{**shared, **query.model_dump(exclude={"id"})})
+        if not any(search_terms(search_request)):
+            raise HTTPException(status_code=400, detail=f"Query {query_id}: query or terms is required")
+        try:
+            validate_search(search_request)
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Query {query_id}: {e.detail}")
+        search_requests.append(search_request)
+    return search_requests
+
+def ndjson_line(data: Dict) -> str:
+    return json.dumps(data) + "\n"
+
+async def search_batch_lines(batch: BatchSearchRequest, search_requests: List[SearchRequest], search: Optional[ActiveSearch] = None) -> AsyncGenerator[str, None]:
+    """Run a batch of searches in one walk of the folders, yielding NDJSON lines.
+    
+    Each file is extracted once and checked against every search (see
+    search_file_batch). Lines: "result" (query_id, data) as files finish,
+    "skipped" and "progress" as in /api/search, then "query_complete" per
+    search (ranked searches send their results just before it) and a final
+    "complete".
+    """
+    start_time = time.time()
+    ids = [query.id or str(index) for index, query in enumerate(batch.queries)]
+    jobs = tuple(
+        (search_terms(r), search_mode(r), r.case_sensitive, r.search_filenames, r.max_matches_per_file)
+        for r in search_requests
+    )
+    shared = batch_walk_request(batch)
+    walker = make_walker(shared)
+    
+    matching_files = [0] * len(jobs)
+    term_totals = [{} if len(job[0]) > 1 else None for job in jobs]
+    ranking_pools = {index: [] for index, r in enumerate(search_requests) if r.limit is not None}
+    files_processed = 0
+    skipped_count = 0
+    
+    groups = ContentGroups() if content_hash.ENABLED else None
+    file_paths = walk_files(walker, batch.folders, search, groups)
+    backtracking = any(is_backtracking(r) for r in search_requests)
+    async for outcome in iter_file_results(shared, file_paths, search, search_file_batch, (jobs,), groups=groups,
+                                           copy_function=copy_batch_result, backtracking=backtracking):
+        files_processed += 1
+        total_files = max(walker.estimate_total(), files_processed)
+        if search:
+            search.files_processed = files_processed
+            search.total_files = total_files
         
-        # If filename search was requested, check filename match
-        if search_request.search_filenames:
-            filename = os.path.basename(file_path)
-            if search_request.case_sensitive:
-                search_filename = filename
-                search_query = search_request.query
-            else:
-                search_filename = filename.lower()
-                search_query = search_request.query.lower()
-            
-            if search_query in search_filename:
-                count = search_filename.count(search_query)
-                matches.append(SearchResult(
-                    file_path=file_path,
-                    line_number=None,
-                    content=f"Filename match: {filename}",
-                    occurrences=count
-                ))
+        skipped = [(outcome.file_path, outcome.reason)] if isinstance(outcome, SkippedFile) else []
+        skipped.extend(walker.take_skipped())
+        for file_path, reason in skipped:
+            skipped_count += 1
+            yield ndjson_line({'type': 'skipped', 'file_path': file_path, 'reason': reason})
         
-        # Always search file contents
-        if ext == '.txt':
-            content_matches = search_txt(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
-        elif ext in ['.docx', '.doc']:
-            content_matches = search_docx(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
-        elif ext in ['.xlsx', '.xls']:
-            content_matches = search_xlsx(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
-        elif ext in ['.pptx', '.ppt']:
-            content_matches = search_pptx(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
-        elif ext == '.pdf':
-            content_matches = search_pdf(file_path, search_request.query, search_request.exact_match, search_request.case_sensitive)
-            matches.extend(content_matches)
+        if isinstance(outcome, list):
+            for index, file_result in enumerate(outcome):
+                if file_result is None:
+                    continue
+                matching_files[index] += 1
+                if term_totals[index] is not None:
+                    term_totals[index] = sum_term_counts([term_totals[index], file_result.term_counts])
+                if index in ranking_pools:
+                    ranking_pools[index].append(file_result)
+                else:
+                    yield ndjson_line({'type': 'result', 'query_id': ids[index], 'data': file_result.model_dump()})
         
-        if matches:
-            total_occurrences = sum(m.occurrences for m in matches)
-            file_results.append(FileResult(
-                file_path=file_path,
-                total_occurrences=total_occurrences,
-                matches=matches
-            ))
+        if files_processed % 100 == 0:
+            yield ndjson_line({'type': 'progress', 'files_processed': files_processed, 'total_files': total_files, 'estimated': not walker.done})
     
-    return file_results
+    for file_path, reason in walker.take_skipped():
+        skipped_count += 1
+        yield ndjson_line({'type': 'skipped', 'file_path': file_path, 'reason': reason})
+    
+    for index, search_request in enumerate(search_requests):
+        query_complete = {'type': 'query_complete', 'query_id': ids[index], 'total_results': matching_files[index]}
+        if index in ranking_pools:
+            file_results = rank_results(search_request, ranking_pools[index], files_processed)
+            for file_result in file_results:
+                yield ndjson_line({'type': 'result', 'query_id': ids[index], 'data': file_result.model_dump()})
+            query_complete.update(total_results=len(file_results), ranked=True, matching_files=matching_files[index])
+        if term_totals[index] is not None:
+            query_complete['term_counts'] = term_totals[index]
+        yield ndjson_line(query_complete)
+    
+    complete = {'type': 'complete', 'queries': len(jobs), 'files_processed': files_processed,
+                'elapsed': round(time.time() - start_time, 3)}
+    if skipped_count:
+        complete['skipped'] = skipped_count
+    if groups is not None and groups.copies:
+        complete['duplicates'] = groups.stats()
+    if search and search.cancelled.is_set():
+        complete['cancelled'] = True
+    yield ndjson_line(complete)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -462,46 +1509,85 @@ async def read_root():
         return HTMLResponse(content=f.read())
 
 @app.post("/api/search")
-async def search(search_request: SearchRequest):
+async def search(search_request: SearchRequest, request: Request):
     """Search endpoint - streaming results"""
+    validate_search(search_request)
+    stream_format = search_request.stream_format
+    if stream_format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown stream_format: {stream_format} (use one of {', '.join(STREAM_FORMATS)})")
+    if stream_format == "msgpack" and not MSGPACK_AVAILABLE:
+        raise HTTPException(status_code=400, detail="stream_format msgpack needs msgpack (pip install msgpack)")
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", "")) if STREAM_COMPRESSION_LEVEL else None
+    active_search = ActiveSearch(search_request)
+    active_searches[active_search.id] = active_search
+    profiler = profiling.SearchProfile(active_search.id, active_search.query) if search_request.profile else None
+    
     async def generate():
-        start_time = time.time()
-        results_count = 0
+        compressor = StreamCompressor(encoding, STREAM_COMPRESSION_LEVEL) if encoding else None
+        events = coalesce_results(search_files_streaming(search_request, active_search, profiler), STREAM_BATCH_DELAY, STREAM_BATCH_RESULTS)
         
-        async for chunk in search_files_streaming(search_request):
-            yield chunk
-            # Parse chunk to get results count
-            if chunk.startswith("data: "):
-                try:
-                    data = json.loads(chunk[6:])
-                    if data.get('type') == 'result':
-                        results_count += 1
-                    elif data.get('type') == 'complete':
-                        results_count = data.get('total_results', results_count)
-                        # Log search history after completion
-                        log_search_history(
-                            search_request.query,
-                            search_request.folders,
-                            results_count,
-                            search_request.exact_match,
-                            search_request.case_sensitive,
-                            search_request.search_filenames
-                        )
-                except:
-                    pass
-    
-    return StreamingResponse(generate(), media_type="text/event-stream")
+        encode_seconds = 0.0
+        sent_bytes = 0
+        
+        # If the client disconnects, Starlette cancels this generator at its next await;
+        # the finally blocks cancel queued files and unregister the search.
+        try:
+            async for event in events:
+                if event['type'] == 'complete':
+                    # Log search history after completion
+                    log_search_history(
+                        search_label(search_request),
+                        search_request.folders,
+                        event.get('total_results', 0),
+                        search_request.exact_match,
+                        search_request.case_sensitive,
+                        search_request.search_filenames
+                    )
+                    if profiler:
+                        # A copy: the result cache keeps the original event
+                        profiler.finish()
+                        event = {**event, 'profile': profiler.summary()}
+                        keep_profile(profiler)
+                encode_start = time.perf_counter()
+                timings = {} if profiler and event['type'] == 'results' else None
+                chunk = encode_event(event, stream_format, timings)
+                if timings:
+                    profiler.serialized(timings)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                encode_seconds += time.perf_counter() - encode_start
+                sent_bytes += len(chunk)
+                yield chunk
+            if compressor:
+                chunk = compressor.finish()
+                sent_bytes += len(chunk)
+                yield chunk
+        finally:
+            metrics.observe("anvesh_stream_encode_seconds", encode_seconds, format=stream_format)
+            metrics.inc("anvesh_stream_bytes_total", sent_bytes, format=stream_format, encoding=encoding or "identity")
+            active_search.cancelled.set()
+            active_searches.pop(active_search.id, None)
+    
+    headers = {"X-Search-Id": active_search.id}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(generate(), media_type=STREAM_FORMATS[stream_format], headers=headers)
 
 @app.post("/api/search-sync")
 async def search_sync(search_request: SearchRequest):
     """Synchronous search endpoint (for compatibility)"""
+    validate_search(search_request)
+    active_search = ActiveSearch(search_request)
+    active_searches[active_search.id] = active_search
+    profiler = profiling.SearchProfile(active_search.id, active_search.query) if search_request.profile else None
     try:
-        results = await search_files(search_request)
+        results = await search_files(search_request, active_search, profiler)
         results_count = len(results)
         
         # Log search history
         log_search_history(
-            search_request.query,
+            search_label(search_request),
             search_request.folders,
             results_count,
             search_request.exact_match,
@@ -509,33 +1595,436 @@ async def search_sync(search_request: SearchRequest):
             search_request.search_filenames
         )
         
-        return JSONResponse(content={"results": [r.model_dump() for r in results]})
+        if not profiler:
+            return JSONResponse(content={"results": [r.model_dump() for r in results]}, headers={"X-Search-Id": active_search.id})
+        timings = {}
+        content = {"results": serialize_results(results, lambda r: r.model_dump(), timings)}
+        profiler.serialized(timings)
+        profiler.finish()
+        content["profile"] = profiler.summary()
+        keep_profile(profiler)
+        return JSONResponse(content=content, headers={"X-Search-Id": active_search.id})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        active_searches.pop(active_search.id, None)
 
-@app.get("/api/history")
-async def get_history():
-    """Get search history"""
-    # History file should be in the same directory as the executable (for persistence)
-    if getattr(sys, 'frozen', False):
-        # Running as executable - save history next to the .exe file
-        base_path = os.path.dirname(sys.executable)
-    else:
-        # Running as script - save in script directory
-        base_path = os.path.dirname(os.path.abspath(__file__))
+# Batches writing their results to a file; referenced until done so they aren't garbage collected
+batch_tasks = set()
+
+# Batch results written in the background ("output") go in this folder of the data directory
+BATCH_OUTPUT_FOLDER = "batch_results"
+
+def batch_output_path(name: str) -> str:
+    """Where a batch's "output" file goes: a plain, new file name inside BATCH_OUTPUT_FOLDER"""
+    separators = {"/", "\\", os.sep} | ({os.altsep} if os.altsep else set())
+    if not name or name in (".", "..") or ".." in name or any(s in name for s in separators) or ":" in name:
+        raise HTTPException(status_code=400, detail="output must be a file name, without folders or '..'")
+    folder = data_path(BATCH_OUTPUT_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    if os.path.exists(path):
+        raise HTTPException(status_code=409, detail=f"Output file already exists: {name}")
+    return path
+
+@app.post("/api/search/batch")
+async def search_batch(batch: BatchSearchRequest):
+    """Run many searches over the same folders in one pass, each file extracted once.
+    
+    Streams NDJSON lines (see search_batch_lines), or with "output" writes
+    them to a new file of that name in BATCH_OUTPUT_FOLDER in the background
+    and returns the search id at once (progress in /api/searches, cancel
+    with DELETE /api/search/{id}).
+    """
+    search_requests = batch_search_requests(batch)
+    output_path = batch_output_path(batch.output) if batch.output else None
+    active_search = ActiveSearch(batch_walk_request(batch))
+    active_search.query = f"Batch of {len(search_requests)} queries"
+    active_searches[active_search.id] = active_search
+    
+    if output_path:
+        async def write_output():
+            try:
+                with open(output_path, "x", encoding="utf-8") as f:  # Never overwrites, even if created meanwhile
+                    async for line in search_batch_lines(batch, search_requests, active_search):
+                        f.write(line)
+            except Exception as e:
+                print(f"Error writing batch results to {output_path}: {e}")
+            finally:
+                active_searches.pop(active_search.id, None)
+        
+        task = asyncio.create_task(write_output())
+        batch_tasks.add(task)
+        task.add_done_callback(batch_tasks.discard)
+        return JSONResponse(status_code=202, content={"search_id": active_search.id, "output": output_path})
+    
+    async def generate():
+        # As in /api/search: a client disconnect cancels the batch
+        try:
+            async for line in search_batch_lines(batch, search_requests, active_search):
+                yield line
+        finally:
+            active_search.cancelled.set()
+            active_searches.pop(active_search.id, None)
     
-    log_file = os.path.join(base_path, "search_history.json")
+    return StreamingResponse(generate(), media_type="application/x-ndjson", headers={"X-Search-Id": active_search.id})
+
+@app.get("/api/searches")
+async def list_searches():
+    """List running searches"""
+    return JSONResponse(content={"searches": [s.to_dict() for s in active_searches.values()]})
+
+@app.delete("/api/search/{search_id}")
+async def cancel_search(search_id: str):
+    """Cancel a running search"""
+    active_search = active_searches.get(search_id)
+    if not active_search:
+        raise HTTPException(status_code=404, detail="Search not found")
+    
+    active_search.cancelled.set()
+    return JSONResponse(content=active_search.to_dict())
+
+@app.get("/api/search/{search_id}/trace")
+async def search_trace(search_id: str):
+    """Download a profiled search's Chrome trace (open it in chrome://tracing or ui.perfetto.dev)"""
+    profiler = search_profiles.get(search_id)
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="No profile for this search (run it with \"profile\": true; only recent ones are kept)")
+    return JSONResponse(content=profiler.trace(),
+                        headers={"Content-Disposition": f'attachment; filename="anvesh-trace-{search_id}.json"'})
+
+@app.get("/api/history")
+async def get_history(limit: int = 50, offset: int = 0, q: Optional[str] = None, folder: Optional[str] = None,
+                      since: Optional[str] = None, until: Optional[str] = None):
+    """Get search history, newest first, a page at a time (q: text in the query, folder: text in a searched folder)"""
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset can't be negative")
     try:
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-            # Return in reverse order (newest first)
-            return JSONResponse(content={"history": list(reversed(history))})
-        else:
-            return JSONResponse(content={"history": []})
+        history, total = await asyncio.to_thread(search_history.query, q, folder, since, until, limit, offset)
+        return JSONResponse(content={"history": history, "total": total, "limit": limit, "offset": offset})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class IndexRequest(BaseModel):
+    folders: List[str]
+
+@app.post("/api/index/build")
+async def build_index(request: IndexRequest):
+    """Build or incrementally refresh the search index for folders (runs in background)"""
+    missing = [folder for folder in request.folders if not os.path.isdir(folder)]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Folder not found: {missing[0]}")
+    
+    if not search_index.start_build(request.folders, get_supported_files, extract_file):
+        raise HTTPException(status_code=409, detail="An index build is already running")
+    
+    return JSONResponse(content=search_index.get_status())
+
+@app.get("/api/index/status")
+async def index_status():
+    """Get search index size and build progress"""
+    return JSONResponse(content=search_index.get_status())
+
+@app.delete("/api/index")
+async def drop_index(folder: Optional[str] = None):
+    """Drop the whole search index, or only one indexed folder"""
+    if search_index.is_building():
+        raise HTTPException(status_code=409, detail="An index build is running")
+    
+    search_index.drop(folder)
+    return JSONResponse(content=search_index.get_status())
+
+# ==================== File Catalog ====================
+
+class CatalogRequest(BaseModel):
+    folders: List[str]
+
+class FileSearchRequest(BaseModel):
+    query: str = ""  # Part of the file name (empty = any name)
+    folders: List[str]
+    case_sensitive: bool = False
+    extensions: List[str] = []  # e.g. ["pdf", ".docx"]
+    min_size: Optional[int] = None  # Bytes
+    max_size: Optional[int] = None
+    modified_after: Optional[datetime] = None
+    modified_before: Optional[datetime] = None
+    sort: str = "name"  # "name", "modified" (newest first) or "size" (largest first)
+    limit: int = 100
+    offset: int = 0
+
+@app.post("/api/catalog/refresh")
+async def refresh_catalog(request: CatalogRequest):
+    """Catalog folders, or refresh them incrementally (runs in background)"""
+    missing = [folder for folder in request.folders if not os.path.isdir(folder)]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Folder not found: {missing[0]}")
+    
+    if not file_catalog.start_refresh(request.folders, catalog_walk):
+        raise HTTPException(status_code=409, detail="A catalog refresh is already running")
+    
+    return JSONResponse(content=file_catalog.get_status())
+
+@app.get("/api/catalog/status")
+async def catalog_status():
+    """Get file catalog size and refresh progress"""
+    return JSONResponse(content=file_catalog.get_status())
+
+@app.delete("/api/catalog")
+async def drop_catalog(folder: Optional[str] = None):
+    """Forget every cataloged folder, or only one"""
+    if file_catalog.is_refreshing():
+        raise HTTPException(status_code=409, detail="A catalog refresh is running")
+    
+    file_catalog.drop(folder)
+    return JSONResponse(content=file_catalog.get_status())
+
+@app.post("/api/files/search")
+async def search_file_names(request: FileSearchRequest):
+    """Find files by name, type, size and modification date from the file catalog"""
+    if not 1 <= request.limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    
+    # Folders searched for the first time are cataloged now; later searches are instant
+    uncovered = [folder for folder in request.folders if os.path.isdir(folder) and not file_catalog.is_cataloged_path(folder)]
+    if uncovered:
+        await asyncio.to_thread(file_catalog.refresh, uncovered, catalog_walk)
+    
+    # Unwatched folders go stale: answer from the catalog now and refresh it for the next search
+    stale = [folder for folder in file_catalog.stale_roots(request.folders, CATALOG_MAX_AGE)
+             if not is_watched_folder(folder) and os.path.isdir(folder)]
+    if stale:
+        file_catalog.start_refresh(stale, catalog_walk)
+    
+    to_ns = lambda value: int(value.timestamp() * 1e9) if value else None
+    start_time = time.time()
+    results = await asyncio.to_thread(
+        file_catalog.search,
+        request.folders,
+        request.query,
+        case_sensitive=request.case_sensitive,
+        extensions=request.extensions,
+        min_size=request.min_size,
+        max_size=request.max_size,
+        modified_after_ns=to_ns(request.modified_after),
+        modified_before_ns=to_ns(request.modified_before),
+        sort=request.sort,
+        limit=request.limit,
+        offset=request.offset
+    )
+    results["search_time"] = round(time.time() - start_time, 4)
+    return JSONResponse(content=results)
+
+# ==================== Folder Watcher ====================
+
+def is_walked_file(file_path: str) -> bool:
+    """Whether walking its watched folder would find file_path (i.e. it isn't hidden)"""
+    for folder in folder_watcher.folders():
+        if file_path.startswith(folder.rstrip(os.sep) + os.sep):
+            return not is_hidden_path(os.path.relpath(file_path, folder))
+    return True
+
+def is_watched_file(file_path: str) -> bool:
+    """Whether the watcher reports a file: searchable ones, and any file in a cataloged folder"""
+    return is_supported_file(file_path) or file_catalog.is_cataloged_path(file_path)
+
+def watcher_file_changed(file_path: str):
+    """Re-extract a created/modified file into the index (or just the extraction cache)"""
+    result_cache.bump(file_path)
+    if not is_walked_file(file_path):
+        return
+    file_catalog.update_file(file_path)
+    if not is_supported_file(file_path):
+        return  # Only cataloged
+    if search_index.is_indexed_path(file_path):
+        search_index.update_file(file_path, extract_file)
+    elif os.path.splitext(file_path)[1].lower() != '.txt':
+        # Not indexed: keep the extraction cache warm for the next live search. PDFs are
+        # extracted (and cached) page by page as their chunks are read, so read them all
+        for _ in extract_file(file_path):
+            pass
+
+def watcher_path_deleted(path: str):
+    """Drop a deleted/renamed file or directory from the index and extraction cache"""
+    result_cache.bump(path)
+    search_index.remove_path(path)
+    extraction_cache.remove(path)
+    file_catalog.remove_path(path)
+
+def watcher_rescan(folder: str):
+    """Reconcile a folder after the watcher lost events"""
+    result_cache.bump(folder)
+    if search_index.is_indexed_path(folder):
+        search_index.start_build([folder], get_supported_files, extract_file)
+    if file_catalog.is_cataloged_path(folder):
+        file_catalog.start_refresh([folder], catalog_walk)
+
+folder_watcher = FolderWatcher(
+    on_change=watcher_file_changed,
+    on_delete=watcher_path_deleted,
+    on_rescan=watcher_rescan,
+    is_supported=is_watched_file
+)
+
+def load_watched_folders() -> List[str]:
+    """Load the registered watch folders"""
+    watch_file = data_path("watched_folders.json")
+    try:
+        if os.path.exists(watch_file):
+            with open(watch_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error loading watched folders: {e}")
+    return []
+
+def save_watched_folders():
+    """Persist the registered watch folders so watching resumes after restart"""
+    try:
+        with open(data_path("watched_folders.json"), 'w', encoding='utf-8') as f:
+            json.dump(folder_watcher.folders(), f, indent=2, ensure_ascii=False)
+    except Exception as e:
+        print(f"Error saving watched folders: {e}")
+
+@app.on_event("startup")
+async def start_folder_watcher():
+    """Resume watching previously registered folders"""
+    for folder in load_watched_folders():
+        if os.path.isdir(folder):
+            folder_watcher.add_folder(folder)
+    if folder_watcher.folders():
+        folder_watcher.start()
+
+def warm_up():
+    """Import the lazily loaded libraries (PDF backend, openpyxl, AI) ahead of their first use"""
+    for module in (pdf_extractor.backend and pdf_extractor.backend.module, ooxml_text.excel_numbers, ooxml_text.excel_datetime):
+        if module is not None and module.available:
+            try:
+                module.load()
+            except ImportError:
+                pass  # Reported by load()
+    if AI_FEATURES_AVAILABLE and ai_features:
+        ai_features.warm_up()
+
+@app.on_event("startup")
+async def schedule_warm_up():
+    if WARMUP:
+        timer = threading.Timer(WARMUP_DELAY, warm_up)
+        timer.daemon = True
+        timer.start()
+
+@app.on_event("shutdown")
+async def stop_folder_watcher():
+    folder_watcher.stop()
+    search_history.close()
+
+@app.on_event("shutdown")
+async def stop_worker_pools():
+    """Stop the search and PDF page worker processes (the PDF workers keep their last document open)"""
+    global _search_pool
+    if _search_pool is not None:
+        _search_pool.shutdown(wait=False, cancel_futures=True)
+        _search_pool = None
+    pdf_extractor.shutdown()
+
+class WatchRequest(BaseModel):
+    folders: List[str]
+
+@app.post("/api/watch")
+async def watch_folders(request: WatchRequest):
+    """Register folders to keep indexed as files change"""
+    missing = [folder for folder in request.folders if not os.path.isdir(folder)]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Folder not found: {missing[0]}")
+    
+    for folder in request.folders:
+        folder_watcher.add_folder(folder)
+    save_watched_folders()
+    folder_watcher.start()
+    
+    # Watched folders need an initial index; the watcher keeps it fresh from there
+    unindexed = [folder for folder in request.folders if not search_index.is_indexed_path(folder)]
+    status = folder_watcher.get_status()
+    status["index_build_started"] = bool(unindexed) and search_index.start_build(unindexed, get_supported_files, extract_file)
+    return JSONResponse(content=status)
+
+@app.delete("/api/watch")
+async def unwatch_folder(folder: str):
+    """Stop watching a folder (its index entries are kept)"""
+    folder_watcher.remove_folder(folder)
+    save_watched_folders()
+    if not folder_watcher.folders():
+        folder_watcher.stop()
+    return JSONResponse(content=folder_watcher.get_status())
+
+@app.get("/api/watch/status")
+async def watch_status():
+    """Get watcher queue depth and lag"""
+    return JSONResponse(content=folder_watcher.get_status())
+
+@app.get("/api/cache/extraction")
+async def extraction_cache_stats():
+    """Get extraction cache size and hit/miss counters"""
+    return JSONResponse(content=extraction_cache.get_stats())
+
+@app.delete("/api/cache/extraction")
+async def purge_extraction_cache():
+    """Purge all cached extracted text"""
+    extraction_cache.purge()
+    return JSONResponse(content=extraction_cache.get_stats())
+
+@app.get("/api/cache/results")
+async def result_cache_stats():
+    """Get result cache size and hit/miss counters"""
+    return JSONResponse(content=result_cache.get_stats())
+
+@app.delete("/api/cache/results")
+async def purge_result_cache():
+    """Forget all cached search results"""
+    result_cache.purge()
+    return JSONResponse(content=result_cache.get_stats())
+
+# Gauges are read when /api/metrics is scraped
+metrics.gauge("anvesh_active_searches", "Searches running now", lambda: len(active_searches))
+metrics.gauge("anvesh_active_search_files", "Files the running searches have searched so far",
+              lambda: sum(search.files_processed for search in list(active_searches.values())))
+metrics.gauge("anvesh_search_workers", "Search worker processes allowed", lambda: SEARCH_WORKERS)
+metrics.gauge("anvesh_history_pending", "Search history entries waiting to be written", lambda: search_history.pending())
+metrics.gauge("anvesh_result_cache_entries", "Searches in the result cache", lambda: result_cache.get_stats()["entries"])
+metrics.gauge("anvesh_watcher_queue_depth", "File changes the folder watcher hasn't processed yet",
+              lambda: folder_watcher.get_status()["queue_depth"])
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Counters, gauges and latency histograms in the Prometheus text format"""
+    return PlainTextResponse(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/dedup")
+async def get_dedup_stats():
+    """Work saved by finding identical files, per component, and the hashing it took"""
+    saved_files = metrics.totals("anvesh_dedup_files_total")
+    saved_bytes = metrics.totals("anvesh_dedup_bytes_total")
+    saved = {
+        labels[0][1]: {"files": int(files), "bytes": int(saved_bytes.get(labels, 0))}
+        for labels, files in saved_files.items()
+    }
+    hashed_count, hashed_seconds = metrics.totals("anvesh_hash_seconds").get((), (0, 0.0))
+    return JSONResponse(content={
+        "enabled": content_hash.ENABLED,
+        "algorithm": content_hash.HASH_ALGORITHM,
+        "saved": saved,
+        "saved_total": {
+            "files": sum(entry["files"] for entry in saved.values()),
+            "bytes": sum(entry["bytes"] for entry in saved.values())
+        },
+        "hashed": {
+            "files": int(hashed_count),
+            "bytes": int(metrics.totals("anvesh_hash_bytes_total").get((), 0)),
+            "seconds": round(hashed_seconds, 3)
+        },
+        "digests_cached": len(content_hash.digests)
+    })
+
 @app.post("/api/open-file")
 async def open_file(request: dict):
     """Open file with default application, optionally at specific line"""
@@ -711,7 +2200,9 @@ async def health():
         "docx": DOCX_AVAILABLE,
         "xlsx": XLSX_AVAILABLE,
         "pptx": PPTX_AVAILABLE,
-        "pdf": PDF_AVAILABLE
+        "pdf": PDF_AVAILABLE,
+        "pdf_backend": pdf_extractor.backend.name if pdf_extractor.backend else None,
+        "formats": {extractor.name: list(extractor.extensions) for extractor in extractors.registered()}
     }
     
     if AI_FEATURES_AVAILABLE and ai_features:
@@ -851,6 +2342,10 @@ if __name__ == "__main__":
     import webbrowser
     import threading
     import time
+    import multiprocessing
+    
+    # Required for the search process pool in the PyInstaller executable
+    multiprocessing.freeze_support()
     
     # Detect if running as PyInstaller executable
     if getattr(sys, 'frozen', False):
@@ -871,9 +2366,16 @@ if __name__ == "__main__":
         print("\nStarting server on http://127.0.0.1:8000")
         print("Press Ctrl+C to stop the server\n")
     
-    # Function to open browser after delay
+    # Function to open browser once the server is listening
     def open_browser():
-        time.sleep(2)  # Wait for server to start
+        import socket
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", 8000), timeout=0.5).close()
+                break
+            except OSError:
+                time.sleep(0.1)
         try:
             url = "http://127.0.0.1:8000"
             webbrowser.open(url)
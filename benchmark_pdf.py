@@ -0,0 +1,71 @@
+"""
+PDF Benchmark Module for Anvesh
+Measures PDF text extraction speed (pages/sec) for each installed backend,
+one page at a time and split across processes
+
+Usage: python benchmark_pdf.py [file.pdf ...] [--pages N] [--workers N]
+Without files, a sample PDF of N pages is generated.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from corpus_generator import write_pdf
+from pdf_text import BACKENDS, PdfExtractor, available_backends
+
+SAMPLE_WORDS = "anvesh searches word excel powerpoint and pdf documents for text".split()
+
+
+def make_sample_pdf(path: str, pages: int, lines_per_page: int = 40):
+    """Write a plain PDF with pages of text lines (Helvetica, no dependencies)"""
+    write_pdf(path, [
+        [" ".join(SAMPLE_WORDS[(page * 7 + line * 3 + i) % len(SAMPLE_WORDS)] for i in range(10)) + f" {page + 1}.{line + 1}"
+         for line in range(lines_per_page)]
+        for page in range(pages)
+    ])
+
+
+def measure(extractor: PdfExtractor, files: list) -> tuple:
+    """(pages, seconds) to extract every page of the files"""
+    pages = 0
+    start = time.perf_counter()
+    for file_path in files:
+        for _ in extractor.pages(file_path):
+            pages += 1
+    return pages, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF text extraction benchmark")
+    parser.add_argument("files", nargs="*", help="PDF files to extract (default: a generated sample)")
+    parser.add_argument("--pages", type=int, default=200, help="pages in the generated sample")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for the parallel run")
+    args = parser.parse_args()
+
+    files = args.files
+    if not files:
+        sample = os.path.join(tempfile.mkdtemp(prefix="anvesh-bench-"), "sample.pdf")
+        make_sample_pdf(sample, args.pages)
+        files = [sample]
+        print(f"Generated {sample} ({args.pages} pages)")
+
+    backends = available_backends()
+    if not backends:
+        print("No PDF backend installed (pip install pymupdf, pypdfium2, pypdf or PyPDF2)")
+        return
+    print(f"{'backend':<12}{'mode':<12}{'pages':>8}{'seconds':>10}{'pages/sec':>12}")
+    for name in backends:
+        runs = [("sequential", PdfExtractor(BACKENDS[name], workers=1))]
+        if args.workers > 1:
+            runs.append((f"{args.workers} procs", PdfExtractor(BACKENDS[name], workers=args.workers, parallel_min_pages=1)))
+        for mode, extractor in runs:
+            try:
+                pages, seconds = measure(extractor, files)
+            finally:
+                extractor.shutdown()
+            print(f"{name:<12}{mode:<12}{pages:>8}{seconds:>10.2f}{pages / seconds if seconds else 0:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Search Benchmark Module for Anvesh
+Measures search speed per file format on a generated corpus (see
+corpus_generator.py), through /api/search and /api/search-sync called
+in-process: files/sec, MB/sec, time to first result, p50/p95 latency and
+peak memory. Runs can be saved as JSON baselines and compared
+
+Usage: python benchmark_search.py [--corpus DIR] [--files N] [--size-kb N] [--runs N] [--save FILE] [--compare FILE]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from corpus_generator import FORMATS, generate
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+ENDPOINTS = {"stream": "/api/search", "sync": "/api/search-sync"}
+
+# Metric -> whether bigger is better (for --compare)
+METRICS = {"p50_s": False, "p95_s": False, "ttfr_s": False, "files_per_sec": True, "mb_per_sec": True, "peak_rss_mb": False}
+
+
+# ---------- Measuring ----------
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def process_tree_rss() -> Optional[int]:
+    """Resident memory of this process and its children (the search workers), in bytes"""
+    if PSUTIL_AVAILABLE:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    if os.path.exists("/proc/self/statm"):
+        pids = [str(os.getpid())]
+        for task in os.listdir("/proc/self/task"):
+            try:
+                with open(f"/proc/self/task/{task}/children") as f:
+                    pids.extend(f.read().split())
+            except OSError:
+                pass
+        total = 0
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            except OSError:
+                pass
+        return total
+    return None
+
+
+class PeakMemory:
+    """Samples process_tree_rss() in the background and keeps the peak"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while True:
+            rss = process_tree_rss()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            if self._stop.wait(self.interval):
+                return
+
+
+async def asgi_post(app, path: str, body: Dict) -> Tuple[int, bytes, Optional[float], float]:
+    """POST JSON straight to the ASGI app.
+
+    Returns (status, response body, seconds until the first "results"
+    event, total seconds). Test clients buffer whole responses, which
+    would hide the time to first result.
+    """
+    payload = json.dumps(body).encode("utf-8")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"benchmark"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode())],
+        "client": ("127.0.0.1", 0), "server": ("benchmark", 80)
+    }
+    finished = asyncio.Event()
+    requested = False
+    status = 0
+    chunks = []
+    first_result = None
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, first_result
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            data = message.get("body", b"")
+            if first_result is None and b'"type":"results"' in data:
+                first_result = time.perf_counter() - start
+            chunks.append(data)
+            if not message.get("more_body"):
+                finished.set()
+
+    await app(scope, receive, send)
+    finished.set()
+    return status, b"".join(chunks), first_result, time.perf_counter() - start
+
+
+def result_count(endpoint: str, body: bytes) -> int:
+    """Matching files a response reports"""
+    if endpoint == "sync":
+        return len(json.loads(body)["results"])
+    for line in reversed(body.decode("utf-8").splitlines()):
+        if line.startswith("data: "):
+            return json.loads(line[6:]).get("total_results", 0)
+    return 0
+
+
+async def run_format(anvesh, stats: Dict, term: str, runs: int, workers: Optional[int], cold: bool) -> Dict:
+    """Time both endpoints on one format's folder"""
+    request = {"query": term, "folders": [stats["folder"]], "use_index": False, "workers": workers}
+    results = {}
+    with PeakMemory() as memory:
+        for endpoint, path in ENDPOINTS.items():
+            await asgi_post(anvesh.app, path, request)  # Warm-up: starts the worker processes
+            latencies, first_results, counts = [], [], set()
+            for _ in range(runs):
+                if cold:
+                    anvesh.extraction_cache.purge()
+                status, body, first_result, seconds = await asgi_post(anvesh.app, path, request)
+                if status != 200:
+                    raise RuntimeError(f"{path} returned {status}: {body[:200]!r}")
+                latencies.append(seconds)
+                first_results.append(first_result if first_result is not None else seconds)
+                counts.add(result_count(endpoint, body))
+            p50 = percentile(latencies, 50)
+            results[endpoint] = {
+                "p50_s": round(p50, 4),
+                "p95_s": round(percentile(latencies, 95), 4),
+                "ttfr_s": round(percentile(first_results, 50), 4),
+                "files_per_sec": round(stats["files"] / p50, 1),
+                "mb_per_sec": round(stats["bytes"] / 1e6 / p50, 2),
+                "results": sorted(counts),
+                "correct": counts == {stats["files_with_hits"]}
+            }
+    for endpoint in results.values():
+        endpoint["peak_rss_mb"] = round(memory.peak / 1e6, 1) if memory.peak else None
+    return results
+
+
+# ---------- Reporting ----------
+
+def print_report(report: Dict):
+    print(f"{'format':<7}{'endpoint':<9}{'files':>7}{'MB':>8}{'p50 s':>9}{'p95 s':>9}{'first s':>9}"
+          f"{'files/s':>10}{'MB/s':>8}{'RSS MB':>9}  results")
+    for kind, endpoints in report["results"].items():
+        corpus = report["corpus"]["formats"][kind]
+        for endpoint, m in endpoints.items():
+            check = "ok" if m["correct"] else f"expected {corpus['files_with_hits']}, got {m['results']}"
+            print(f"{kind:<7}{endpoint:<9}{corpus['files']:>7}{corpus['bytes'] / 1e6:>8.2f}{m['p50_s']:>9.3f}{m['p95_s']:>9.3f}"
+                  f"{m['ttfr_s']:>9.3f}{m['files_per_sec']:>10.1f}{m['mb_per_sec']:>8.2f}{m['peak_rss_mb'] or 0:>9.1f}  {check}")
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> int:
+    """Print each metric's change from the baseline; returns how many got worse by more than threshold percent"""
+    def corpus_settings(run: Dict) -> Dict:
+        return {k: v for k, v in run.get("corpus", {}).get("settings", {}).items() if k != "formats"}
+    if corpus_settings(baseline) != corpus_settings(report):
+        print("Warning: the baseline was measured on a different corpus")
+    if baseline.get("settings") != report["settings"]:
+        print(f"Warning: the baseline was measured with other settings ({baseline.get('settings')})")
+    regressions = 0
+    print(f"\n{'format':<7}{'endpoint':<9}{'metric':<15}{'baseline':>11}{'now':>11}{'change':>9}")
+    for kind, endpoints in report["results"].items():
+        for endpoint, metrics in endpoints.items():
+            old_metrics = baseline.get("results", {}).get(kind, {}).get(endpoint)
+            if not old_metrics:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                old, new = old_metrics.get(metric), metrics.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old * 100
+                worse = -change if higher_is_better else change
+                flag = ""
+                if worse > threshold:
+                    flag = "  REGRESSION"
+                    regressions += 1
+                print(f"{kind:<7}{endpoint:<9}{metric:<15}{old:>11.3f}{new:>11.3f}{change:>+8.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search benchmark on a synthetic corpus")
+    parser.add_argument("--corpus", help="corpus folder (generated if missing or made with other settings; default: a temp folder)")
+    parser.add_argument("--files", type=int, default=50, help="files per format")
+    parser.add_argument("--size-kb", type=float, default=64, help="text per file, in KB")
+    parser.add_argument("--depth", type=int, default=2, help="folder levels below each format's folder")
+    parser.add_argument("--hit-density", type=float, default=0.01, help="fraction of lines holding the search term")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="comma-separated formats")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per format and endpoint (after one warm-up)")
+    parser.add_argument("--workers", type=int, help="search processes (default: ANVESH_SEARCH_WORKERS)")
+    parser.add_argument("--cold", action="store_true", help="purge the extraction cache before every run")
+    parser.add_argument("--save", help="write the results to this JSON file (a baseline)")
+    parser.add_argument("--compare", help="baseline JSON file to compare with")
+    parser.add_argument("--threshold", type=float, default=10, help="percent worse that counts as a regression")
+    args = parser.parse_args()
+
+    corpus_dir = args.corpus or os.path.join(tempfile.gettempdir(), "anvesh-bench-corpus")
+    corpus = generate(corpus_dir, args.files, args.size_kb, args.depth, args.hit_density,
+                      args.formats.split(","), args.seed)
+    print(f"Corpus: {corpus_dir}")
+
+    # The server keeps its data (extraction cache, history...) in a scratch folder,
+    # and repeated searches must really search rather than replay the result cache
+    os.environ["ANVESH_DATA_DIR"] = tempfile.mkdtemp(prefix="anvesh-bench-data-")
+    os.environ["ANVESH_RESULT_CACHE_ENTRIES"] = "0"
+    import app as anvesh
+
+    async def run_all() -> Dict:
+        return {kind: await run_format(anvesh, stats, corpus["settings"]["term"], args.runs, args.workers, args.cold)
+                for kind, stats in corpus["formats"].items()}
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {"runs": args.runs, "workers": args.workers, "cold": args.cold},
+        "corpus": corpus,
+        "results": asyncio.run(run_all())
+    }
+    print_report(report)
+    if not PSUTIL_AVAILABLE and not os.path.exists("/proc/self/statm"):
+        print("(pip install psutil to measure memory)")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"{regressions} metric(s) regressed by more than {args.threshold:g}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
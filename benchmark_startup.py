@@ -0,0 +1,139 @@
+"""
+Startup Benchmark Module for Anvesh
+Measures how fast the server comes up: the time to import app.py, and the
+time from launching the server until it answers its first page. Also checks
+that no format library or AI backend is imported at startup (they load on
+first use) and lists the slowest imports
+
+Usage: python benchmark_startup.py [--runs N] [--max-seconds S] [--importtime N] [--command CMD --url URL]
+"""
+import argparse
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Libraries that must only be imported on first use, not when the server starts
+LAZY_MODULES = ("openpyxl", "PyPDF2", "pypdf", "pymupdf", "fitz", "pypdfium2", "docx", "pptx",
+                "cv2", "numpy", "PIL", "pytesseract", "face_recognition", "ultralytics", "torch")
+
+IMPORT_SCRIPT = f"""
+import sys, time
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start)
+print(",".join(name for name in {LAZY_MODULES!r} if name in sys.modules))
+"""
+
+
+def server_env() -> Dict[str, str]:
+    """Environment for a measured server: scratch data folder, no warm-up (it would load what we check isn't loaded)"""
+    env = dict(os.environ)
+    env["ANVESH_DATA_DIR"] = tempfile.mkdtemp(prefix="anvesh-startup-data-")
+    env["ANVESH_WARMUP"] = "0"
+    return env
+
+
+def measure_import() -> Dict:
+    """Seconds to start Python and import app.py, seconds of the import alone, and eagerly imported lazy modules"""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=HERE, env=server_env(),
+                            capture_output=True, text=True, check=True).stdout.splitlines()
+    total = time.perf_counter() - start
+    return {"process_s": total, "import_s": float(output[-2]), "eager": [name for name in output[-1].split(",") if name]}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_response(command: Optional[List[str]], url: Optional[str], timeout: float = 120) -> float:
+    """Seconds from launching the server until url (default: its home page) answers 200"""
+    if command is None:
+        port = free_port()
+        command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+        url = url or f"http://127.0.0.1:{port}/"
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=HERE, env=server_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"The server exited with status {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"No answer from {url} after {timeout:g}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def slowest_imports(count: int) -> List[tuple]:
+    """(cumulative seconds, module) of the slowest imports of app.py, per python -X importtime"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=HERE, env=server_env(),
+                            capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative) / 1e6, name.rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server startup time")
+    parser.add_argument("--runs", type=int, default=5, help="launches to measure (the median is reported)")
+    parser.add_argument("--max-seconds", type=float, help="exit with status 1 if the median time to the first page is over this")
+    parser.add_argument("--importtime", type=int, default=10, help="list this many of the slowest imports (0: none)")
+    parser.add_argument("--command", help="launch this instead of uvicorn, e.g. the built executable (with --url)")
+    parser.add_argument("--url", help="page to wait for (default: the home page of the launched server)")
+    args = parser.parse_args()
+    command = shlex.split(args.command, posix=os.name != "nt") if args.command else None
+    if command and not args.url:
+        parser.error("--command needs --url")
+
+    imports = [measure_import() for _ in range(args.runs)]
+    first_responses = [measure_first_response(command, args.url) for _ in range(args.runs)]
+    eager = sorted({name for run in imports for name in run["eager"]})
+
+    print(f"{'':<28}{'median s':>10}{'min s':>9}{'max s':>9}")
+    for label, values in (("import app", [run["import_s"] for run in imports]),
+                          ("python + import app", [run["process_s"] for run in imports]),
+                          ("launch to first page", first_responses)):
+        print(f"{label:<28}{statistics.median(values):>10.3f}{min(values):>9.3f}{max(values):>9.3f}")
+    print(f"Libraries imported at startup that should wait for first use: {', '.join(eager) or 'none'}")
+
+    if args.importtime:
+        print(f"\nSlowest imports (cumulative):")
+        for seconds, name in slowest_imports(args.importtime):
+            print(f"{seconds:>8.3f}s  {name}")
+
+    failed = bool(eager)
+    if args.max_seconds is not None and statistics.median(first_responses) > args.max_seconds:
+        print(f"\nThe first page took longer than {args.max_seconds:g}s")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
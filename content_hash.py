@@ -0,0 +1,220 @@
+"""
+Content Hash Module for Anvesh
+Finds files with identical contents, so that each content is searched,
+extracted, indexed and analyzed once and its results reused for every copy.
+A file is only hashed once another file of the same size turns up, and
+only after a cheap probe of its first and last blocks matches; hashes use
+xxHash when installed (pip install xxhash), else BLAKE2
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import metrics
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+HASH_ALGORITHM = "xxh3" if XXHASH_AVAILABLE else "blake2b"
+
+# ANVESH_DEDUP=0 turns duplicate detection off: every file is read on its own
+ENABLED = os.environ.get("ANVESH_DEDUP", "1") != "0"
+
+# Files are hashed this many bytes at a time
+BLOCK_SIZE = 1024 * 1024
+
+# Same-size files are first compared by a hash of this many bytes from their start and end
+PROBE_BYTES = 64 * 1024
+
+# Digests remembered per process (by path, valid while size and mtime are unchanged)
+CACHE_ENTRIES = 100_000
+
+# A chunk is what an extractor yields: (location, line_number, text)
+Chunk = Tuple[str, Optional[int], str]
+
+
+def file_digest(path: str) -> str:
+    """Hash of a file's contents, read block by block; raises OSError if it can't be read.
+
+    Digests are prefixed with the algorithm, so stored ones never match
+    digests made with the other algorithm.
+    """
+    start = time.perf_counter()
+    hasher = xxhash.xxh3_128() if XXHASH_AVAILABLE else hashlib.blake2b(digest_size=16)
+    buffer = bytearray(BLOCK_SIZE)
+    view = memoryview(buffer)
+    total = 0
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            hasher.update(view[:read])
+            total += read
+    metrics.inc("anvesh_hash_bytes_total", total)
+    metrics.observe("anvesh_hash_seconds", time.perf_counter() - start)
+    return f"{HASH_ALGORITHM}:{hasher.hexdigest()}"
+
+
+def file_probe(path: str, size: int) -> str:
+    """Hash of a file's first and last PROBE_BYTES: different probes mean different contents"""
+    start = time.perf_counter()
+    hasher = xxhash.xxh3_128() if XXHASH_AVAILABLE else hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        head = f.read(PROBE_BYTES)
+        hasher.update(head)
+        total = len(head)
+        if size > PROBE_BYTES:
+            f.seek(max(PROBE_BYTES, size - PROBE_BYTES))
+            tail = f.read(PROBE_BYTES)
+            hasher.update(tail)
+            total += len(tail)
+    metrics.inc("anvesh_hash_bytes_total", total)
+    metrics.observe("anvesh_hash_seconds", time.perf_counter() - start)
+    return hasher.hexdigest()
+
+
+def record_saved(component: str, size: int):
+    """Count a file whose work (search, extraction, index or ai) was reused from an identical file"""
+    metrics.inc("anvesh_dedup_files_total", component=component)
+    metrics.inc("anvesh_dedup_bytes_total", size, component=component)
+
+
+def rebase_chunks(chunks: Iterable[Chunk], source: str, target: str) -> List[Chunk]:
+    """Chunks extracted from source as if from target, an identical file.
+
+    Locations start with the file's path (e.g. "<path> (Page: 3)"), which is
+    all that differs between copies.
+    """
+    return [
+        (target + location[len(source):] if location.startswith(source) else location, line_number, text)
+        for location, line_number, text in chunks
+    ]
+
+
+class DigestCache:
+    """File digests by path, reused while the file's size and mtime are unchanged (least recently used dropped)"""
+
+    def __init__(self, max_entries: int = CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, path: str, size: Optional[int] = None, mtime_ns: Optional[int] = None) -> Optional[str]:
+        """path's digest, or None if it can't be read or no longer has the given size and mtime"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if size is not None and (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                self._entries.move_to_end(path)
+                return entry[2]
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            print(f"Error hashing {path}: {e}")
+            return None
+        with self._lock:
+            self._entries[path] = (stat.st_size, stat.st_mtime_ns, digest)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return digest
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+digests = DigestCache()
+
+
+class ContentGroups:
+    """The files of one walk, grouped by contents.
+
+    The walk only add()s each file's stat; files are then resolve()d in
+    the order they're searched, which reads files only when needed (so do
+    it off the event loop): the first file with some contents is the
+    original, later identical files are its copies. A file is compared
+    only with earlier originals of the same size, by a probe of its first
+    and last blocks, then by a hash of the whole file if the probes match,
+    so folders without duplicates read nothing.
+    """
+
+    def __init__(self, cache: Optional[DigestCache] = None, component: str = "search"):
+        self.cache = cache or digests
+        self.component = component  # Copies are counted as work saved for this component
+        self.copies = 0
+        self.copy_bytes = 0
+        self._stats: Dict[str, Tuple[int, int]] = {}  # path -> (size, mtime_ns), filled by the walk
+        self._originals_by_size: Dict[int, List[list]] = {}  # size -> [path, mtime_ns, probe, digest] (None until read)
+        self._copies: Dict[str, str] = {}  # copy -> its original
+
+    def add(self, path: str, size: int, mtime_ns: int):
+        """Record a file the walk found (just its stat; nothing is read)"""
+        self._stats[path] = (size, mtime_ns)
+
+    def may_be_copy(self, path: str) -> bool:
+        """Whether resolve(path) has to read files, i.e. an earlier original has the same size"""
+        stat = self._stats.get(path)
+        return stat is not None and stat[0] in self._originals_by_size
+
+    def resolve(self, path: str) -> Optional[str]:
+        """Decide whether an added file is a copy: returns its original, or None for new contents"""
+        stat = self._stats.pop(path, None)
+        if stat is None:
+            return None
+        size, mtime_ns = stat
+        originals = self._originals_by_size.get(size)
+        if originals is None:
+            self._originals_by_size[size] = [[path, mtime_ns, None, None]]
+            return None
+        entry = [path, mtime_ns, None, None]
+        if size > 2 * PROBE_BYTES:  # Smaller files are read whole either way
+            entry[2] = self._probe(path, size)
+            if entry[2] is None:
+                return None  # Unreadable: it's searched on its own and reported there
+        for original in originals:
+            if entry[2] is not None:
+                if original[2] is None:
+                    original[2] = self._probe(original[0], size) or ""  # "" never matches
+                if original[2] != entry[2]:
+                    continue
+            if entry[3] is None:
+                entry[3] = self.cache.digest(path, size, mtime_ns)
+                if entry[3] is None:
+                    return None
+            if original[3] is None:
+                original[3] = self.cache.digest(original[0], size, original[1]) or ""
+            if original[3] == entry[3]:
+                self._copies[path] = original[0]
+                self.copies += 1
+                self.copy_bytes += size
+                record_saved(self.component, size)
+                return original[0]
+        originals.append(entry)
+        return None
+
+    @staticmethod
+    def _probe(path: str, size: int) -> Optional[str]:
+        try:
+            return file_probe(path, size)
+        except OSError as e:
+            print(f"Error hashing {path}: {e}")
+            return None
+
+    def original(self, path: str) -> Optional[str]:
+        """The original a resolved path is a copy of, if it is one"""
+        return self._copies.get(path)
+
+    def stats(self) -> Dict:
+        return {"files": self.copies, "bytes": self.copy_bytes}
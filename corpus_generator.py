@@ -0,0 +1,283 @@
+"""
+Corpus Generator Module for Anvesh
+Writes reproducible synthetic corpora of TXT, DOCX, XLSX, PPTX and PDF
+files for benchmarks, without any dependencies. File count, size, folder
+nesting and how often the search term occurs are configurable, and the
+same settings and seed always give the same files
+
+Usage: python corpus_generator.py OUT_DIR [--files N] [--size-kb N] [--depth N] [--hit-density F] [--formats txt,pdf,...] [--seed N]
+"""
+import argparse
+import json
+import os
+import random
+import zipfile
+from typing import Dict, Iterable, List
+from xml.sax.saxutils import escape
+
+FORMATS = ("txt", "docx", "xlsx", "pptx", "pdf")
+
+# Searched for by the benchmarks; made of letters the generated words never use
+DEFAULT_TERM = "anveshneedle"
+
+MANIFEST = "corpus.json"
+
+# Lines per PDF page and per PowerPoint slide
+PDF_LINES_PER_PAGE = 40
+PPTX_LINES_PER_SLIDE = 10
+
+# Zip entries get a fixed date so the same corpus is byte for byte the same
+ZIP_DATE = (2020, 1, 1, 0, 0, 0)
+
+CONTENT_TYPES = {
+    "docx": ("word/document.xml", "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"),
+    "xlsx": ("xl/workbook.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"),
+    "pptx": ("ppt/presentation.xml", "application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml")
+}
+RELATIONSHIPS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PACKAGE_RELATIONSHIPS = "http://schemas.openxmlformats.org/package/2006/relationships"
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+S_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+P_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+
+# ---------- Text ----------
+
+def make_vocabulary(rng: random.Random, size: int = 2000) -> List[str]:
+    """Pronounceable made-up words (without d or l, so DEFAULT_TERM never turns up by chance)"""
+    consonants = "bcfghjkmnprstvwz"
+    vowels = "aeiou"
+    words = set()
+    while len(words) < size:
+        syllables = rng.randint(1, 4)
+        words.add("".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(syllables)))
+    return sorted(words)
+
+
+def make_lines(rng: random.Random, vocabulary: List[str], size_bytes: int, term: str, hit_density: float) -> List[str]:
+    """Lines of 6-14 words adding up to about size_bytes; each holds the term with probability hit_density"""
+    lines = []
+    total = 0
+    while total < size_bytes or not lines:
+        words = rng.choices(vocabulary, k=rng.randint(6, 14))
+        if rng.random() < hit_density:
+            words.insert(rng.randrange(len(words) + 1), term)
+        line = " ".join(words)
+        lines.append(line)
+        total += len(line) + 1
+    return lines
+
+
+# ---------- Writers ----------
+
+def _write_zip(path: str, parts: Dict[str, str]):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in parts.items():
+            archive.writestr(zipfile.ZipInfo(name, ZIP_DATE), data, zipfile.ZIP_DEFLATED)
+
+
+def _package(kind: str, parts: Dict[str, str], overrides: Iterable[tuple] = ()) -> Dict[str, str]:
+    """Content types and package relationships around an Office document's parts"""
+    main_part, main_type = CONTENT_TYPES[kind]
+    override_xml = "".join(
+        f'<Override PartName="/{name}" ContentType="{content_type}"/>'
+        for name, content_type in [(main_part, main_type), *overrides]
+    )
+    return {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            f'<Default Extension="xml" ContentType="application/xml"/>{override_xml}</Types>'
+        ),
+        "_rels/.rels": (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{PACKAGE_RELATIONSHIPS}">'
+            f'<Relationship Id="rId1" Type="{RELATIONSHIPS}/officeDocument" Target="{main_part}"/></Relationships>'
+        ),
+        **parts
+    }
+
+
+def write_txt(path: str, lines: List[str]):
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def write_docx(path: str, lines: List[str]):
+    """A Word document with one paragraph per line"""
+    body = "".join(f"<w:p><w:r><w:t>{escape(line)}</w:t></w:r></w:p>" for line in lines)
+    _write_zip(path, _package("docx", {
+        "word/document.xml": f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document xmlns:w="{W_NS}"><w:body>{body}</w:body></w:document>'
+    }))
+
+
+def write_xlsx(path: str, lines: List[str]):
+    """An Excel workbook with one sheet and one cell (column A) per line"""
+    rows = "".join(
+        f'<row r="{row}"><c r="A{row}" t="inlineStr"><is><t>{escape(line)}</t></is></c></row>'
+        for row, line in enumerate(lines, 1)
+    )
+    _write_zip(path, _package("xlsx", {
+        "xl/workbook.xml": (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><workbook xmlns="{S_NS}" xmlns:r="{RELATIONSHIPS}">'
+            '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{PACKAGE_RELATIONSHIPS}">'
+            f'<Relationship Id="rId1" Type="{RELATIONSHIPS}/worksheet" Target="worksheets/sheet1.xml"/></Relationships>'
+        ),
+        "xl/worksheets/sheet1.xml": f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><worksheet xmlns="{S_NS}"><sheetData>{rows}</sheetData></worksheet>'
+    }, [("xl/worksheets/sheet1.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml")]))
+
+
+def write_pptx(path: str, lines: List[str]):
+    """A presentation with PPTX_LINES_PER_SLIDE text boxes (one per line) on each slide.
+
+    Only the parts Anvesh reads are written (no slide masters or layouts).
+    """
+    slides = [lines[start:start + PPTX_LINES_PER_SLIDE] for start in range(0, len(lines), PPTX_LINES_PER_SLIDE)]
+    parts = {
+        "ppt/presentation.xml": (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><p:presentation xmlns:p="{P_NS}" xmlns:r="{RELATIONSHIPS}"><p:sldIdLst>'
+            + "".join(f'<p:sldId id="{256 + number}" r:id="rId{number}"/>' for number in range(1, len(slides) + 1))
+            + "</p:sldIdLst></p:presentation>"
+        ),
+        "ppt/_rels/presentation.xml.rels": (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{PACKAGE_RELATIONSHIPS}">'
+            + "".join(f'<Relationship Id="rId{number}" Type="{RELATIONSHIPS}/slide" Target="slides/slide{number}.xml"/>'
+                      for number in range(1, len(slides) + 1))
+            + "</Relationships>"
+        )
+    }
+    overrides = []
+    for number, slide_lines in enumerate(slides, 1):
+        shapes = "".join(
+            f'<p:sp><p:nvSpPr><p:cNvPr id="{shape}" name="TextBox {shape}"/><p:cNvSpPr txBox="1"/><p:nvPr/></p:nvSpPr><p:spPr/>'
+            f'<p:txBody><a:bodyPr/><a:p><a:r><a:t>{escape(line)}</a:t></a:r></a:p></p:txBody></p:sp>'
+            for shape, line in enumerate(slide_lines, 2)
+        )
+        parts[f"ppt/slides/slide{number}.xml"] = (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><p:sld xmlns:p="{P_NS}" xmlns:a="{A_NS}">'
+            f"<p:cSld><p:spTree>{shapes}</p:spTree></p:cSld></p:sld>"
+        )
+        overrides.append((f"ppt/slides/slide{number}.xml", "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"))
+    _write_zip(path, _package("pptx", parts, overrides))
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """A plain PDF with a page of text lines (Helvetica) per list of lines"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        shown = " ".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj 0 -16 Td" for line in lines
+        )
+        stream = "BT /F1 11 Tf 40 780 Td " + shown + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(pages)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+WRITERS = {
+    "txt": write_txt,
+    "docx": write_docx,
+    "xlsx": write_xlsx,
+    "pptx": write_pptx,
+    "pdf": lambda path, lines: write_pdf(path, [lines[start:start + PDF_LINES_PER_PAGE]
+                                                 for start in range(0, len(lines), PDF_LINES_PER_PAGE)])
+}
+
+
+# ---------- Corpus ----------
+
+def file_folder(index: int, depth: int, fanout: int = 4) -> str:
+    """Relative folder of the index-th file: depth levels of fanout subfolders each"""
+    return os.path.join(*[f"dir{(index // fanout ** level) % fanout}" for level in range(depth)]) if depth else ""
+
+
+def generate(out_dir: str,
+             files: int = 50,
+             size_kb: float = 64,
+             depth: int = 2,
+             hit_density: float = 0.01,
+             formats: Iterable[str] = FORMATS,
+             seed: int = 42,
+             term: str = DEFAULT_TERM) -> Dict:
+    """Write files of each format under out_dir/<format>/ and return the manifest.
+
+    The manifest (also saved as corpus.json) records the settings and, per
+    format, the file count, total bytes, and how many files and lines hold
+    the term. A corpus already generated with the same settings is reused.
+    """
+    out_dir = os.path.abspath(out_dir)
+    formats = list(formats)
+    unknown = [kind for kind in formats if kind not in WRITERS]
+    if unknown:
+        raise ValueError(f"Unknown formats: {', '.join(unknown)} (use {', '.join(FORMATS)})")
+    settings = {"files": files, "size_kb": size_kb, "depth": depth, "hit_density": hit_density,
+                "formats": formats, "seed": seed, "term": term}
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("settings") == settings:
+            return manifest
+
+    manifest = {"settings": settings, "formats": {}}
+    for kind in formats:
+        # Every format gets the same text, so their timings compare parsing cost only
+        rng = random.Random(seed)
+        vocabulary = make_vocabulary(rng)
+        stats = {"folder": os.path.join(out_dir, kind), "files": files, "bytes": 0, "files_with_hits": 0, "hit_lines": 0}
+        for index in range(files):
+            lines = make_lines(rng, vocabulary, int(size_kb * 1024), term, hit_density)
+            folder = os.path.join(out_dir, kind, file_folder(index, depth))
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f"file{index:05d}.{kind}")
+            WRITERS[kind](path, lines)
+            hits = sum(1 for line in lines if term in line)
+            stats["bytes"] += os.path.getsize(path)
+            stats["hit_lines"] += hits
+            stats["files_with_hits"] += 1 if hits else 0
+        manifest["formats"][kind] = stats
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic corpus generator")
+    parser.add_argument("out_dir", help="folder to write the corpus to")
+    parser.add_argument("--files", type=int, default=50, help="files per format")
+    parser.add_argument("--size-kb", type=float, default=64, help="text per file, in KB")
+    parser.add_argument("--depth", type=int, default=2, help="folder levels below each format's folder")
+    parser.add_argument("--hit-density", type=float, default=0.01, help="fraction of lines holding the search term")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="comma-separated formats")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--term", default=DEFAULT_TERM, help="search term to plant")
+    args = parser.parse_args()
+
+    manifest = generate(args.out_dir, args.files, args.size_kb, args.depth, args.hit_density,
+                        args.formats.split(","), args.seed, args.term)
+    print(f"{'format':<8}{'files':>8}{'MB':>10}{'files with hits':>18}{'hit lines':>12}")
+    for kind, stats in manifest["formats"].items():
+        print(f"{kind:<8}{stats['files']:>8}{stats['bytes'] / 1e6:>10.2f}{stats['files_with_hits']:>18}{stats['hit_lines']:>12}")
+
+
+if __name__ == "__main__":
+    main()
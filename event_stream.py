@@ -0,0 +1,166 @@
+"""
+Event Stream Module for Anvesh
+Encodes search events for streaming responses: matching files coalesced into
+batches, SSE, NDJSON or MessagePack framing, and gzip/deflate compression
+that's flushed after every event
+"""
+import asyncio
+import json
+import time
+import zlib
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+# Stream format -> media type
+STREAM_FORMATS = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+    "msgpack": "application/x-msgpack"
+}
+
+
+async def coalesce_results(events: AsyncIterator[Dict], max_delay: float = 0.05, max_results: int = 100) -> AsyncIterator[Dict]:
+    """Merge the "results" events of a stream (data: a list of FileResults) into batches.
+
+    A batch is sent once it holds max_results files, max_delay seconds after
+    its first file (even if the stream is busy elsewhere), or just before
+    any other event. Progress events that arrive meanwhile are superseded by
+    the next one and only the latest is sent, right after the batch. The
+    very first file is sent on its own right away, so batching never delays
+    the first result.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = events.__aiter__()
+    batch: List = []
+    progress: Optional[Dict] = None  # Latest progress event held back with the batch
+    deadline = 0.0
+    first = True
+    pending: Optional[asyncio.Future] = None  # The next event, while a batch waits for its deadline
+
+    def flush() -> List[Dict]:
+        nonlocal batch, progress
+        flushed = [{'type': 'results', 'data': batch}] if batch else []
+        if progress is not None:
+            flushed.append(progress)
+        batch, progress = [], None
+        return flushed
+
+    try:
+        while True:
+            if batch and pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            if batch:
+                done, _ = await asyncio.wait((pending,), timeout=max(deadline - loop.time(), 0))
+                if not done:
+                    for flushed in flush():
+                        yield flushed
+                    continue
+            try:
+                if pending is not None:
+                    next_event, pending = pending, None
+                    event = await next_event
+                else:
+                    event = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+
+            if event.get('type') != 'results':
+                if batch and event.get('type') == 'progress':
+                    progress = event
+                    continue
+                for flushed in flush():
+                    yield flushed
+                yield event
+                continue
+            for file_result in event['data']:
+                if not batch:
+                    deadline = loop.time() + max_delay
+                batch.append(file_result)
+                if first or len(batch) >= max_results:
+                    first = False
+                    for flushed in flush():
+                        yield flushed
+    finally:
+        if pending is not None:
+            pending.cancel()  # The client went away mid-batch
+    for flushed in flush():
+        yield flushed
+
+
+def serialize_results(results: List, serialize: Callable, timings: Optional[Dict[str, float]] = None) -> List:
+    """serialize(result) for each result; with timings, also records each file's time (file path -> seconds)"""
+    if timings is None:
+        return [serialize(r) for r in results]
+    serialized = []
+    for r in results:
+        start = time.perf_counter()
+        serialized.append(serialize(r))
+        timings[r.file_path] = time.perf_counter() - start
+    return serialized
+
+
+def event_json(event: Dict, timings: Optional[Dict[str, float]] = None) -> str:
+    """Compact JSON of an event; results are serialized by pydantic directly"""
+    if event.get('type') == 'results':
+        return '{"type":"results","data":[' + ",".join(serialize_results(event['data'], lambda r: r.model_dump_json(), timings)) + ']}'
+    return json.dumps(event, separators=(",", ":"))
+
+
+def encode_event(event: Dict, stream_format: str = "sse", timings: Optional[Dict[str, float]] = None) -> bytes:
+    """An event framed for the stream format: an SSE "data:" event, an NDJSON line or a MessagePack object.
+
+    With timings, each result's serialization time is recorded there (see serialize_results).
+    """
+    if stream_format == "msgpack":
+        if event.get('type') == 'results':
+            event = {**event, 'data': serialize_results(event['data'], lambda r: r.model_dump(), timings)}
+        return msgpack.packb(event)
+    if stream_format == "ndjson":
+        return (event_json(event, timings) + "\n").encode("utf-8")
+    return f"data: {event_json(event, timings)}\n\n".encode("utf-8")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """"gzip" or "deflate" if the Accept-Encoding header allows it (gzip preferred), else None"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    for encoding in ("gzip", "deflate"):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class StreamCompressor:
+    """gzip or deflate for a streamed response.
+
+    Every chunk is sync-flushed, so the client can decompress each event as
+    soon as it arrives; compression still spans the whole stream, so
+    repeated file paths and keys cost next to nothing.
+    """
+
+    def __init__(self, encoding: str, level: int = 6):
+        wbits = 16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
@@ -0,0 +1,212 @@
+"""
+Extra Formats Module for Anvesh
+Extractor plugins for CSV, source code, e-mail (.eml), OpenDocument and RTF
+files. Enable them with ANVESH_EXTRACTORS=extra_formats; the module also
+shows how to write an extractor plugin
+"""
+import codecs
+import html
+import re
+import zipfile
+from email import policy
+from email.parser import BytesParser
+from typing import Iterator, List
+from xml.etree.ElementTree import iterparse
+
+from extractors import Chunk, Extractor, TextExtractor, register
+
+
+class CsvExtractor(TextExtractor):
+    """Comma and tab separated values, row by row"""
+    name = "csv"
+    description = "CSV file"
+    extensions = (".csv", ".tsv")
+    mime_types = ("text/csv", "text/tab-separated-values")
+
+
+class SourceCodeExtractor(TextExtractor):
+    """Source code, markup and configuration files, line by line"""
+    name = "code"
+    description = "source file"
+    extensions = (
+        ".py", ".pyw", ".js", ".jsx", ".ts", ".tsx", ".java", ".kt", ".c", ".h", ".cpp", ".hpp", ".cc",
+        ".cs", ".go", ".rs", ".rb", ".php", ".swift", ".scala", ".lua", ".pl", ".r", ".sql",
+        ".sh", ".bat", ".ps1", ".html", ".htm", ".css", ".scss", ".xml", ".json", ".yaml", ".yml",
+        ".toml", ".ini", ".cfg", ".md", ".rst"
+    )
+
+
+# ---------- E-mail ----------
+
+EMAIL_HEADERS = ("Subject", "From", "To", "Cc", "Date")
+
+
+def html_to_text(markup: str) -> str:
+    markup = re.sub(r"(?is)<(script|style)\b.*?</\1\s*>", "", markup)
+    markup = re.sub(r"(?i)<br\s*/?>|</(p|div|li|tr|h[1-6])\s*>", "\n", markup)
+    return html.unescape(re.sub(r"<[^>]+>", "", markup))
+
+
+class EmailExtractor(Extractor):
+    """Headers, body (plain text, else HTML) and attachment names of saved e-mails"""
+    name = "eml"
+    description = "e-mail"
+    extensions = (".eml",)
+    mime_types = ("message/rfc822",)
+
+    def extract(self, file_path: str) -> Iterator[Chunk]:
+        with open(file_path, "rb") as f:
+            message = BytesParser(policy=policy.default).parse(f)
+        for header in EMAIL_HEADERS:
+            value = message.get(header)
+            if value:
+                yield f"{file_path} (Header: {header})", None, str(value)
+        body = message.get_body(preferencelist=("plain", "html"))
+        if body is not None:
+            text = body.get_content()
+            if body.get_content_subtype() == "html":
+                text = html_to_text(text)
+            for line_num, line in enumerate(text.splitlines(), 1):
+                yield file_path, line_num, line
+        for attachment in message.iter_attachments():
+            filename = attachment.get_filename()
+            if filename:
+                yield f"{file_path} (Attachment)", None, filename
+
+
+# ---------- OpenDocument ----------
+
+TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+PARAGRAPHS = (TEXT + "p", TEXT + "h")
+
+
+def _odf_text(elem) -> str:
+    parts = [elem.text or ""]
+    for child in elem:
+        if child.tag == TEXT + "s":
+            parts.append(" " * int(child.get(TEXT + "c", "1")))
+        elif child.tag == TEXT + "tab":
+            parts.append("\t")
+        elif child.tag == TEXT + "line-break":
+            parts.append("\n")
+        else:
+            parts.append(_odf_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+class OpenDocumentExtractor(Extractor):
+    """Paragraphs and headings of OpenDocument text, spreadsheets (cell by cell) and presentations"""
+    name = "opendocument"
+    description = "OpenDocument"
+    extensions = (".odt", ".ods", ".odp")
+    mime_types = (
+        "application/vnd.oasis.opendocument.text",
+        "application/vnd.oasis.opendocument.spreadsheet",
+        "application/vnd.oasis.opendocument.presentation"
+    )
+
+    def extract(self, file_path: str) -> Iterator[Chunk]:
+        with zipfile.ZipFile(file_path) as archive:
+            with archive.open("content.xml") as f:
+                open_paragraphs = 0
+                line_num = 0
+                for event, elem in iterparse(f, events=("start", "end")):
+                    if elem.tag not in PARAGRAPHS:
+                        continue
+                    if event == "start":
+                        open_paragraphs += 1
+                        continue
+                    open_paragraphs -= 1
+                    if open_paragraphs == 0:  # Paragraphs inside notes and frames belong to the outer one
+                        line_num += 1
+                        yield file_path, line_num, _odf_text(elem)
+                        elem.clear()
+
+
+# ---------- RTF ----------
+
+_RTF_TOKEN = re.compile(r"\\([a-zA-Z]+)(-?\d+)? ?|\\'([0-9a-fA-F]{2})|\\([^a-zA-Z])|([{}])|[\r\n]+|([^\\{}\r\n]+)")
+
+# Groups that hold no document text
+RTF_DESTINATIONS = {
+    "fonttbl", "colortbl", "stylesheet", "info", "pict", "object", "themedata", "colorschememapping",
+    "datastore", "latentstyles", "listtable", "listoverridetable", "rsidtbl", "generator", "xmlnstbl",
+    "mmathPr", "fldinst", "filetbl", "revtbl", "header", "footer", "headerl", "headerr", "footerl", "footerr"
+}
+RTF_CHARACTERS = {"par": "\n", "line": "\n", "sect": "\n", "page": "\n", "row": "\n", "cell": "\t", "tab": "\t",
+                  "emdash": "\u2014", "endash": "\u2013", "bullet": "\u2022", "lquote": "\u2018", "rquote": "\u2019",
+                  "ldblquote": "\u201c", "rdblquote": "\u201d"}
+RTF_SYMBOLS = {"\\": "\\", "{": "{", "}": "}", "~": "\u00a0", "_": "\u2011", "\n": "\n", "\r": "\n"}
+
+
+def rtf_text(data: str) -> str:
+    """Plain text of an RTF document"""
+    out: List[str] = []
+    stack = []
+    skip = False  # Inside a group that holds no text
+    uc = 1  # Fallback characters that follow each \\u character
+    fallback = 0  # Fallback characters still to drop
+    codepage = "cp1252"
+    for match in _RTF_TOKEN.finditer(data):
+        word, arg, hex_code, symbol, brace, text = match.groups()
+        if brace == "{":
+            stack.append((skip, uc))
+            fallback = 0
+        elif brace == "}":
+            if stack:
+                skip, uc = stack.pop()
+            fallback = 0
+        elif fallback and (hex_code or symbol or text):
+            if text:
+                dropped = min(fallback, len(text))
+                fallback -= dropped
+                if not skip:
+                    out.append(text[dropped:])
+            else:
+                fallback -= 1
+        elif word:
+            if word in RTF_DESTINATIONS:
+                skip = True
+            elif word == "uc":
+                uc = int(arg or 1)
+            elif word == "ansicpg" and arg:
+                try:
+                    codepage = codecs.lookup(f"cp{arg}").name
+                except LookupError:
+                    pass
+            elif skip:
+                continue
+            elif word == "u" and arg:
+                out.append(chr(int(arg) % 0x10000))
+                fallback = uc
+            elif word in RTF_CHARACTERS:
+                out.append(RTF_CHARACTERS[word])
+        elif symbol:
+            if symbol == "*":
+                skip = True  # An optional destination this reader doesn't know
+            elif not skip and symbol in RTF_SYMBOLS:
+                out.append(RTF_SYMBOLS[symbol])
+        elif hex_code and not skip:
+            out.append(bytes([int(hex_code, 16)]).decode(codepage, errors="replace"))
+        elif text and not skip:
+            out.append(text)
+    return "".join(out)
+
+
+class RtfExtractor(Extractor):
+    """Paragraphs of RTF documents"""
+    name = "rtf"
+    description = "RTF"
+    extensions = (".rtf",)
+    mime_types = ("application/rtf", "text/rtf")
+
+    def extract(self, file_path: str) -> Iterator[Chunk]:
+        with open(file_path, "rb") as f:
+            data = f.read().decode("latin-1")  # RTF is 7-bit; other characters are escaped
+        for line_num, line in enumerate(rtf_text(data).split("\n"), 1):
+            yield file_path, line_num, line
+
+
+for _extractor in (CsvExtractor(), SourceCodeExtractor(), EmailExtractor(), OpenDocumentExtractor(), RtfExtractor()):
+    register(_extractor)
@@ -0,0 +1,304 @@
+"""
+Extraction Cache Module for Anvesh
+Persistent cache of extracted document text keyed by path, size, mtime and extractor version.
+Cached files are registered with their content digest (hashed only when
+another file of the same size needs it), so an identical file elsewhere
+can reuse their text instead of being extracted again
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import content_hash
+import metrics
+
+# A chunk is what an extractor yields: (location, line_number, text)
+Chunk = Tuple[str, Optional[int], str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    data BLOB NOT NULL,
+    nbytes INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT
+);
+CREATE INDEX IF NOT EXISTS files_size ON files(size);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    nbytes INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS entries_added AFTER INSERT ON entries
+BEGIN UPDATE totals SET nbytes = nbytes + new.nbytes; END;
+CREATE TRIGGER IF NOT EXISTS entries_removed AFTER DELETE ON entries
+BEGIN UPDATE totals SET nbytes = nbytes - old.nbytes; END;
+INSERT OR IGNORE INTO totals (id, nbytes) SELECT 0, COALESCE(SUM(nbytes), 0) FROM entries;
+"""
+
+# When over the cap, evict down to this fraction so we don't evict on every put
+EVICT_TO = 0.9
+
+# A hit only records its time if the last one is older than this (seconds), so reads
+# rarely take the database's write lock; eviction order is only this precise
+TOUCH_INTERVAL = 300
+
+
+def part_key(path: str, part: str) -> str:
+    """Cache key for part of a file (e.g. one PDF page).
+
+    Keys look like paths below the file, so remove(path) forgets the parts too.
+    """
+    return f"{path}{os.sep}:{part}"
+
+
+class ExtractionCache:
+    """SQLite-backed LRU cache of extractor output with a total size cap.
+
+    Search worker processes share the database, so the total size is kept in
+    the database too (by triggers on entries) rather than counted per process.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the shared connection on first use (callers hold the lock)"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            # INSERT OR REPLACE fires the delete trigger for the row it replaces only with this on
+            self._conn.execute("PRAGMA recursive_triggers=ON")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    @staticmethod
+    def _total_bytes(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT nbytes FROM totals").fetchone()[0]
+
+    def get(self, path: str, size: int, mtime_ns: int, version: str) -> Optional[List[Chunk]]:
+        """Return cached chunks, or None if missing or stale"""
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT data, last_used FROM entries WHERE path = ? AND size = ? AND mtime_ns = ? AND version = ?",
+                    (path, size, mtime_ns, version)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    metrics.inc("anvesh_cache_requests_total", cache="extraction", result="miss")
+                    return None
+                now = time.time()
+                if now - row[1] > TOUCH_INTERVAL:
+                    conn.execute("UPDATE entries SET last_used = ? WHERE path = ?", (now, path))
+                    conn.commit()
+                self.hits += 1
+            metrics.inc("anvesh_cache_requests_total", cache="extraction", result="hit")
+            return [tuple(chunk) for chunk in json.loads(zlib.decompress(row[0]))]
+        except Exception as e:
+            print(f"Error reading extraction cache for {path}: {e}")
+            metrics.inc("anvesh_errors_total", component="extraction_cache")
+            return None
+
+    def put(self, path: str, size: int, mtime_ns: int, version: str, chunks: List[Chunk]):
+        """Store chunks for a file, evicting least recently used entries if over the cap"""
+        try:
+            data = zlib.compress(json.dumps(chunks, ensure_ascii=False).encode("utf-8"))
+            nbytes = len(data)
+            if nbytes > self.max_bytes:
+                return
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (path, size, mtime_ns, version, data, nbytes, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, version, data, nbytes, time.time())
+                )
+                self._register(conn, path, size, mtime_ns)
+                self._evict(conn)
+                conn.commit()
+        except Exception as e:
+            print(f"Error writing extraction cache for {path}: {e}")
+            metrics.inc("anvesh_errors_total", component="extraction_cache")
+
+    def get_many(self, paths: List[str], size: int, mtime_ns: int, version: str) -> Dict[str, List[Chunk]]:
+        """Cached chunks for several keys of one file (e.g. its pages); stale or missing keys are left out"""
+        found = {}
+        stale = []
+        try:
+            with self._lock:
+                conn = self._connection()
+                for start in range(0, len(paths), 500):
+                    batch = paths[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT path, data, last_used FROM entries WHERE path IN ({', '.join('?' * len(batch))}) "
+                        "AND size = ? AND mtime_ns = ? AND version = ?",
+                        batch + [size, mtime_ns, version]
+                    ).fetchall()
+                    found.update((path, data) for path, data, _ in rows)
+                    now = time.time()
+                    stale.extend((now, path) for path, _, last_used in rows if now - last_used > TOUCH_INTERVAL)
+                if stale:
+                    conn.executemany("UPDATE entries SET last_used = ? WHERE path = ?", stale)
+                    conn.commit()
+                self.hits += len(found)
+                self.misses += len(paths) - len(found)
+            metrics.inc("anvesh_cache_requests_total", len(found), cache="extraction", result="hit")
+            metrics.inc("anvesh_cache_requests_total", len(paths) - len(found), cache="extraction", result="miss")
+            return {path: [tuple(chunk) for chunk in json.loads(zlib.decompress(data))] for path, data in found.items()}
+        except Exception as e:
+            print(f"Error reading extraction cache for {len(paths)} entries: {e}")
+            metrics.inc("anvesh_errors_total", component="extraction_cache")
+            return {}
+
+    def put_many(self, entries: Dict[str, List[Chunk]], size: int, mtime_ns: int, version: str, file_path: Optional[str] = None):
+        """Store chunks for several keys of one file (file_path, registered for find_copy) in one transaction"""
+        try:
+            rows = []
+            for path, chunks in entries.items():
+                data = zlib.compress(json.dumps(chunks, ensure_ascii=False).encode("utf-8"))
+                if len(data) <= self.max_bytes:
+                    rows.append((path, data))
+            if not rows:
+                return
+            with self._lock:
+                conn = self._connection()
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (path, size, mtime_ns, version, data, nbytes, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(path, size, mtime_ns, version, data, len(data), now) for path, data in rows]
+                )
+                if file_path is not None:
+                    self._register(conn, file_path, size, mtime_ns)
+                self._evict(conn)
+                conn.commit()
+        except Exception as e:
+            print(f"Error writing extraction cache for {len(entries)} entries: {e}")
+            metrics.inc("anvesh_errors_total", component="extraction_cache")
+
+    def _register(self, conn: sqlite3.Connection, path: str, size: int, mtime_ns: int, digest: Optional[str] = None):
+        """Record a cached file's size and mtime; its digest is kept while they're unchanged"""
+        conn.execute(
+            "INSERT INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+            "digest = CASE WHEN size = excluded.size AND mtime_ns = excluded.mtime_ns THEN COALESCE(excluded.digest, digest) "
+            "ELSE excluded.digest END, size = excluded.size, mtime_ns = excluded.mtime_ns",
+            (path, size, mtime_ns, digest)
+        )
+
+    def find_copy(self, path: str, size: int, mtime_ns: int) -> Optional[Tuple[str, int]]:
+        """(path, mtime_ns) of a cached file with the same contents as path, or None.
+
+        Nothing is hashed unless a cached file has the same size. A cached
+        file is hashed (once) only if it's unchanged since it was cached, so
+        its digest always describes its cached text.
+        """
+        try:
+            with self._lock:
+                candidates = self._connection().execute(
+                    "SELECT path, mtime_ns, digest FROM files WHERE size = ? AND path != ?", (size, path)
+                ).fetchall()
+            if not candidates:
+                return None
+            digest = content_hash.digests.digest(path, size, mtime_ns)
+            if digest is None:
+                return None
+            found = None
+            hashed = [(path, mtime_ns, digest)]
+            for other, other_mtime_ns, other_digest in candidates:
+                if other_digest is None:
+                    other_digest = content_hash.digests.digest(other, size, other_mtime_ns)
+                    if other_digest is not None:
+                        hashed.append((other, other_mtime_ns, other_digest))
+                if other_digest == digest:
+                    found = (other, other_mtime_ns)
+                    break
+            with self._lock:
+                conn = self._connection()
+                for file_path, file_mtime_ns, file_digest in hashed:
+                    self._register(conn, file_path, size, file_mtime_ns, file_digest)
+                conn.commit()
+            return found
+        except Exception as e:
+            print(f"Error looking up copies of {path} in the extraction cache: {e}")
+            metrics.inc("anvesh_errors_total", component="extraction_cache")
+            return None
+
+    def _evict(self, conn: sqlite3.Connection):
+        """If over the cap, drop least recently used entries until under it.
+
+        Called after a write in the same transaction, so this process holds
+        the database's write lock and the total covers every process's entries.
+        """
+        total = self._total_bytes(conn)
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TO
+        rows = conn.execute("SELECT path, nbytes FROM entries ORDER BY last_used")
+        evicted = []
+        for path, nbytes in rows:
+            if total <= target:
+                break
+            evicted.append((path,))
+            total -= nbytes
+        conn.executemany("DELETE FROM entries WHERE path = ?", evicted)
+        conn.executemany("DELETE FROM files WHERE path = ?", evicted)
+        self.evictions += len(evicted)
+
+    def remove(self, path: str):
+        """Forget one file, or every file below a directory"""
+        prefix = path.rstrip(os.sep) + os.sep
+        condition = "path = ? OR substr(path, 1, ?) = ?"
+        params = (path, len(prefix), prefix)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f"DELETE FROM entries WHERE {condition}", params)
+            conn.execute(f"DELETE FROM files WHERE {condition}", params)
+            conn.commit()
+
+    def purge(self):
+        """Empty the cache and reclaim disk space"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM files")
+            conn.commit()
+            conn.execute("VACUUM")
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get_stats(self) -> Dict:
+        """Cache size and hit/miss counters"""
+        with self._lock:
+            conn = self._connection()
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total_bytes = self._total_bytes(conn)
+        return {
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "db_path": self.db_path,
+            "db_size": os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+        }
@@ -0,0 +1,181 @@
+"""
+Extractors Module for Anvesh
+Registry of text extractors by file extension and MIME type. An extractor
+only turns a file into (location, line number, text) chunks; matching,
+indexing and caching all consume those same chunks, so new formats plug in
+without touching the search code
+"""
+import importlib
+import mimetypes
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from file_sniffer import sniff
+from ooxml_text import iter_docx, iter_pptx, iter_xlsx
+from text_scanner import detect_encoding
+
+Chunk = Tuple[str, Optional[int], str]
+
+
+class Extractor:
+    """Turns files of one format into text chunks.
+
+    Subclass it, fill in the class attributes and extract(), and register()
+    an instance (see extra_formats.py for examples).
+    """
+    name = ""  # Unique format name; the built-in ones are those file_sniffer recognizes by content
+    description = "document"  # For messages, e.g. "Error reading <description> ..."
+    extensions: Tuple[str, ...] = ()  # Lower case, with the dot
+    mime_types: Tuple[str, ...] = ()  # Also claims extensions the mimetypes module maps to these
+    plain_text = False  # Text that's streamed as is: no size budget, not cached, single terms memory-mapped
+    cacheable = True  # Chunks go through the extraction cache (worth it for anything that needs parsing)
+    version = "1"  # Bump when the output changes so cached chunks are re-extracted
+
+    def extract(self, file_path: str) -> Iterator[Chunk]:
+        raise NotImplementedError
+
+    def chunks(self, file_path: str) -> Iterator[Chunk]:
+        """extract(), with read errors reported instead of raised"""
+        try:
+            yield from self.extract(file_path)
+        except Exception as e:
+            print(f"Error reading {self.description} {file_path}: {e}")
+            metrics.inc("anvesh_extract_errors_total", extractor=self.name)
+
+
+class TextExtractor(Extractor):
+    """Plain text, line by line (UTF-8, or UTF-16 with a BOM)"""
+    name = "txt"
+    description = "text file"
+    extensions = (".txt",)
+    plain_text = True
+    cacheable = False
+
+    def extract(self, file_path: str) -> Iterator[Chunk]:
+        with open(file_path, 'rb') as f:
+            encoding, _ = detect_encoding(f.read(4))
+        with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
+            for line_num, line in enumerate(f, 1):
+                yield file_path, line_num, line
+
+
+class DocxExtractor(Extractor):
+    """Paragraphs of Word documents"""
+    name = "docx"
+    description = "DOCX"
+    extensions = (".docx", ".doc")
+    mime_types = ("application/vnd.openxmlformats-officedocument.wordprocessingml.document",)
+
+    def extract(self, file_path: str) -> Iterator[Chunk]:
+        return iter_docx(file_path)
+
+
+class XlsxExtractor(Extractor):
+    """Non-empty cell values of Excel workbooks"""
+    name = "xlsx"
+    description = "XLSX"
+    extensions = (".xlsx", ".xls")
+    mime_types = ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",)
+
+    def extract(self, file_path: str) -> Iterator[Chunk]:
+        return iter_xlsx(file_path)
+
+
+class PptxExtractor(Extractor):
+    """Shape text of PowerPoint presentations"""
+    name = "pptx"
+    description = "PPTX"
+    extensions = (".pptx", ".ppt")
+    mime_types = ("application/vnd.openxmlformats-officedocument.presentationml.presentation",)
+
+    def extract(self, file_path: str) -> Iterator[Chunk]:
+        return iter_pptx(file_path)
+
+
+class PdfPagesExtractor(Extractor):
+    """Page lines of PDFs, lazily page by page through a pdf_text.PdfExtractor (which caches pages itself)"""
+    name = "pdf"
+    description = "PDF"
+    extensions = (".pdf",)
+    mime_types = ("application/pdf",)
+    cacheable = False
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def extract(self, file_path: str) -> Iterator[Chunk]:
+        for _, chunks in self.pages.pages(file_path):
+            yield from chunks
+
+
+_EXTRACTORS: Dict[str, Extractor] = {}
+_BY_EXTENSION: Dict[str, Extractor] = {}
+_BY_MIME_TYPE: Dict[str, Extractor] = {}
+
+
+def register(extractor: Extractor) -> Extractor:
+    """Add an extractor, replacing any registered under the same name or for the same extensions"""
+    _EXTRACTORS[extractor.name] = extractor
+    for extension in extractor.extensions:
+        _BY_EXTENSION[extension.lower()] = extractor
+    for mime_type in extractor.mime_types:
+        _BY_MIME_TYPE[mime_type] = extractor
+    return extractor
+
+
+def registered() -> List[Extractor]:
+    return list(_EXTRACTORS.values())
+
+
+def get_extractor(name: str) -> Optional[Extractor]:
+    return _EXTRACTORS.get(name)
+
+
+def extractor_for(file_path: str) -> Optional[Extractor]:
+    """The extractor a file's extension (or, failing that, its guessed MIME type) calls for"""
+    extractor = _BY_EXTENSION.get(os.path.splitext(file_path)[1].lower())
+    if extractor is None and _BY_MIME_TYPE:
+        mime_type, _ = mimetypes.guess_type(file_path, strict=False)
+        extractor = _BY_MIME_TYPE.get(mime_type)
+    return extractor
+
+
+def is_supported(file_path: str) -> bool:
+    """Whether some extractor claims the file (by name only; the contents may still be skipped)"""
+    return extractor_for(file_path) is not None
+
+
+def resolve(file_path: str, max_parse_bytes: Optional[int] = None) -> Tuple[Optional[Extractor], Optional[str]]:
+    """(extractor, None) for the file's real format, or (None, reason) if it should be skipped.
+
+    Formats recognizable by content (PDF, Word, Excel, PowerPoint) are used
+    whatever the extension says; other formats are taken at their extension's word.
+    """
+    expected = extractor_for(file_path)
+    kind, reason = sniff(file_path,
+                         expected.name if expected else None,
+                         text=expected is not None and expected.plain_text,
+                         max_parse_bytes=max_parse_bytes)
+    if kind is None:
+        return None, reason
+    extractor = _EXTRACTORS.get(kind)
+    if extractor is None:
+        return None, f"no extractor for {kind} files"
+    return extractor, None
+
+
+def load_plugins(modules: Iterable[str]):
+    """Import extractor plugin modules; each registers its extractors when imported"""
+    for module in modules:
+        module = module.strip()
+        if not module:
+            continue
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"Error loading extractor plugin {module}: {e}")
+
+
+for _extractor in (TextExtractor(), DocxExtractor(), XlsxExtractor(), PptxExtractor()):
+    register(_extractor)
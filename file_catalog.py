@@ -0,0 +1,305 @@
+"""
+File Catalog Module for Anvesh
+Persistent catalog of file names and metadata for instant filename search
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_roots (
+    folder TEXT PRIMARY KEY,
+    refreshed_at REAL
+);
+CREATE TABLE IF NOT EXISTS catalog (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    gen INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS catalog_ext ON catalog(ext);
+CREATE INDEX IF NOT EXISTS catalog_mtime ON catalog(mtime_ns);
+"""
+
+# Substring index over names (SQLite 3.34+ ships the FTS5 trigram tokenizer)
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS catalog_names USING fts5(name, content='catalog', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS catalog_names_insert AFTER INSERT ON catalog BEGIN
+    INSERT INTO catalog_names (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_names_delete AFTER DELETE ON catalog BEGIN
+    INSERT INTO catalog_names (catalog_names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+"""
+
+# Rows written per executemany while refreshing
+BATCH_SIZE = 1000
+
+SORT_COLUMNS = {"name": "name COLLATE NOCASE, path", "modified": "mtime_ns DESC", "size": "size DESC"}
+
+
+def normalize_folder(folder: str) -> str:
+    return os.path.normpath(os.path.abspath(folder))
+
+
+def _under_clause(folders: List[str]) -> tuple:
+    conditions = []
+    params = []
+    for folder in folders:
+        prefix = folder.rstrip(os.sep) + os.sep
+        conditions.append("substr(path, 1, ?) = ?")
+        params.extend([len(prefix), prefix])
+    return "(" + " OR ".join(conditions or ["0"]) + ")", params
+
+
+def _row(path: str, size: int, mtime_ns: int, gen: int) -> tuple:
+    name = os.path.basename(path)
+    return (path, name, name.lower(), os.path.splitext(name)[1].lower(), size, mtime_ns, gen)
+
+
+class FileCatalog:
+    """SQLite table of (path, name, ext, size, mtime) for every file in the cataloged folders"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.fts_available = False
+        self._write_lock = threading.Lock()
+        self._refresh_thread = None
+        self._refresh_status = {"state": "idle"}
+        self._initialized = False
+        self._roots = None  # {folder: refreshed_at}, read once and kept in step with every change
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, creating the schema on first use"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            try:
+                conn.executescript(FTS_SCHEMA)
+                self.fts_available = True
+            except sqlite3.OperationalError as e:
+                print(f"Warning: file catalog name index unavailable ({e}), filename search will scan the catalog")
+            self._initialized = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------- Writing ----------
+
+    def refresh(self, folders: List[str], walk: Callable[[List[str]], Iterable]):
+        """Catalog (or incrementally refresh) folders from walk(folders), which yields
+        entries with path, st_size and st_mtime_ns; vanished files are dropped"""
+        folders = [normalize_folder(f) for f in folders]
+        status = {"state": "refreshing", "folders": folders, "started_at": time.time(), "files_seen": 0}
+        self._refresh_status = status
+        try:
+            with self._write_lock:
+                conn = self._connect()
+                try:
+                    gen = conn.execute("SELECT COALESCE(MAX(gen), 0) + 1 FROM catalog").fetchone()[0]
+                    upsert = (
+                        "INSERT INTO catalog (path, name, name_lower, ext, size, mtime_ns, gen) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, gen = excluded.gen"
+                    )
+                    batch = []
+                    for entry in walk(folders):
+                        batch.append(_row(entry.path, entry.st_size, entry.st_mtime_ns, gen))
+                        if len(batch) >= BATCH_SIZE:
+                            conn.executemany(upsert, batch)
+                            status["files_seen"] += len(batch)
+                            batch = []
+                    conn.executemany(upsert, batch)
+                    status["files_seen"] += len(batch)
+                    under, params = _under_clause(folders)
+                    status["files_removed"] = conn.execute(
+                        f"DELETE FROM catalog WHERE {under} AND gen < ?", params + [gen]
+                    ).rowcount
+                    now = time.time()
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO catalog_roots (folder, refreshed_at) VALUES (?, ?)",
+                        [(folder, now) for folder in folders]
+                    )
+                    conn.commit()
+                    self._roots = None
+                finally:
+                    conn.close()
+            status["state"] = "idle"
+        except Exception as e:
+            print(f"Error refreshing file catalog: {e}")
+            status["state"] = "error"
+            status["error"] = str(e)
+        status["finished_at"] = time.time()
+
+    def start_refresh(self, folders: List[str], walk: Callable[[List[str]], Iterable]) -> bool:
+        """Run refresh() on a background thread; returns False if one is already running"""
+        if self.is_refreshing():
+            return False
+        self._refresh_status = {"state": "refreshing", "folders": [normalize_folder(f) for f in folders]}
+        self._refresh_thread = threading.Thread(target=self.refresh, args=(folders, walk), daemon=True)
+        self._refresh_thread.start()
+        return True
+
+    def is_refreshing(self) -> bool:
+        return self._refresh_thread is not None and self._refresh_thread.is_alive()
+
+    def update_file(self, path: str):
+        """Record a created/modified file (if it lies in a cataloged folder)"""
+        path = os.path.abspath(path)
+        if not self.is_cataloged_path(path):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.remove_path(path)
+            return
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                # Any generation will do: the next refresh stamps every file it still finds
+                conn.execute(
+                    "INSERT INTO catalog (path, name, name_lower, ext, size, mtime_ns, gen) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns",
+                    _row(path, stat.st_size, stat.st_mtime_ns, 0)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+    def remove_path(self, path: str):
+        """Forget one file, or every file below a directory"""
+        path = normalize_folder(path)
+        under, params = _under_clause([path])
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                conn.execute(f"DELETE FROM catalog WHERE path = ? OR {under}", [path] + params)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def drop(self, folder: Optional[str] = None):
+        """Forget every folder, or one cataloged folder"""
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                if folder is None:
+                    conn.execute("DELETE FROM catalog")
+                    conn.execute("DELETE FROM catalog_roots")
+                else:
+                    folder = normalize_folder(folder)
+                    under, params = _under_clause([folder])
+                    conn.execute(f"DELETE FROM catalog WHERE {under}", params)
+                    conn.execute("DELETE FROM catalog_roots WHERE folder = ?", (folder,))
+                conn.commit()
+                self._roots = None
+            finally:
+                conn.close()
+
+    # ---------- Reading ----------
+
+    def _root_times(self) -> Dict[str, float]:
+        roots = self._roots
+        if roots is None:
+            conn = self._connect()
+            try:
+                roots = dict(conn.execute("SELECT folder, refreshed_at FROM catalog_roots ORDER BY folder").fetchall())
+            finally:
+                conn.close()
+            self._roots = roots
+        return roots
+
+    def roots(self) -> List[str]:
+        return list(self._root_times())
+
+    def stale_roots(self, folders: List[str], max_age: float) -> List[str]:
+        """Cataloged folders holding any of folders that were last refreshed more than max_age seconds ago"""
+        folders = [normalize_folder(f) for f in folders]
+        oldest = time.time() - max_age
+        return [
+            root for root, refreshed_at in self._root_times().items()
+            if (refreshed_at or 0) < oldest and any(
+                folder == root or folder.startswith(root.rstrip(os.sep) + os.sep) for folder in folders
+            )
+        ]
+
+    def is_cataloged_path(self, path: str) -> bool:
+        path = normalize_folder(path)
+        return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in self.roots())
+
+    def covers(self, folders: List[str]) -> bool:
+        """True if every folder lies inside a cataloged folder"""
+        return bool(folders) and all(self.is_cataloged_path(folder) for folder in folders)
+
+    def search(self,
+               folders: List[str],
+               query: str = "",
+               case_sensitive: bool = False,
+               extensions: Optional[List[str]] = None,
+               min_size: Optional[int] = None,
+               max_size: Optional[int] = None,
+               modified_after_ns: Optional[int] = None,
+               modified_before_ns: Optional[int] = None,
+               sort: str = "name",
+               limit: int = 100,
+               offset: int = 0) -> Dict:
+        """Files in the folders whose name contains query and that pass the filters"""
+        under, params = _under_clause([normalize_folder(f) for f in folders])
+        conditions = [under]
+        if query:
+            if self.fts_available and len(query) >= 3 and query.isascii():
+                # The trigram index narrows to case-insensitive matches; instr() below checks exactly
+                conditions.append("id IN (SELECT rowid FROM catalog_names WHERE catalog_names MATCH ?)")
+                params.append('"' + query.replace('"', '""') + '"')
+            # name_lower is lowercased by Python (SQLite's lower() only handles ASCII)
+            conditions.append("instr(name, ?) > 0" if case_sensitive else "instr(name_lower, ?) > 0")
+            params.append(query if case_sensitive else query.lower())
+        if extensions:
+            normalized = ["." + ext.lower().lstrip(".") for ext in extensions]
+            conditions.append(f"ext IN ({', '.join('?' * len(normalized))})")
+            params.extend(normalized)
+        for condition, value in (("size >= ?", min_size), ("size <= ?", max_size),
+                                 ("mtime_ns >= ?", modified_after_ns), ("mtime_ns < ?", modified_before_ns)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        where = " AND ".join(conditions)
+        order = SORT_COLUMNS.get(sort, SORT_COLUMNS["name"])
+        conn = self._connect()
+        try:
+            # Fetch one extra row to tell whether there are more
+            rows = conn.execute(
+                f"SELECT path, name, ext, size, mtime_ns FROM catalog WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit + 1, offset]
+            ).fetchall()
+        finally:
+            conn.close()
+        return {
+            "files": [
+                {"file_path": path, "name": name, "ext": ext, "size": size, "modified": mtime_ns / 1e9}
+                for path, name, ext, size, mtime_ns in rows[:limit]
+            ],
+            "has_more": len(rows) > limit
+        }
+
+    def get_status(self) -> Dict:
+        """Catalog size and refresh progress"""
+        status = dict(self._refresh_status)
+        conn = self._connect()
+        try:
+            status["roots"] = [
+                {"folder": folder, "refreshed_at": refreshed_at}
+                for folder, refreshed_at in conn.execute("SELECT folder, refreshed_at FROM catalog_roots ORDER BY folder")
+            ]
+            status["files"] = conn.execute("SELECT COUNT(*) FROM catalog").fetchone()[0]
+        finally:
+            conn.close()
+        status["name_index"] = self.fts_available
+        status["db_path"] = self.db_path
+        status["db_size"] = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+        return status
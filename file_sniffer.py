@@ -0,0 +1,89 @@
+"""
+File Sniffer Module for Anvesh
+Identifies a file's real format from its first bytes, so each file goes to
+the right extractor and files no extractor can read are skipped up front
+"""
+import os
+import zipfile
+from typing import Optional, Tuple
+
+from text_scanner import detect_encoding
+
+# Bytes read to identify a file
+SNIFF_BYTES = 8192
+
+PDF_MAGIC = b"%PDF-"
+ZIP_MAGIC = b"PK\x03\x04"
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"  # Legacy .doc/.xls/.ppt, and password-protected Office files
+RTF_MAGIC = b"{\\rtf"
+
+# Main part of each Office Open XML format
+OOXML_PARTS = (("word/document.xml", "docx"), ("xl/workbook.xml", "xlsx"), ("ppt/presentation.xml", "pptx"))
+
+# Formats recognized by content; any other format is taken at its extension's word
+FORMAT_NAMES = {"pdf": "PDF", "docx": "Word document", "xlsx": "Excel workbook", "pptx": "PowerPoint presentation"}
+
+
+def _ooxml_format(file_path: str) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            names = set(archive.namelist())
+    except (zipfile.BadZipFile, OSError) as e:
+        return None, f"corrupt zip archive ({e})"
+    for part, kind in OOXML_PARTS:
+        if part in names:
+            return kind, None
+    return None, "zip archive that isn't a Word, Excel or PowerPoint document"
+
+
+def sniff(file_path: str,
+          expected: Optional[str] = None,
+          text: bool = False,
+          max_parse_bytes: Optional[int] = None) -> Tuple[Optional[str], Optional[str]]:
+    """(format, None) naming the extractor a file needs, or (None, reason) if it should be skipped.
+
+    expected is the format the file's extension calls for, and text whether
+    that's a plain text format. PDF and Office files are recognized by
+    content, whatever the extension says, except that text files are only
+    taken for one when they start with its signature (a note may well quote
+    "%PDF-"); text is only assumed without NUL bytes (unless UTF-16), and
+    other formats are trusted to their extractor.
+    Parsed formats larger than max_parse_bytes are skipped; text is
+    streamed, so its size doesn't matter.
+    """
+    try:
+        size = os.path.getsize(file_path)
+        with open(file_path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError as e:
+        return None, f"can't be read ({e.strerror or e})"
+
+    kind = reason = None
+    if head.startswith(PDF_MAGIC) or (not text and PDF_MAGIC in head[:1024]):  # Readers accept a little junk before the header
+        kind = "pdf"
+    elif head.startswith(ZIP_MAGIC):
+        kind, reason = _ooxml_format(file_path)
+
+    if kind is not None:
+        pass
+    elif text:
+        encoding, _ = detect_encoding(head[:4])
+        if b"\x00" in head and encoding != "utf-16":
+            return None, "binary content"
+        return expected, None
+    elif expected is not None and expected not in FORMAT_NAMES:
+        kind = expected  # e.g. OpenDocument is a zip too; its extractor knows what to look for
+    elif head.startswith(OLE2_MAGIC):
+        return None, "legacy binary Office format (.doc/.xls/.ppt) or password-protected document"
+    elif reason is not None:
+        return None, reason
+    elif size == 0:
+        return None, "empty file"
+    elif head.startswith(RTF_MAGIC):
+        return None, "RTF document (not supported)"
+    else:
+        return None, f"not a valid {FORMAT_NAMES.get(expected, 'document')}"
+
+    if max_parse_bytes is not None and size > max_parse_bytes:
+        return None, f"too large to parse ({size / (1024 * 1024):.0f} MB, limit {max_parse_bytes / (1024 * 1024):.0f} MB)"
+    return kind, None
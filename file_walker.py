@@ -0,0 +1,167 @@
+"""
+File Walker Module for Anvesh
+Concurrent os.scandir directory walk that streams matching files as they are found
+"""
+import fnmatch
+import os
+import stat as stat_module
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Directories that never hold documents worth searching
+SKIP_DIRS = {
+    "node_modules", "__pycache__", ".git", ".svn", ".hg", ".venv", "venv",
+    "$RECYCLE.BIN", "System Volume Information"
+}
+
+# Directories listed at once; scandir mostly waits on the disk (or network share)
+DEFAULT_THREADS = 8
+
+WINDOWS_HIDDEN = getattr(stat_module, "FILE_ATTRIBUTE_HIDDEN", 0x2) | getattr(stat_module, "FILE_ATTRIBUTE_SYSTEM", 0x4)
+
+
+class FileEntry(NamedTuple):
+    """A file found by the walk, with the stat fields callers need"""
+    path: str
+    st_size: int
+    st_mtime_ns: int
+
+
+def is_hidden_path(path: str) -> bool:
+    """True if any component of path is a dot-file/dot-directory or a skipped directory"""
+    parts = os.path.normpath(path).split(os.sep)
+    return any(part.startswith(".") or part in SKIP_DIRS for part in parts if part not in ("", ".", ".."))
+
+
+class FileWalker:
+    """Walks folders with a small thread pool, one directory listing per task.
+
+    Files are yielded as soon as their directory has been listed, so callers
+    can start on the first file long before a large tree has been walked.
+    Include/exclude globs are matched against the file name and the path
+    relative to the walked folder (with "/" separators); excluded directories
+    are not entered.
+    """
+
+    def __init__(self,
+                 is_supported: Callable[[str], bool],
+                 include: Optional[List[str]] = None,
+                 exclude: Optional[List[str]] = None,
+                 max_depth: Optional[int] = None,
+                 skip_hidden: bool = True,
+                 max_file_size: Optional[int] = None,
+                 threads: int = DEFAULT_THREADS):
+        self.is_supported = is_supported
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.max_depth = max_depth
+        self.skip_hidden = skip_hidden
+        self.max_file_size = max_file_size
+        self.threads = max(1, threads)
+
+        self._lock = threading.Lock()
+        self.dirs_scanned = 0
+        self.dirs_pending = 0
+        self.files_found = 0
+        self.files_skipped = 0
+        self._skipped: List[Tuple[str, str]] = []  # (path, reason) not yet taken by take_skipped()
+        self.fingerprint = 0  # Changes if any file found (or skipped for size) is added, removed or modified
+        self.done = False
+
+    # ---------- Filters ----------
+
+    def _matches(self, patterns: List[str], name: str, relative: str) -> bool:
+        return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(relative, p) for p in patterns)
+
+    def _is_hidden(self, entry: os.DirEntry) -> bool:
+        if entry.name.startswith("."):
+            return True
+        if os.name == "nt":
+            try:
+                return bool(entry.stat(follow_symlinks=False).st_file_attributes & WINDOWS_HIDDEN)
+            except (OSError, AttributeError):
+                return False
+        return False
+
+    # ---------- Walking ----------
+
+    def _scan(self, root: str, directory: str, depth: int) -> Tuple[List[FileEntry], List[str]]:
+        """List one directory: (matching files, subdirectories to enter)"""
+        files = []
+        subdirs = []
+        skipped = []
+        fingerprint = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if self.skip_hidden and self._is_hidden(entry):
+                            continue
+                        relative = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.skip_hidden and entry.name in SKIP_DIRS:
+                                continue
+                            if self.max_depth is not None and depth >= self.max_depth:
+                                continue
+                            if self._matches(self.exclude, entry.name, relative):
+                                continue
+                            subdirs.append(entry.path)
+                        elif entry.is_file() and self.is_supported(entry.name):
+                            if self.include and not self._matches(self.include, entry.name, relative):
+                                continue
+                            if self._matches(self.exclude, entry.name, relative):
+                                continue
+                            # DirEntry caches its stat (and on Windows it comes free with the listing)
+                            stat = entry.stat()
+                            fingerprint += hash((entry.path, stat.st_size, stat.st_mtime_ns))
+                            if self.max_file_size is not None and stat.st_size > self.max_file_size:
+                                skipped.append((entry.path, f"larger than {self.max_file_size / (1024 * 1024):g} MB"))
+                                continue
+                            files.append(FileEntry(entry.path, stat.st_size, stat.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Error walking directory {directory}: {e}")
+        with self._lock:
+            self.dirs_scanned += 1
+            self.dirs_pending += len(subdirs) - 1
+            self.files_found += len(files)
+            self.files_skipped += len(skipped)
+            self._skipped.extend(skipped)
+            self.fingerprint = (self.fingerprint + fingerprint) & 0xFFFFFFFFFFFFFFFF  # Order-independent
+        return files, subdirs
+
+    def walk(self, folders: List[str]) -> Iterator[FileEntry]:
+        """Yield matching files below the folders (in no particular order)"""
+        roots = [os.path.abspath(folder) for folder in folders if os.path.isdir(folder)]
+        with self._lock:
+            self.dirs_pending += len(roots)
+        executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="anvesh-walk")
+        try:
+            pending = {executor.submit(self._scan, root, root, 0): (root, 0) for root in roots}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    root, depth = pending.pop(future)
+                    files, subdirs = future.result()
+                    for subdir in subdirs:
+                        pending[executor.submit(self._scan, root, subdir, depth + 1)] = (root, depth + 1)
+                    yield from files
+            self.done = True
+        finally:
+            # Also reached when the consumer stops early: drop directories not yet listed
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def take_skipped(self) -> List[Tuple[str, str]]:
+        """(path, reason) for files left out by the size limit since the last call"""
+        with self._lock:
+            skipped, self._skipped = self._skipped, []
+        return skipped
+
+    def estimate_total(self) -> int:
+        """Files found so far plus, while walking, the average per directory for each unlisted one"""
+        with self._lock:
+            if self.done or not self.dirs_scanned:
+                return self.files_found
+            return self.files_found + round(self.files_found / self.dirs_scanned * self.dirs_pending)
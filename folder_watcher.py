@@ -0,0 +1,336 @@
+"""
+Folder Watcher Module for Anvesh
+Watches registered folders and reports created, modified and deleted files
+(inotify on Linux, polling with os.scandir everywhere else)
+"""
+import os
+import sys
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Try to set up inotify through libc (Linux only, no extra dependency)
+try:
+    if not sys.platform.startswith("linux"):
+        raise ImportError("inotify is Linux only")
+    import ctypes
+    import ctypes.util
+    import select
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    _libc.inotify_init1.argtypes = [ctypes.c_int]
+    _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    INOTIFY_AVAILABLE = True
+except (ImportError, OSError, AttributeError):
+    INOTIFY_AVAILABLE = False
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def scan_tree(folder: str, is_supported: Callable[[str], bool]) -> Dict[str, Tuple[int, int]]:
+    """Snapshot {path: (size, mtime_ns)} of supported files below folder"""
+    snapshot = {}
+    stack = [folder]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file() and is_supported(entry.path):
+                            stat = entry.stat()
+                            snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return snapshot
+
+
+class FolderWatcher:
+    """Debounced change feed over a set of folders.
+
+    on_change(path) is called for created/modified files and on_delete(path)
+    for deleted or moved-away files and directories. on_rescan(folder) is
+    called when events may have been lost (inotify queue overflow).
+    """
+
+    def __init__(self,
+                 on_change: Callable[[str], None],
+                 on_delete: Callable[[str], None],
+                 on_rescan: Callable[[str], None],
+                 is_supported: Callable[[str], bool],
+                 debounce: float = 2.0,
+                 max_delay: float = 30.0,
+                 poll_interval: float = 30.0,
+                 use_inotify: bool = True):
+        self.on_change = on_change
+        self.on_delete = on_delete
+        self.on_rescan = on_rescan
+        self.is_supported = is_supported
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.backend = "inotify" if use_inotify and INOTIFY_AVAILABLE else "polling"
+
+        self._folders: List[str] = []
+        self._pending: Dict[str, List[float]] = {}  # path -> [first_seen, last_seen]
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        self._snapshots: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self._inotify_fd: Optional[int] = None
+        self._watches: Dict[int, str] = {}
+
+        self._stats = {
+            "events": 0,
+            "changed": 0,
+            "deleted": 0,
+            "rescans": 0,
+            "errors": 0,
+            "last_event_at": None,
+            "last_processed_at": None
+        }
+
+    # ---------- Public API ----------
+
+    def add_folder(self, folder: str):
+        folder = os.path.normpath(os.path.abspath(folder))
+        with self._cond:
+            if folder in self._folders:
+                return
+            self._folders.append(folder)
+        if self.is_running():
+            self._start_watching(folder)
+
+    def remove_folder(self, folder: str):
+        folder = os.path.normpath(os.path.abspath(folder))
+        with self._cond:
+            if folder not in self._folders:
+                return
+            self._folders.remove(folder)
+            self._snapshots.pop(folder, None)
+        if self._inotify_fd is not None:
+            for wd, path in list(self._watches.items()):
+                if path == folder or path.startswith(folder + os.sep):
+                    _libc.inotify_rm_watch(self._inotify_fd, wd)
+                    self._watches.pop(wd, None)
+
+    def folders(self) -> List[str]:
+        with self._cond:
+            return list(self._folders)
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop.clear()
+        if self.backend == "inotify":
+            fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                print(f"Warning: inotify unavailable (errno {ctypes.get_errno()}), falling back to polling")
+                self.backend = "polling"
+            else:
+                self._inotify_fd = fd
+        for folder in self.folders():
+            self._start_watching(folder)
+        source = self._inotify_loop if self.backend == "inotify" else self._poll_loop
+        self._threads = [
+            threading.Thread(target=source, daemon=True, name="anvesh-watch-source"),
+            threading.Thread(target=self._worker_loop, daemon=True, name="anvesh-watch-worker")
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+            self._watches.clear()
+
+    def is_running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def get_status(self) -> Dict:
+        """Queue depth and lag (age of the oldest unprocessed change)"""
+        now = time.time()
+        with self._cond:
+            depth = len(self._pending)
+            oldest = min((first for first, _ in self._pending.values()), default=None)
+        status = dict(self._stats)
+        status.update({
+            "running": self.is_running(),
+            "backend": self.backend,
+            "folders": self.folders(),
+            "queue_depth": depth,
+            "lag_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+            "debounce_seconds": self.debounce,
+            "watches": len(self._watches) if self.backend == "inotify" else None,
+            "poll_interval_seconds": self.poll_interval if self.backend == "polling" else None
+        })
+        return status
+
+    # ---------- Queue ----------
+
+    def _enqueue(self, path: str):
+        now = time.time()
+        with self._cond:
+            entry = self._pending.get(path)
+            if entry:
+                entry[1] = now
+            else:
+                self._pending[path] = [now, now]
+            self._stats["events"] += 1
+            self._stats["last_event_at"] = now
+            self._cond.notify()
+
+    def _worker_loop(self):
+        """Process changes once a path has been quiet for `debounce` seconds"""
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait(timeout=min(self.debounce, 1.0))
+                now = time.time()
+                ready = [
+                    path for path, (first, last) in self._pending.items()
+                    if now - last >= self.debounce or now - first >= self.max_delay
+                ]
+                for path in ready:
+                    del self._pending[path]
+            for path in ready:
+                self._process(path)
+
+    def _process(self, path: str):
+        try:
+            if os.path.isfile(path):
+                self.on_change(path)
+                self._stats["changed"] += 1
+            elif os.path.isdir(path):
+                # A directory appeared (e.g. moved in): its files are queued individually
+                return
+            else:
+                self.on_delete(path)
+                self._stats["deleted"] += 1
+        except Exception as e:
+            print(f"Error processing change for {path}: {e}")
+            self._stats["errors"] += 1
+        self._stats["last_processed_at"] = time.time()
+
+    # ---------- Polling backend ----------
+
+    def _start_watching(self, folder: str):
+        if self.backend == "inotify":
+            self._add_watches(folder)
+        else:
+            snapshot = scan_tree(folder, self.is_supported)
+            with self._cond:
+                self._snapshots[folder] = snapshot
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            for folder in self.folders():
+                with self._cond:
+                    before = self._snapshots.get(folder, {})
+                after = scan_tree(folder, self.is_supported)
+                for path, signature in after.items():
+                    if before.get(path) != signature:
+                        self._enqueue(path)
+                for path in before:
+                    if path not in after:
+                        self._enqueue(path)
+                with self._cond:
+                    if folder in self._snapshots:
+                        self._snapshots[folder] = after
+
+    # ---------- inotify backend ----------
+
+    def _add_watches(self, folder: str):
+        """Watch folder and all its subdirectories"""
+        stack = [folder]
+        while stack:
+            directory = stack.pop()
+            wd = _libc.inotify_add_watch(self._inotify_fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                print(f"Warning: could not watch {directory} (errno {ctypes.get_errno()})")
+                self._stats["errors"] += 1
+                continue
+            self._watches[wd] = directory
+            try:
+                with os.scandir(directory) as entries:
+                    stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+
+    def _forget_watches(self, directory: str):
+        prefix = directory + os.sep
+        for wd, path in list(self._watches.items()):
+            if path == directory or path.startswith(prefix):
+                _libc.inotify_rm_watch(self._inotify_fd, wd)
+                self._watches.pop(wd, None)
+
+    def _inotify_loop(self):
+        fd = self._inotify_fd
+        while not self._stop.is_set():
+            readable, _, _ = select.select([fd], [], [], 1.0)
+            if not readable:
+                continue
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                self._handle_event(wd, mask, name)
+
+    def _handle_event(self, wd: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped; let the owner reconcile every folder
+            self._stats["rescans"] += 1
+            for folder in self.folders():
+                self.on_rescan(folder)
+            return
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            return
+        directory = self._watches.get(wd)
+        if directory is None or not name:
+            return
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_watches(path)
+                for file_path in scan_tree(path, self.is_supported):
+                    self._enqueue(file_path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget_watches(path)
+                self._enqueue(path)
+        elif self.is_supported(path):
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM):
+                self._enqueue(path)
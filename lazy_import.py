@@ -0,0 +1,68 @@
+"""
+Lazy Import Module for Anvesh
+Optional libraries that are slow to import (PDF backends, openpyxl, OpenCV,
+YOLO...) are looked up without being imported, and imported on first use,
+so the server starts (and the exe shows its page) without waiting for them
+"""
+import importlib
+import importlib.util
+import threading
+
+
+def is_installed(name: str) -> bool:
+    """Whether a top-level module can be found, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    available says whether it's installed (and hasn't failed to import)
+    without importing it; load() imports it now, e.g. to warm up.
+    """
+
+    def __init__(self, name: str, *fallbacks: str):
+        self._names = (name,) + fallbacks  # Tried in order, e.g. pymupdf then its old name fitz
+        self._module = None
+        self._error = None
+        self._installed = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        if self._module is not None:
+            return True
+        if self._error is not None:
+            return False
+        if self._installed is None:
+            self._installed = any(is_installed(name.split(".")[0]) for name in self._names)
+        return self._installed
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self):
+        """The module, imported if it isn't yet; raises ImportError if it can't be"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    if self._error is not None:
+                        raise self._error
+                    for name in self._names:
+                        try:
+                            self._module = importlib.import_module(name)
+                            break
+                        except ImportError as e:
+                            self._error = e
+                    else:
+                        print(f"Error importing {self._names[0]}: {self._error}")
+                        raise self._error
+                    self._error = None
+        return self._module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self.load(), attribute)
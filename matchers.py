@@ -0,0 +1,317 @@
+"""
+Matchers Module for Anvesh
+Finds search terms in extracted text; many terms are matched in a single pass,
+regex, whole word and exact modes are compiled once per search, and batches
+of searches share one pass to find which of them a chunk can match
+"""
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# Optional C implementation of Aho-Corasick
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Optional linear-time regex engine (RE2), immune to catastrophic backtracking
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+MATCH_MODES = ("substring", "whole_word", "exact", "regex")
+
+# Longest user regex accepted
+MAX_PATTERN_LENGTH = 1000
+
+NO_MATCH: Dict[str, int] = {}
+
+
+class PatternError(ValueError):
+    """A search pattern that can't be compiled or could stall the search"""
+
+
+class SubstringMatcher:
+    """A single plain substring"""
+
+    def __init__(self, query: str, case_sensitive: bool):
+        self.terms = [query]
+        self.case_sensitive = case_sensitive
+        self._query = query if case_sensitive else query.lower()
+
+    def term_counts(self, text: str) -> Dict[str, int]:
+        """Non-overlapping occurrences per term; empty dict if nothing matched"""
+        search_text = text if self.case_sensitive else text.lower()
+        if self._query in search_text:
+            return {self.terms[0]: search_text.count(self._query)}
+        return NO_MATCH
+
+
+class MultiTermMatcher:
+    """Many substrings found in one pass over the text with an Aho-Corasick automaton.
+
+    Counts are per term and non-overlapping, the same as str.count() gives for
+    a single term, so a term matches identically alone or in a list.
+    """
+
+    def __init__(self, terms: List[str], case_sensitive: bool):
+        self.terms = list(dict.fromkeys(term for term in terms if term))
+        self.case_sensitive = case_sensitive
+        keys = self.terms if case_sensitive else [term.lower() for term in self.terms]
+        self._lengths = [len(key) for key in keys]
+        if AHOCORASICK_AVAILABLE:
+            self._automaton = ahocorasick.Automaton()
+            for index, key in enumerate(keys):
+                # Lowercased keys can collide (e.g. "Id" and "ID"); keep every term index
+                existing = self._automaton.get(key, ())
+                self._automaton.add_word(key, existing + (index,))
+            self._automaton.make_automaton()
+        else:
+            self._build(keys)
+
+    def _build(self, keys: List[str]):
+        """Build goto/fail/output tables for the pure Python automaton"""
+        goto = [{}]
+        output = [[]]
+        for index, key in enumerate(keys):
+            state = 0
+            for ch in key:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto.append({})
+                    output.append([])
+                    goto[state][ch] = next_state
+                state = next_state
+            output[state].append(index)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[next_state] = goto[f].get(ch, 0)
+                output[next_state] = output[next_state] + output[fail[next_state]]
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    def _iter_hits(self, text: str):
+        """Yield (end_index, term_indexes) for every match, overlapping included"""
+        if AHOCORASICK_AVAILABLE:
+            yield from self._automaton.iter(text)
+            return
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                yield i, output[state]
+
+    def term_counts(self, text: str) -> Dict[str, int]:
+        """Non-overlapping occurrences per term; empty dict if nothing matched"""
+        search_text = text if self.case_sensitive else text.lower()
+        counts = {}
+        next_start = {}  # term index -> first position a new occurrence may start
+        for end, indexes in self._iter_hits(search_text):
+            for index in indexes:
+                start = end - self._lengths[index] + 1
+                if start >= next_start.get(index, 0):
+                    term = self.terms[index]
+                    counts[term] = counts.get(term, 0) + 1
+                    next_start[index] = end + 1
+        return counts or NO_MATCH
+
+
+def _repeats(parsed) -> bool:
+    """True if a parsed pattern contains a quantifier that can match more than once"""
+    for op, av in parsed:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)):
+            if av[1] > 1:
+                return True
+            if _repeats(av[2]):
+                return True
+        elif any(_repeats(sub) for sub in _subpatterns(op, av)):
+            return True
+    return False
+
+
+def _branches(parsed) -> bool:
+    """True if a parsed pattern contains an alternation (single-character ones are a set, not a branch)"""
+    for op, av in parsed:
+        if op == sre_parse.BRANCH:
+            return True
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)):
+            if _branches(av[2]):
+                return True
+        elif any(_branches(sub) for sub in _subpatterns(op, av)):
+            return True
+    return False
+
+
+def _subpatterns(op, av) -> list:
+    """Nested subpatterns of one parsed item"""
+    if op == sre_parse.SUBPATTERN:
+        return [av[3]]
+    if op == sre_parse.BRANCH:
+        return list(av[1])
+    if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        return [av[1]]
+    if op == getattr(sre_parse, "ATOMIC_GROUP", None):
+        return [av]
+    if op == sre_parse.GROUPREF_EXISTS:
+        return [p for p in av[1:] if p is not None]
+    return []
+
+
+def _nested_repeat(parsed) -> bool:
+    """True if a quantifier that can match more than once wraps another quantifier or an alternation.
+
+    E.g. (a+)+, (\\w*\\s?)*, (.*a){15} or (a|aa)+: each can match the same
+    text in exponentially (or, bounded, polynomially) many ways, which the
+    re module tries one by one before giving up on a line.
+    """
+    for op, av in parsed:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            if av[1] > 1 and (_repeats(av[2]) or _branches(av[2])):
+                return True
+            if _nested_repeat(av[2]):
+                return True
+        elif any(_nested_repeat(sub) for sub in _subpatterns(op, av)):
+            return True
+    return False
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str, case_sensitive: bool):
+    """Compile a user regex, cached across searches.
+
+    RE2 runs in linear time, so any pattern it accepts is safe. Patterns it
+    can't handle (backreferences, lookaround) and all patterns when it isn't
+    installed use the re module, after rejecting quantifiers that wrap
+    another quantifier or an alternation, the usual cause of catastrophic
+    backtracking.
+    """
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        raise PatternError(f"Pattern is longer than {MAX_PATTERN_LENGTH} characters")
+    if RE2_AVAILABLE:
+        try:
+            return re2.compile(pattern if case_sensitive else "(?i)" + pattern)
+        except Exception:
+            pass
+    try:
+        parsed = sre_parse.parse(pattern, 0 if case_sensitive else re.IGNORECASE)
+        compiled = re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+    except re.error as e:
+        raise PatternError(f"Invalid regular expression: {e}")
+    if _nested_repeat(parsed):
+        raise PatternError("Pattern repeats a repetition or alternation (like (a+)+ or (a|aa)+) that could take too long to search")
+    return compiled
+
+
+class PatternMatcher:
+    """Terms matched as regular expressions, whole words or exact (whole chunk) text.
+
+    Each term is compiled once; counts are non-overlapping per term, and
+    empty regex matches are not counted.
+    """
+
+    def __init__(self, terms: List[str], mode: str, case_sensitive: bool):
+        self.terms = list(dict.fromkeys(term for term in terms if term))
+        self.mode = mode
+        self.case_sensitive = case_sensitive
+        self.backtracking = False
+        flags = 0 if case_sensitive else re.IGNORECASE
+        if mode == "regex":
+            self._patterns = [compile_pattern(term, case_sensitive) for term in self.terms]
+            # Patterns on the re module can still backtrack for a long time (e.g. .*.*.*x); the
+            # re module can't be interrupted, so callers run these where they can be killed
+            self.backtracking = any(isinstance(pattern, re.Pattern) for pattern in self._patterns)
+        elif mode == "whole_word":
+            # Like \b, but also correct for terms that start or end with punctuation
+            self._patterns = [re.compile(rf"(?<!\w){re.escape(term)}(?!\w)", flags) for term in self.terms]
+        else:
+            self._patterns = [re.compile(rf"\s*{re.escape(term)}\s*", flags) for term in self.terms]
+
+    def term_counts(self, text: str) -> Dict[str, int]:
+        """Non-overlapping occurrences per term; empty dict if nothing matched"""
+        counts = {}
+        for term, pattern in zip(self.terms, self._patterns):
+            if self.mode == "exact":
+                count = 1 if pattern.fullmatch(text) else 0
+            else:
+                count = sum(1 for m in pattern.finditer(text) if m.end() > m.start())
+            if count:
+                counts[term] = count
+        return counts or NO_MATCH
+
+
+@lru_cache(maxsize=64)
+def get_matcher(terms: Tuple[str, ...], case_sensitive: bool, mode: str = "substring"):
+    """Matcher for a search, built once per process and reused across files"""
+    if mode != "substring":
+        return PatternMatcher(list(terms), mode, case_sensitive)
+    if len(terms) == 1:
+        return SubstringMatcher(terms[0], case_sensitive)
+    return MultiTermMatcher(list(terms), case_sensitive)
+
+
+class MatcherSet:
+    """Many searches run over the same text.
+
+    The terms of every non-regex search go into one case-insensitive
+    Aho-Corasick prefilter; a chunk only goes to the searches whose terms it
+    contains (regex searches get every chunk), so a batch of hundreds of
+    searches costs little more than one.
+    """
+
+    def __init__(self, matchers: List):
+        self.matchers = matchers
+        self._always = []  # Searches with no literal terms to look for
+        self._by_key: Dict[str, List[int]] = {}  # Lowercased term -> searches using it
+        for index, matcher in enumerate(matchers):
+            if getattr(matcher, "mode", "substring") == "regex":
+                self._always.append(index)
+            else:
+                for term in matcher.terms:
+                    searches = self._by_key.setdefault(term.lower(), [])
+                    if index not in searches:
+                        searches.append(index)
+        keys = list(self._by_key)
+        self._prefilter = MultiTermMatcher(keys, case_sensitive=True) if keys else None
+        self._key_searches = [self._by_key[key] for key in keys]
+
+    def candidates(self, text: str) -> List[int]:
+        """Indexes of the searches that may match text, in order"""
+        if self._prefilter is None:
+            return self._always
+        found = set(self._always)
+        seen = set()
+        # Only which keys occur matters here, not how often
+        for _, indexes in self._prefilter._iter_hits(text.lower()):
+            for index in indexes:
+                if index not in seen:
+                    seen.add(index)
+                    found.update(self._key_searches[index])
+        return sorted(found)
+
+
+@lru_cache(maxsize=8)
+def get_matcher_set(searches: Tuple[Tuple[Tuple[str, ...], bool, str], ...]) -> MatcherSet:
+    """MatcherSet for (terms, case_sensitive, mode) searches, built once per process"""
+    return MatcherSet([get_matcher(terms, case_sensitive, mode) for terms, case_sensitive, mode in searches])
@@ -0,0 +1,246 @@
+"""
+Metrics Module for Anvesh
+Counters, gauges and latency histograms, exported in the Prometheus text
+format by /api/metrics. Search worker processes record into their own
+registry and the search pool sends what they recorded back with each
+file's result (see run_collecting)
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+# Latency histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Every counter and histogram: name -> (type, help)
+METRICS = {
+    "anvesh_searches_total": ("counter", "Searches finished, by how they were answered (scan, index or cache)"),
+    "anvesh_search_seconds": ("histogram", "Time from a search request to its last result, by source"),
+    "anvesh_walk_seconds": ("histogram", "Time to walk the folders of a search"),
+    "anvesh_walk_files_total": ("counter", "Files found by folder walks"),
+    "anvesh_skipped_files_total": ("counter", "Files skipped unread, by stage (walk: too large or unreadable, search: unsupported, timed out or crashed)"),
+    "anvesh_extract_seconds": ("histogram", "Time spent extracting a file's text (or reading it from the extraction cache), by extractor"),
+    "anvesh_extract_errors_total": ("counter", "Files an extractor failed to read, by extractor"),
+    "anvesh_bytes_read_total": ("counter", "Size of the files whose contents were searched, by extractor"),
+    "anvesh_match_seconds": ("histogram", "Time spent matching a file's text, by matcher"),
+    "anvesh_cache_requests_total": ("counter", "Cache lookups, by cache and result (hit or miss)"),
+    "anvesh_stream_encode_seconds": ("histogram", "Time a streamed search spent encoding and compressing its events"),
+    "anvesh_stream_bytes_total": ("counter", "Bytes of search streams sent, by format"),
+    "anvesh_http_requests_total": ("counter", "HTTP requests, by route, method and status"),
+    "anvesh_http_request_seconds": ("histogram", "HTTP request time (to the end of streamed responses), by route"),
+    "anvesh_history_entries_total": ("counter", "Search history entries written"),
+    "anvesh_history_write_seconds": ("histogram", "Time to write a batch of search history entries"),
+    "anvesh_worker_restarts_total": ("counter", "Search worker pools replaced, by reason (crash or timeout)"),
+    "anvesh_hash_seconds": ("histogram", "Time to hash a file's contents (to find identical files)"),
+    "anvesh_hash_bytes_total": ("counter", "Bytes read to hash file contents"),
+    "anvesh_dedup_files_total": ("counter", "Files not searched, extracted, indexed or analyzed because an identical file already was, by component"),
+    "anvesh_dedup_bytes_total": ("counter", "Size of the files counted by anvesh_dedup_files_total, by component"),
+    "anvesh_errors_total": ("counter", "Errors, by component"),
+}
+
+LabelSet = Tuple[Tuple[str, str], ...]
+GaugeValue = Union[float, Dict[LabelSet, float]]
+
+
+def labels(**values) -> LabelSet:
+    return tuple(sorted((key, str(value)) for key, value in values.items()))
+
+
+def _format_labels(label_set: LabelSet, extra: str = "") -> str:
+    parts = [
+        key + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in label_set
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    """Counters and histograms by (name, labels), plus gauges read from callbacks when rendered"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelSet], float] = {}
+        self._histograms: Dict[Tuple[str, LabelSet], List[float]] = {}  # Count per bucket (and +Inf), then sum
+        self._gauges: Dict[str, Tuple[str, Callable[[], GaugeValue]]] = {}
+
+    def inc(self, name: str, value: float = 1, **label_values):
+        if METRICS[name][0] != "counter":
+            raise ValueError(f"{name} isn't a counter")
+        key = (name, labels(**label_values))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **label_values):
+        if METRICS[name][0] != "histogram":
+            raise ValueError(f"{name} isn't a histogram")
+        key = (name, labels(**label_values))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(BUCKETS) + 2)
+            histogram[bisect_left(BUCKETS, seconds)] += 1
+            histogram[-1] += seconds
+
+    def gauge(self, name: str, help_text: str, callback: Callable[[], GaugeValue]):
+        """A gauge whose value (or {labels: value}) callback() gives at render time"""
+        self._gauges[name] = (help_text, callback)
+
+    def totals(self, name: str) -> Dict[LabelSet, Union[float, Tuple[float, float]]]:
+        """Current values of a counter ({labels: value}) or histogram ({labels: (count, sum)})"""
+        with self._lock:
+            if METRICS[name][0] == "counter":
+                return {label_set: value for (key, label_set), value in self._counters.items() if key == name}
+            return {label_set: (sum(values[:-1]), values[-1])
+                    for (key, label_set), values in self._histograms.items() if key == name}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def take(self) -> Dict:
+        """Counters and histograms recorded since the last take(), which are then cleared"""
+        with self._lock:
+            taken = {"counters": self._counters, "histograms": self._histograms}
+            self._counters, self._histograms = {}, {}
+        return taken
+
+    def merge(self, recorded: Dict):
+        """Add what another registry took (e.g. a worker process's)"""
+        with self._lock:
+            for key, value in recorded["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in recorded["histograms"].items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = list(values)
+                else:
+                    for index, value in enumerate(values):
+                        histogram[index] += value
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+        by_name: Dict[str, List] = {}
+        for (name, label_set), value in counters.items():
+            by_name.setdefault(name, []).append((label_set, value))
+        for (name, label_set), values in histograms.items():
+            by_name.setdefault(name, []).append((label_set, values))
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            series = sorted(by_name.get(name, []), key=lambda item: item[0])
+            if not series and kind == "histogram":
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for label_set, value in series:
+                    lines.append(f"{name}{_format_labels(label_set)} {_format_value(value)}")
+                continue
+            for label_set, values in series:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), values):
+                    cumulative += count
+                    bucket_labels = _format_labels(label_set, 'le="' + str(bound) + '"')
+                    lines.append(f"{name}_bucket{bucket_labels} {_format_value(cumulative)}")
+                lines.append(f"{name}_sum{_format_labels(label_set)} {_format_value(values[-1])}")
+                lines.append(f"{name}_count{_format_labels(label_set)} {_format_value(cumulative)}")
+
+        for name, (help_text, callback) in self._gauges.items():
+            try:
+                value = callback()
+            except Exception as e:
+                print(f"Error reading metric {name}: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for label_set, gauge_value in (value.items() if isinstance(value, dict) else [((), value)]):
+                lines.append(f"{name}{_format_labels(label_set)} {_format_value(gauge_value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+gauge = REGISTRY.gauge
+totals = REGISTRY.totals
+reset = REGISTRY.reset
+merge = REGISTRY.merge
+render = REGISTRY.render
+
+
+@contextmanager
+def timed(name: str, **label_values) -> Iterator[None]:
+    """Observe how long the block took"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **label_values)
+
+
+class TimedIterator:
+    """Wraps an iterable and adds up the time spent producing its items (e.g. extracting chunks)"""
+
+    def __init__(self, iterable: Iterable, seconds: float = 0.0):
+        self._iterator = iter(iterable)
+        self.seconds = seconds
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+def run_collecting(function: Callable, *args):
+    """Run function(*args) in a worker process; returns (its result, the metrics it recorded).
+
+    Pools running this should have reset() as their initializer, so forked
+    workers don't send back the parent's metrics.
+    """
+    result = function(*args)
+    return result, REGISTRY.take()
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting and timing HTTP requests by route (time runs to the end of the response body)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Route templates (/api/search/{search_id}) rather than paths, so there are few series
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            inc("anvesh_http_requests_total", route=route, method=scope["method"], status=status)
+            observe("anvesh_http_request_seconds", time.perf_counter() - start, route=route)
@@ -0,0 +1,291 @@
+"""
+OOXML Text Module for Anvesh
+Streams text out of Word, Excel and PowerPoint files by reading their zip
+parts with incremental XML parsing, without building document object trees
+"""
+import posixpath
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+from lazy_import import LazyModule
+
+# Excel dates are stored as numbers; openpyxl's helpers tell which number formats are dates.
+# openpyxl is slow to import, so that waits for the first workbook.
+excel_numbers = LazyModule("openpyxl.styles.numbers")
+excel_datetime = LazyModule("openpyxl.utils.datetime")
+EXCEL_DATES_AVAILABLE = excel_numbers.available
+
+Chunk = Tuple[str, Optional[int], str]
+
+REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+
+# Text equivalents of run content, as python-docx gives them
+RUN_TEXT = {W + "tab": "\t", W + "ptab": "\t", W + "cr": "\n", W + "noBreakHyphen": "-"}
+
+
+# ---------- Package structure ----------
+
+def _part_rels(archive: zipfile.ZipFile, part: str) -> Dict[str, Tuple[str, str]]:
+    """Relationships of a part: id -> (type, target part name)"""
+    folder, name = posixpath.split(part)
+    rels_name = posixpath.join(folder, "_rels", name + ".rels")
+    rels = {}
+    try:
+        with archive.open(rels_name) as f:
+            for _, elem in iterparse(f):
+                if elem.tag == REL + "Relationship" and elem.get("TargetMode") != "External":
+                    target = elem.get("Target", "")
+                    target = target[1:] if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+                    rels[elem.get("Id")] = (elem.get("Type", ""), target)
+    except KeyError:
+        pass
+    return rels
+
+
+def _main_part(archive: zipfile.ZipFile, default: str) -> str:
+    """The package's main document part (e.g. word/document.xml)"""
+    for rel_type, target in _part_rels(archive, "").values():
+        if rel_type == OFFICE_DOCUMENT:
+            return target
+    return default
+
+
+# ---------- Word ----------
+
+def _run_text(run) -> str:
+    parts = []
+    for elem in run:
+        if elem.tag == W + "t":
+            parts.append(elem.text or "")
+        elif elem.tag == W + "br":
+            if elem.get(W + "type", "textWrapping") == "textWrapping":
+                parts.append("\n")  # Page and column breaks have no text
+        else:
+            parts.append(RUN_TEXT.get(elem.tag, ""))
+    return "".join(parts)
+
+
+def _paragraph_text(paragraph) -> str:
+    parts = []
+    for elem in paragraph:
+        if elem.tag == W + "r":
+            parts.append(_run_text(elem))
+        elif elem.tag == W + "hyperlink":
+            parts.extend(_run_text(run) for run in elem.findall(W + "r"))
+    return "".join(parts)
+
+
+def iter_docx(file_path: str) -> Iterator[Chunk]:
+    """Yield (file_path, paragraph number, text) for each paragraph of the document body"""
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open(_main_part(archive, "word/document.xml")) as f:
+            depth = 0
+            body = None
+            line_num = 0
+            for event, elem in iterparse(f, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 2 and elem.tag == W + "body":
+                        body = elem
+                    continue
+                depth -= 1
+                if elem is body:
+                    body = None
+                elif depth == 2 and body is not None:
+                    # A finished top-level block: paragraphs count, tables don't (as in python-docx)
+                    if elem.tag == W + "p":
+                        line_num += 1
+                        yield file_path, line_num, _paragraph_text(elem)
+                    body.remove(elem)
+
+
+# ---------- Excel ----------
+
+def _string_item_text(item) -> str:
+    """Text of a shared or inline string: its plain text or rich text runs (phonetic runs left out)"""
+    parts = []
+    for elem in item:
+        if elem.tag == S + "t":
+            parts.append(elem.text or "")
+        elif elem.tag == S + "r":
+            parts.extend(t.text or "" for t in elem.findall(S + "t"))
+    return "".join(parts)
+
+
+def _shared_strings(archive: zipfile.ZipFile, part: Optional[str]) -> List[str]:
+    strings = []
+    if part is None:
+        return strings
+    with archive.open(part) as f:
+        table = None
+        for event, elem in iterparse(f, events=("start", "end")):
+            if event == "start":
+                if table is None:
+                    table = elem
+            elif elem.tag == S + "si":
+                strings.append(_string_item_text(elem).replace("x005F_", ""))
+                table.remove(elem)
+    return strings
+
+
+def _date_styles(archive: zipfile.ZipFile, part: Optional[str]) -> Tuple[set, set]:
+    """Indexes of cell styles that show numbers as dates, and as durations"""
+    dates, durations = set(), set()
+    if part is None or not EXCEL_DATES_AVAILABLE:
+        return dates, durations
+    try:
+        numbers = excel_numbers.load()
+    except ImportError:
+        return dates, durations  # Dates stay plain numbers
+    with archive.open(part) as f:
+        custom = {}
+        in_cell_xfs = False
+        index = 0
+        for event, elem in iterparse(f, events=("start", "end")):
+            if event == "start":
+                if elem.tag == S + "cellXfs":
+                    in_cell_xfs = True
+                continue
+            if elem.tag == S + "numFmt":
+                custom[int(elem.get("numFmtId", -1))] = elem.get("formatCode", "")
+            elif elem.tag == S + "cellXfs":
+                in_cell_xfs = False
+            elif elem.tag == S + "xf" and in_cell_xfs:
+                num_fmt_id = int(elem.get("numFmtId", 0))
+                code = custom.get(num_fmt_id, numbers.BUILTIN_FORMATS.get(num_fmt_id, "General"))
+                if numbers.is_date_format(code):
+                    dates.add(index)
+                    if numbers.is_timedelta_format(code):
+                        durations.add(index)
+                index += 1
+    return dates, durations
+
+
+def _number(text: str):
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+class _Workbook:
+    """What reading cell values needs from the workbook part"""
+
+    def __init__(self, archive: zipfile.ZipFile):
+        part = _main_part(archive, "xl/workbook.xml")
+        rels = _part_rels(archive, part)
+        self.sheets: List[Tuple[str, str]] = []  # (name, worksheet part)
+        self.date1904 = False
+        with archive.open(part) as f:
+            for _, elem in iterparse(f):
+                if elem.tag == S + "workbookPr":
+                    self.date1904 = elem.get("date1904", "false").lower() in ("1", "true")
+                elif elem.tag == S + "sheet":
+                    rel_type, target = rels.get(elem.get(R_ID), ("", ""))
+                    if rel_type.endswith("/worksheet"):  # Chart sheets have no cells
+                        self.sheets.append((elem.get("name", ""), target))
+        by_type = {rel_type.rsplit("/", 1)[-1]: target for rel_type, target in rels.values()}
+        self.shared_strings = _shared_strings(archive, by_type.get("sharedStrings"))
+        self.date_styles, self.duration_styles = _date_styles(archive, by_type.get("styles"))
+
+    def cell_value(self, cell):
+        """A cell's value as openpyxl reads it with data_only=True (cached formula results)"""
+        data_type = cell.get("t", "n")
+        if data_type == "inlineStr":
+            inline = cell.find(S + "is")
+            return None if inline is None else _string_item_text(inline)
+        text = cell.findtext(S + "v") or None
+        if text is None:
+            return None
+        if data_type == "n":
+            value = _number(text)
+            style = int(cell.get("s", 0))
+            if style in self.date_styles:
+                try:
+                    return excel_datetime.from_excel(
+                        value, excel_datetime.MAC_EPOCH if self.date1904 else excel_datetime.WINDOWS_EPOCH,
+                        timedelta=style in self.duration_styles)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if data_type == "s":
+            return self.shared_strings[int(text)]
+        if data_type == "b":
+            return bool(int(text))
+        if data_type == "d" and EXCEL_DATES_AVAILABLE:
+            return excel_datetime.from_ISO8601(text)
+        return text  # "str" (formula text) and "e" (error) are plain text
+
+
+def iter_xlsx(file_path: str) -> Iterator[Chunk]:
+    """Yield (file_path (Sheet: name), cell number, value) for each non-empty cell, sheet by sheet"""
+    with zipfile.ZipFile(file_path) as archive:
+        workbook = _Workbook(archive)
+        line_num = 0
+        for sheet_name, part in workbook.sheets:
+            location = f"{file_path} (Sheet: {sheet_name})"
+            with archive.open(part) as f:
+                sheet_data = None
+                for event, elem in iterparse(f, events=("start", "end")):
+                    if event == "start":
+                        if elem.tag == S + "sheetData":
+                            sheet_data = elem
+                        continue
+                    if elem.tag != S + "row":
+                        continue
+                    for cell in elem.iter(S + "c"):
+                        value = workbook.cell_value(cell)
+                        if value:
+                            line_num += 1
+                            yield location, line_num, str(value)
+                    if sheet_data is not None:
+                        sheet_data.remove(elem)  # Rows are done with once read, so memory stays flat
+
+
+# ---------- PowerPoint ----------
+
+def _shape_text(shape) -> str:
+    """Text of a shape: paragraphs joined by newlines, line breaks as vertical tabs (as in python-pptx)"""
+    body = shape.find(P + "txBody")
+    if body is None:
+        return ""
+    paragraphs = []
+    for paragraph in body.findall(A + "p"):
+        parts = []
+        for elem in paragraph:
+            if elem.tag in (A + "r", A + "fld"):
+                parts.append(elem.findtext(A + "t") or "")
+            elif elem.tag == A + "br":
+                parts.append("\v")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs)
+
+
+def iter_pptx(file_path: str) -> Iterator[Chunk]:
+    """Yield (file_path (Slide: n), slide number, text) for each top-level text shape, slide by slide"""
+    with zipfile.ZipFile(file_path) as archive:
+        part = _main_part(archive, "ppt/presentation.xml")
+        rels = _part_rels(archive, part)
+        slides = []
+        with archive.open(part) as f:
+            for _, elem in iterparse(f):
+                if elem.tag == P + "sldId" and elem.get(R_ID) in rels:
+                    slides.append(rels[elem.get(R_ID)][1])
+        for slide_num, slide_part in enumerate(slides, 1):
+            location = f"{file_path} (Slide: {slide_num})"
+            with archive.open(slide_part) as f:
+                depth = 0
+                for event, elem in iterparse(f, events=("start", "end")):
+                    if event == "start":
+                        depth += 1
+                        continue
+                    depth -= 1
+                    # sld / cSld / spTree / shape: group shapes, pictures and tables have no text of their own
+                    if depth == 3 and elem.tag == P + "sp":
+                        yield location, slide_num, _shape_text(elem)
@@ -0,0 +1,343 @@
+"""
+PDF Text Module for Anvesh
+PDF text extraction with selectable backends, pages of large files extracted
+in parallel, and page text cached so a search that stops early can resume
+(or an identical PDF elsewhere can reuse it)
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from content_hash import rebase_chunks, record_saved
+from extraction_cache import ExtractionCache, part_key
+from lazy_import import LazyModule
+
+# Backends, fastest first; the first one installed is used unless ANVESH_PDF_BACKEND picks another.
+# Each library is imported when it opens its first PDF, not at startup.
+pymupdf = LazyModule("pymupdf", "fitz")  # fitz: older PyMuPDF releases
+pypdfium2 = LazyModule("pypdfium2")
+pypdf = LazyModule("pypdf")
+PyPDF2 = LazyModule("PyPDF2")
+
+# Files with at least this many uncached pages are split across processes
+PARALLEL_MIN_PAGES = int(os.environ.get("ANVESH_PDF_PARALLEL_PAGES", "32"))
+
+# Pages extracted (and cached) per step, so a search that has seen enough hits stops soon
+PAGES_PER_STEP = 16
+
+
+class PdfBackend:
+    """Opens a PDF and extracts the text of one page at a time"""
+    name = ""
+    module: LazyModule = None
+
+    @property
+    def available(self) -> bool:
+        return self.module is not None and self.module.available
+
+    def load(self):
+        """Import the library now (e.g. to warm up)"""
+        self.module.load()
+
+    def open(self, file_path: str):
+        raise NotImplementedError
+
+    def page_count(self, doc) -> int:
+        raise NotImplementedError
+
+    def page_text(self, doc, index: int) -> str:
+        raise NotImplementedError
+
+    def close(self, doc):
+        pass
+
+
+class PyMuPdfBackend(PdfBackend):
+    """MuPDF (C library): the fastest, and the best reading order"""
+    name = "pymupdf"
+    module = pymupdf
+
+    def open(self, file_path: str):
+        return pymupdf.open(file_path)
+
+    def page_count(self, doc) -> int:
+        return doc.page_count
+
+    def page_text(self, doc, index: int) -> str:
+        return doc[index].get_text()
+
+    def close(self, doc):
+        doc.close()
+
+
+class PdfiumBackend(PdfBackend):
+    """PDFium (the C++ engine used by Chrome)"""
+    name = "pypdfium2"
+    module = pypdfium2
+
+    def open(self, file_path: str):
+        return pypdfium2.PdfDocument(file_path)
+
+    def page_count(self, doc) -> int:
+        return len(doc)
+
+    def page_text(self, doc, index: int) -> str:
+        page = doc[index]
+        try:
+            textpage = page.get_textpage()
+            try:
+                return textpage.get_text_range()
+            finally:
+                textpage.close()
+        finally:
+            page.close()
+
+    def close(self, doc):
+        doc.close()
+
+
+class PyPdfBackend(PdfBackend):
+    """pypdf (pure Python, the maintained successor of PyPDF2)"""
+    name = "pypdf"
+    module = pypdf
+
+    def open(self, file_path: str):
+        return pypdf.PdfReader(file_path)
+
+    def page_count(self, doc) -> int:
+        return len(doc.pages)
+
+    def page_text(self, doc, index: int) -> str:
+        return doc.pages[index].extract_text() or ""
+
+
+class PyPdf2Backend(PyPdfBackend):
+    """PyPDF2 (pure Python, always installed)"""
+    name = "pypdf2"
+    module = PyPDF2
+
+    def open(self, file_path: str):
+        return PyPDF2.PdfReader(file_path)
+
+
+BACKENDS: Dict[str, PdfBackend] = {
+    backend.name: backend for backend in (PyMuPdfBackend(), PdfiumBackend(), PyPdfBackend(), PyPdf2Backend())
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name, backend in BACKENDS.items() if backend.available]
+
+
+def get_backend(name: Optional[str] = None) -> Optional[PdfBackend]:
+    """The named backend, ANVESH_PDF_BACKEND's, or else the fastest installed one"""
+    name = name or os.environ.get("ANVESH_PDF_BACKEND")
+    if name:
+        backend = BACKENDS.get(name.lower())
+        if backend and backend.available:
+            return backend
+        print(f"Warning: PDF backend {name} is not available, using the fastest installed one")
+    for backend in BACKENDS.values():
+        if backend.available:
+            return backend
+    return None
+
+
+def page_chunks(file_path: str, page_number: int, text: str) -> List[Tuple[str, Optional[int], str]]:
+    """Chunks of one page: (location, line number on the page, line)"""
+    location = f"{file_path} (Page: {page_number})"
+    return [(location, line_idx, line) for line_idx, line in enumerate(text.split('\n'), 1)]
+
+
+# The document a page worker process has open: (backend name, path, mtime_ns), doc.
+# Parsing a large PDF's structure costs far more than a page, so it's kept for the next step.
+_worker_doc = (None, None)
+
+
+def _worker_open(backend_name: str, file_path: str, mtime_ns: int):
+    """The document, opened in this page worker process unless it already is"""
+    global _worker_doc
+    key = (backend_name, file_path, mtime_ns)
+    if _worker_doc[0] != key:
+        if _worker_doc[1] is not None:
+            BACKENDS[_worker_doc[0][0]].close(_worker_doc[1])
+        _worker_doc = (None, None)
+        _worker_doc = (key, BACKENDS[backend_name].open(file_path))
+    return _worker_doc[1]
+
+
+def _page_count(backend_name: str, file_path: str, mtime_ns: int) -> int:
+    """Number of pages (runs in a page worker process, which keeps the document open for its pages)"""
+    return BACKENDS[backend_name].page_count(_worker_open(backend_name, file_path, mtime_ns))
+
+
+def _extract_pages(backend_name: str, file_path: str, mtime_ns: int, indexes: List[int]) -> Dict[int, str]:
+    """Text of some pages (runs in a page worker process)"""
+    return _page_texts(BACKENDS[backend_name], _worker_open(backend_name, file_path, mtime_ns), file_path, indexes)
+
+
+def _page_texts(backend: PdfBackend, doc, file_path: str, indexes: List[int]) -> Dict[int, str]:
+    texts = {}
+    for index in indexes:
+        try:
+            texts[index] = backend.page_text(doc, index)
+        except Exception as e:
+            print(f"Error reading page {index + 1} of PDF {file_path}: {e}")
+            texts[index] = ""
+    return texts
+
+
+class PdfExtractor:
+    """Yields a PDF's text page by page, from the cache where possible.
+
+    Missing pages are extracted PAGES_PER_STEP at a time (each step split
+    across page worker processes when enough pages are missing), and cached
+    as they come, so a caller that stops reading early never pays for the
+    rest of the file and a later search picks up where it left off. The
+    page count is cached too, so a PDF whose pages are all cached is never
+    opened. With dedup, pages missing from the cache are first looked for
+    under a cached PDF with the same contents.
+
+    In the server process (with more than one page worker) PDFs are only
+    ever read by the page workers, so kill() can stop a PDF that takes too
+    long; search worker processes read them themselves.
+    """
+
+    def __init__(self,
+                 backend: Optional[PdfBackend] = None,
+                 cache: Optional[ExtractionCache] = None,
+                 version: str = "1",
+                 workers: Optional[int] = None,
+                 parallel_min_pages: int = PARALLEL_MIN_PAGES,
+                 dedup: bool = False):
+        self.backend = backend or get_backend()
+        self.cache = cache
+        self.version = version
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.parallel_min_pages = parallel_min_pages
+        self.dedup = dedup
+        self._pool = None
+
+    def can_parallelize(self) -> bool:
+        """Whether pages are read by page workers: not in search worker processes, which already run one file each in parallel"""
+        return self.workers > 1 and multiprocessing.parent_process() is None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _extract(self, file_path: str, mtime_ns: int, doc, indexes: List[int], parallel: bool) -> Dict[int, str]:
+        """Text of some pages: from doc if open here, else by the page workers (one share per worker when parallel)"""
+        if doc is not None:
+            return _page_texts(self.backend, doc, file_path, indexes)
+        workers = self.workers if parallel else 1
+        shares = [indexes[i::workers] for i in range(workers) if indexes[i::workers]]
+        count = len(shares)
+        texts = {}
+        for share in self._get_pool().map(_extract_pages, [self.backend.name] * count, [file_path] * count, [mtime_ns] * count, shares):
+            texts.update(share)
+        return texts
+
+    def _version(self, backend_name: str) -> str:
+        return f"pdf-{backend_name}:{self.version}"
+
+    def _cached_count(self, file_path: str, stat: os.stat_result) -> Tuple[Optional[str], Optional[int]]:
+        """(cache version, page count) of the file's cached pages, or (None, None).
+
+        Without a backend, pages cached by any backend are used.
+        """
+        if self.cache is None:
+            return None, None
+        names = [self.backend.name] if self.backend is not None else list(BACKENDS)
+        for name in names:
+            version = self._version(name)
+            entry = self.cache.get(part_key(file_path, "pages"), stat.st_size, stat.st_mtime_ns, version)
+            if entry:
+                return version, entry[0][1]
+        return None, None
+
+    def _copied_pages(self, file_path: str, stat: os.stat_result, version: str, keys: List[str], cached: Dict) -> Dict[str, List]:
+        """Pages missing from cached, taken from a cached PDF with the same contents (and cached for file_path)"""
+        copy = self.cache.find_copy(file_path, stat.st_size, stat.st_mtime_ns)
+        if copy is None:
+            return {}
+        source, source_mtime_ns = copy
+        source_keys = {part_key(source, f"page {number}"): key
+                       for number, key in enumerate(keys, 1) if key not in cached}
+        found = self.cache.get_many(list(source_keys), stat.st_size, source_mtime_ns, version)
+        copied = {source_keys[key]: rebase_chunks(chunks, source, file_path) for key, chunks in found.items()}
+        if copied:
+            self.cache.put_many(copied, stat.st_size, stat.st_mtime_ns, version, file_path)
+            record_saved("extraction", stat.st_size)
+        return copied
+
+    def pages(self, file_path: str) -> Iterator[Tuple[int, List[Tuple[str, Optional[int], str]]]]:
+        """Yield (page number, chunks) in page order; the PDF is only opened for pages not cached"""
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            print(f"Error reading PDF {file_path}: {e}")
+            return
+        version, count = self._cached_count(file_path, stat)
+        local = not self.can_parallelize()  # Read here rather than by the page workers
+        doc = None
+        try:
+            if count is None:
+                if self.backend is None:
+                    return
+                if local:
+                    doc = self.backend.open(file_path)
+                    count = self.backend.page_count(doc)
+                else:
+                    count = self._get_pool().submit(_page_count, self.backend.name, file_path, stat.st_mtime_ns).result()
+                version = self._version(self.backend.name)
+                if self.cache is not None:
+                    self.cache.put(part_key(file_path, "pages"), stat.st_size, stat.st_mtime_ns, version, [(file_path, count, "")])
+            keys = [part_key(file_path, f"page {number}") for number in range(1, count + 1)]
+            cached = {}
+            if self.cache is not None:
+                cached = self.cache.get_many(keys, stat.st_size, stat.st_mtime_ns, version)
+                if self.dedup and len(cached) < count:
+                    cached.update(self._copied_pages(file_path, stat, version, keys, cached))
+            missing = sum(1 for key in keys if key not in cached)
+            parallel = not local and missing >= self.parallel_min_pages
+            step = PAGES_PER_STEP * (self.workers if parallel else 1)
+
+            index = 0
+            while index < count:
+                if keys[index] in cached:
+                    yield index + 1, cached[keys[index]]
+                    index += 1
+                    continue
+                if self.backend is None:
+                    # Nothing installed can read the pages that aren't cached
+                    index += 1
+                    continue
+                if local and doc is None:
+                    doc = self.backend.open(file_path)
+                todo = [i for i in range(index, min(index + step, count)) if keys[i] not in cached]
+                texts = self._extract(file_path, stat.st_mtime_ns, doc, todo, parallel)
+                extracted = {keys[i]: page_chunks(file_path, i + 1, texts[i]) for i in todo}
+                if self.cache is not None:
+                    self.cache.put_many(extracted, stat.st_size, stat.st_mtime_ns, version, file_path)
+                cached.update(extracted)
+        except Exception as e:
+            print(f"Error reading PDF {file_path}: {e}")
+        finally:
+            if doc is not None:
+                self.backend.close(doc)
+
+    def kill(self):
+        """Kill the page workers (a PDF is taking too long); reads in flight fail, and the next one starts fresh workers"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
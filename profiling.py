@@ -0,0 +1,223 @@
+"""
+Profiling Module for Anvesh
+Opt-in per-file timings for one search ("profile": true): how long each
+file spent in each phase (stat, open, extract, match, serialize) and how
+many bytes it had, summarized as the slowest files and a per-format
+breakdown and exported as a Chrome trace (chrome://tracing or Perfetto)
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+PHASES = ("stat", "open", "extract", "match", "serialize")
+
+# Slowest files listed in a search's profile summary
+TOP_FILES = 10
+
+_local = threading.local()
+
+
+class FileProfile:
+    """Where one file's search time went.
+
+    phases are (name, start as epoch seconds, seconds); epoch times line up
+    across the worker processes. Extraction and matching interleave as
+    chunks stream in, so each is recorded as one span of its total time.
+    """
+
+    def __init__(self, file_path: str, start: Optional[float] = None):
+        self.file_path = file_path
+        self.format: Optional[str] = None  # Extractor name, once the file's format is known
+        self.bytes = 0
+        self.start = time.time() if start is None else start
+        self.seconds = 0.0
+        self.phases: List[Tuple[str, float, float]] = []
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.outcome: Optional[str] = None  # Set for files that weren't searched (skipped, timed out...)
+
+    def phase_seconds(self) -> Dict[str, float]:
+        totals = {}
+        for name, _, seconds in self.phases:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+
+# ---------- Recording (in whichever process searches the file) ----------
+
+def current() -> Optional[FileProfile]:
+    """The profile of the file this thread is searching, if its search is profiled"""
+    return getattr(_local, "profile", None)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time the block as a phase of the current file (does nothing unless profiling)"""
+    profile = current()
+    if profile is None:
+        yield
+        return
+    start_time = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.phases.append((name, start_time, time.perf_counter() - start))
+
+
+def add_phase(name: str, start_time: float, seconds: float):
+    """Record a phase timed elsewhere (start as epoch seconds)"""
+    profile = current()
+    if profile is not None:
+        profile.phases.append((name, start_time, seconds))
+
+
+def note(file_format: Optional[str] = None, size: Optional[int] = None, outcome: Optional[str] = None):
+    """Record the current file's format, size in bytes or outcome"""
+    profile = current()
+    if profile is None:
+        return
+    if file_format is not None:
+        profile.format = file_format
+    if size is not None:
+        profile.bytes = size
+    if outcome is not None:
+        profile.outcome = outcome
+
+
+def run_profiled(function: Callable, file_path: str, *args):
+    """Call function(file_path, *args) with its phases recorded; returns (its result, the FileProfile)"""
+    profile = FileProfile(file_path)
+    _local.profile = profile
+    start = time.perf_counter()
+    try:
+        result = function(file_path, *args)
+    finally:
+        _local.profile = None
+        profile.seconds = time.perf_counter() - start
+    return result, profile
+
+
+# ---------- Collecting (in the server) ----------
+
+class SearchProfile:
+    """The file profiles of one search, its summary and its Chrome trace"""
+
+    def __init__(self, search_id: str, query: str):
+        self.search_id = search_id
+        self.query = query
+        self.source = "scan"  # Or "index"
+        self.start = time.time()
+        self.seconds: Optional[float] = None
+        self.files: Dict[str, FileProfile] = {}
+        self.spans: List[Tuple[str, float, float]] = []  # Search-wide (name, start, seconds), e.g. an index query
+        self._lock = threading.Lock()
+
+    def add(self, profile: FileProfile):
+        with self._lock:
+            self.files[profile.file_path] = profile
+
+    def add_unfinished(self, file_path: str, seconds: float, outcome: str):
+        """A file given up on after seconds (it timed out or crashed its worker); its phases are unknown"""
+        profile = FileProfile(file_path, start=time.time() - seconds)
+        profile.seconds = seconds
+        profile.outcome = outcome
+        self.add(profile)
+
+    def add_span(self, name: str, start_time: float, seconds: float):
+        with self._lock:
+            self.spans.append((name, start_time, seconds))
+
+    def serialized(self, timings: Dict[str, float]):
+        """Record how long each matching file's result took to encode (file path -> seconds)"""
+        now = time.time()
+        with self._lock:
+            for file_path, seconds in timings.items():
+                profile = self.files.get(file_path)
+                if profile is not None:
+                    profile.phases.append(("serialize", now - seconds, seconds))
+
+    def finish(self):
+        self.seconds = time.time() - self.start
+
+    def summary(self, top: int = TOP_FILES) -> Dict:
+        """Totals per phase, the slowest files and a breakdown per format"""
+        with self._lock:
+            files = list(self.files.values())
+        phases = dict.fromkeys(PHASES, 0.0)
+        formats: Dict[str, Dict] = {}
+        for profile in files:
+            file_phases = profile.phase_seconds()
+            file_format = profile.format or ("skipped" if profile.outcome else "unknown")
+            stats = formats.setdefault(file_format, {"files": 0, "bytes": 0, "seconds": 0.0, "phases": dict.fromkeys(PHASES, 0.0)})
+            stats["files"] += 1
+            stats["bytes"] += profile.bytes
+            stats["seconds"] += profile.seconds
+            for name, seconds in file_phases.items():
+                phases[name] = phases.get(name, 0.0) + seconds
+                stats["phases"][name] = stats["phases"].get(name, 0.0) + seconds
+        for stats in formats.values():
+            stats["mb_per_sec"] = round(stats["bytes"] / 1e6 / stats["seconds"], 2) if stats["seconds"] else None
+            stats["seconds"] = round(stats["seconds"], 4)
+            stats["phases"] = {name: round(seconds, 4) for name, seconds in stats["phases"].items()}
+
+        slowest = sorted(files, key=lambda profile: profile.seconds, reverse=True)[:top]
+        return {
+            "source": self.source,
+            "seconds": round(self.seconds if self.seconds is not None else time.time() - self.start, 4),
+            "files": len(files),
+            "bytes": sum(profile.bytes for profile in files),
+            "phases": {name: round(seconds, 4) for name, seconds in phases.items()},
+            "slowest_files": [
+                {
+                    "file_path": profile.file_path,
+                    "format": profile.format,
+                    "bytes": profile.bytes,
+                    "seconds": round(profile.seconds, 4),
+                    "phases": {name: round(seconds, 4) for name, seconds in profile.phase_seconds().items()},
+                    **({"outcome": profile.outcome} if profile.outcome else {})
+                }
+                for profile in slowest
+            ],
+            "formats": formats,
+            "trace_url": f"/api/search/{self.search_id}/trace"
+        }
+
+    def trace(self) -> Dict:
+        """The search as Chrome trace events: a track per search thread, a span per file with its phases inside"""
+        with self._lock:
+            files = list(self.files.values())
+            spans = list(self.spans)
+
+        def micros(start_time: float) -> float:
+            return round((start_time - self.start) * 1e6, 1)
+
+        server = os.getpid()
+        events = [
+            {"name": "process_name", "ph": "M", "pid": server, "tid": 0, "args": {"name": "Anvesh server"}},
+            {"name": "thread_name", "ph": "M", "pid": server, "tid": 1, "args": {"name": "serialize"}},
+            {"name": f"search {self.query}", "ph": "X", "pid": server, "tid": 0, "ts": 0,
+             "dur": round((self.seconds or time.time() - self.start) * 1e6, 1),
+             "args": {"search_id": self.search_id, "source": self.source}}
+        ]
+        for name, start_time, seconds in spans:
+            events.append({"name": name, "ph": "X", "pid": server, "tid": 0, "ts": micros(start_time), "dur": round(seconds * 1e6, 1)})
+        for pid in sorted({profile.pid for profile in files} - {server}):
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": f"search worker {pid}"}})
+
+        for profile in files:
+            args = {"file_path": profile.file_path, "format": profile.format, "bytes": profile.bytes}
+            if profile.outcome:
+                args["outcome"] = profile.outcome
+            events.append({"name": os.path.basename(profile.file_path), "cat": profile.format or "unknown", "ph": "X",
+                           "pid": profile.pid, "tid": profile.tid, "ts": micros(profile.start),
+                           "dur": round(profile.seconds * 1e6, 1), "args": args})
+            for name, start_time, seconds in profile.phases:
+                # Results are encoded on the server, after the file's worker has moved on
+                pid, tid = (server, 1) if name == "serialize" else (profile.pid, profile.tid)
+                events.append({"name": name, "cat": name, "ph": "X", "pid": pid, "tid": tid,
+                               "ts": micros(start_time), "dur": round(seconds * 1e6, 1)})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"search_id": self.search_id, "query": self.query, "started": self.start}}
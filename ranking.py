@@ -0,0 +1,105 @@
+"""
+Ranking Module for Anvesh
+BM25 relevance scores with filename and recency boosts, and top-K selection
+"""
+import heapq
+import itertools
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Standard BM25 parameters: term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+# A query term in the file name adds this many times the term's idf
+FILENAME_BOOST = 2.0
+
+# A file modified just now gets this much extra, halving every RECENCY_HALF_LIFE_DAYS
+RECENCY_BOOST = 1.0
+RECENCY_HALF_LIFE_DAYS = 180.0
+
+
+class Bm25Scorer:
+    """Scores files for a set of search terms.
+
+    document_counts gives, per term, how many of total_documents contain it
+    (None if unknown). Without an average_length (live scans don't know how
+    long documents are) scores aren't length-normalized.
+    """
+
+    def __init__(self,
+                 terms: Sequence[str],
+                 document_counts: Dict[str, Optional[int]],
+                 total_documents: int,
+                 average_length: Optional[float] = None,
+                 now: Optional[float] = None):
+        self.terms = list(terms)
+        self.average_length = average_length if average_length else None
+        self.now = now if now is not None else time.time()
+        total = max(total_documents, 1)
+        self.idf = {}
+        for term in self.terms:
+            count = document_counts.get(term)
+            count = total if count is None else min(count, total)
+            self.idf[term] = math.log(1 + (total - count + 0.5) / (count + 0.5))
+
+    def _saturation(self, tf: int, length: Optional[int]) -> float:
+        norm = 1.0
+        if self.average_length and length is not None:
+            norm = 1 - B + B * length / self.average_length
+        return tf * (K1 + 1) / (tf + K1 * norm)
+
+    def _boosts(self, name_counts: Dict[str, int], mtime: Optional[float]) -> float:
+        boost = sum(FILENAME_BOOST * self.idf[term] for term in name_counts if term in self.idf)
+        if mtime is not None:
+            age_days = max(self.now - mtime, 0) / 86400
+            boost += RECENCY_BOOST * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+        return boost
+
+    def score(self, term_counts: Dict[str, int], length: Optional[int], name_counts: Dict[str, int], mtime: Optional[float]) -> float:
+        """BM25 over content occurrences per term, plus filename and recency boosts"""
+        content = sum(
+            self.idf[term] * self._saturation(tf, length)
+            for term, tf in term_counts.items() if tf and term in self.idf
+        )
+        return content + self._boosts(name_counts, mtime)
+
+    def upper_bound(self,
+                    length: int,
+                    name_counts: Dict[str, int],
+                    mtime: Optional[float],
+                    terms: Optional[Iterable[str]] = None) -> float:
+        """Highest score a file of this length could get, before its text is read.
+
+        terms are those the file may contain (default: all). A term can't occur
+        more often than the text has characters, and the score only grows with
+        term frequency.
+        """
+        tf_max = max(length, 1)
+        terms = self.terms if terms is None else terms
+        content = sum(self.idf[term] * self._saturation(tf_max, length) for term in terms)
+        return content + self._boosts(name_counts, mtime)
+
+
+class TopK:
+    """The k best-scoring items seen so far"""
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap = []  # (score, sequence, item); the worst kept item is on top
+        self._sequence = itertools.count()
+
+    def offer(self, score: float, item):
+        entry = (score, -next(self._sequence), item)  # Earlier items win ties
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def is_settled(self, bound: float) -> bool:
+        """True once nothing scoring at most bound could still get in"""
+        return len(self._heap) >= self.k and self._heap[0][0] >= bound
+
+    def results(self) -> List:
+        return [item for _, _, item in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
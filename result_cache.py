@@ -0,0 +1,118 @@
+"""
+Result Cache Module for Anvesh
+In-memory LRU cache of finished searches, so a repeated search replays at
+once; entries are invalidated per folder by generation counters that file
+changes bump
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import metrics
+
+
+def folder_key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path)).rstrip(os.sep)
+
+
+def _contains(folder: str, path: str) -> bool:
+    return path == folder or path.startswith(folder + os.sep)
+
+
+class CachedSearch(NamedTuple):
+    """What a finished search sent, to send again"""
+    results: list  # FileResults, in the order they were sent
+    skipped: List[Tuple[str, str]]  # (path, reason)
+    complete: Dict  # Fields of the complete event
+    files_processed: int
+    generations: Tuple[int, ...]  # Of the search's folders when it started
+    stamp: object  # Checked by the caller's is_fresh (e.g. a fingerprint of the files searched)
+
+
+class ResultCache:
+    """LRU cache of search results keyed by the request.
+
+    Every folder searched has a generation counter; bump() increments the
+    counters of folders a changed path is in (or contains), which makes all
+    their cached searches stale. A search records its folders' generations
+    when it starts, so a change during the search also keeps it out.
+    """
+
+    def __init__(self, max_entries: int = 128, max_results: int = 10000):
+        self.max_entries = max_entries
+        self.max_results = max_results  # Searches with more matching files aren't cached
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, CachedSearch]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generations(self, folders: List[str]) -> Tuple[int, ...]:
+        """Current generation of each folder"""
+        with self._lock:
+            return tuple(self._generations.setdefault(folder_key(folder), 0) for folder in folders)
+
+    def bump(self, path: str):
+        """A file or folder changed: invalidate searches of every folder it's in or that's inside it"""
+        path = folder_key(path)
+        with self._lock:
+            for folder in self._generations:
+                if _contains(folder, path) or _contains(path, folder):
+                    self._generations[folder] += 1
+                    self.invalidations += 1
+
+    def get(self, key: str, folders: List[str], is_fresh: Optional[Callable[[CachedSearch], bool]] = None) -> Optional[CachedSearch]:
+        """The cached search, or None if missing or stale.
+
+        is_fresh can check what generations don't cover (it runs without the
+        lock, so it may take a while); a stale entry bumps its folders.
+        """
+        current = self.generations(folders)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.generations != current:
+                del self._entries[key]
+                entry = None
+        if entry is not None and is_fresh is not None and not is_fresh(entry):
+            for folder in folders:
+                self.bump(folder)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                metrics.inc("anvesh_cache_requests_total", cache="result", result="miss")
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.inc("anvesh_cache_requests_total", cache="result", result="hit")
+            return entry
+
+    def put(self, key: str, entry: CachedSearch, folders: List[str]):
+        """Store a finished search, unless its folders changed while it ran"""
+        if len(entry.results) > self.max_results or entry.generations != self.generations(folders):
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def purge(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "folders": len(self._generations)
+            }
@@ -0,0 +1,229 @@
+"""
+Search History Module for Anvesh
+Append-only search history in SQLite (WAL mode). Searches are queued and
+written by a background thread, so logging never blocks the server and
+concurrent searches can't clobber each other; entries past the retention
+limit are pruned every so often
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    query TEXT NOT NULL,
+    folders TEXT NOT NULL,
+    results_count INTEGER NOT NULL,
+    exact_match INTEGER NOT NULL,
+    case_sensitive INTEGER NOT NULL,
+    search_filenames INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history(timestamp);
+"""
+
+COLUMNS = ("timestamp", "query", "folders", "results_count", "exact_match", "case_sensitive", "search_filenames")
+
+# Prune old entries after this many writes (and when the store is opened)
+PRUNE_EVERY = 100
+
+
+def _like_pattern(text: str) -> str:
+    """LIKE pattern matching text anywhere (with % and _ taken literally)"""
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _row(entry: Dict) -> tuple:
+    return (
+        entry["timestamp"],
+        entry["query"],
+        json.dumps(entry.get("folders", []), ensure_ascii=False),
+        int(entry.get("results_count", 0)),
+        int(bool(entry.get("exact_match"))),
+        int(bool(entry.get("case_sensitive"))),
+        int(bool(entry.get("search_filenames")))
+    )
+
+
+def _entry(row: tuple) -> Dict:
+    entry_id, timestamp, query, folders, results_count, exact_match, case_sensitive, search_filenames = row
+    return {
+        "id": entry_id,
+        "timestamp": timestamp,
+        "query": query,
+        "folders": json.loads(folders),
+        "results_count": results_count,
+        "exact_match": bool(exact_match),
+        "case_sensitive": bool(case_sensitive),
+        "search_filenames": bool(search_filenames)
+    }
+
+
+class SearchHistory:
+    """Search log in a SQLite table, appended to by a background writer thread.
+
+    add() only queues the entry; query() waits briefly for queued entries so
+    a search shows up in the history as soon as it has finished. A
+    search_history.json from older versions is imported when the database
+    is first created.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 10000, legacy_json: Optional[str] = None):
+        self.db_path = db_path
+        self.max_entries = max_entries  # 0 keeps everything
+        self.legacy_json = legacy_json
+        self._cond = threading.Condition()
+        self._pending: List[tuple] = []
+        self._writing = False
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, creating the schema (and importing the legacy file) on first use"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._init_lock:
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'history'").fetchone()
+                conn.executescript(SCHEMA)
+                if not exists:
+                    self._import_legacy(conn)
+                self._prune(conn)
+                conn.commit()
+                self._initialized = True
+        return conn
+
+    def _import_legacy(self, conn: sqlite3.Connection):
+        if not self.legacy_json or not os.path.exists(self.legacy_json):
+            return
+        try:
+            with open(self.legacy_json, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            conn.executemany(
+                f"INSERT INTO history ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [_row(entry) for entry in entries]
+            )
+        except Exception as e:
+            print(f"Error importing search history from {self.legacy_json}: {e}")
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Drop all but the newest max_entries entries (ids only grow, so that's a range delete)"""
+        if self.max_entries > 0:
+            conn.execute("DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?", (self.max_entries,))
+
+    # ---------- Writing ----------
+
+    def add(self, entry: Dict):
+        """Queue an entry (timestamp, query, folders, results_count and the search options)"""
+        with self._cond:
+            self._pending.append(_row(entry))
+            if self._thread is None or not self._thread.is_alive():
+                self._stop = False
+                self._thread = threading.Thread(target=self._writer_loop, daemon=True, name="anvesh-history-writer")
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _writer_loop(self):
+        conn = None
+        written = 0
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if not self._pending:
+                    break
+                rows, self._pending = self._pending, []
+                self._writing = True
+            start = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = self._connect()
+                conn.executemany(
+                    f"INSERT INTO history ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+                )
+                written += len(rows)
+                if written >= PRUNE_EVERY:
+                    self._prune(conn)
+                    written = 0
+                conn.commit()
+                metrics.inc("anvesh_history_entries_total", len(rows))
+                metrics.observe("anvesh_history_write_seconds", time.perf_counter() - start)
+            except Exception as e:
+                print(f"Error logging search history: {e}")
+                metrics.inc("anvesh_errors_total", component="history")
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+        if conn is not None:
+            conn.close()
+
+    def pending(self) -> int:
+        """Entries queued for the writer"""
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued entries are written; False if that took longer than timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def close(self):
+        """Write what's queued and stop the writer thread"""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    # ---------- Reading ----------
+
+    def query(self,
+              text: Optional[str] = None,
+              folder: Optional[str] = None,
+              since: Optional[str] = None,
+              until: Optional[str] = None,
+              limit: int = 50,
+              offset: int = 0) -> Tuple[List[Dict], int]:
+        """A page of entries, newest first, and how many match in all.
+
+        text matches within the query and folder within any searched folder
+        (both case-insensitively); since and until are timestamps or dates
+        ("2025-11-28") compared as text, since inclusive and until exclusive.
+        """
+        self.flush(timeout=1)
+        conditions = []
+        params: list = []
+        if text:
+            conditions.append("query LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(text))
+        if folder:
+            conditions.append("folders LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(json.dumps(folder, ensure_ascii=False)[1:-1]))
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = self._connect()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM history {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM history {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        finally:
+            conn.close()
+        return [_entry(row) for row in rows], total
@@ -0,0 +1,741 @@
+"""
+Search Index Module for Anvesh
+Persistent on-disk inverted index over extracted document text. With
+dedup, a file identical to one already indexed copies that file's chunks
+and postings instead of being extracted and tokenized again
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import content_hash
+from trigrams import (TrigramQuery, decode_ids, decode_trigram_set, encode_ids, encode_trigram_set,
+                      term_query, text_trigrams)
+
+# A chunk is what an extractor yields: (location, line_number, text)
+Chunk = Tuple[str, Optional[int], str]
+
+TOKEN_RE = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    folder TEXT PRIMARY KEY,
+    built_at REAL
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    indexed_at REAL NOT NULL,
+    text_length INTEGER NOT NULL DEFAULT 0,
+    digest TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    location TEXT NOT NULL,
+    line_number INTEGER,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_file ON chunks(file_id);
+CREATE INDEX IF NOT EXISTS files_size ON files(size);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    PRIMARY KEY (term_id, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_chunk ON postings(chunk_id);
+CREATE TABLE IF NOT EXISTS trigram_postings (
+    trigram INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    file_ids BLOB NOT NULL,
+    PRIMARY KEY (trigram, block)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS file_trigrams (
+    file_id INTEGER PRIMARY KEY,
+    trigrams BLOB NOT NULL
+);
+"""
+
+# Bumped when the schema gains data that existing indexes must be migrated to
+INDEX_VERSION = 4
+
+# Trigram posting lists are split into blocks of 2**BLOCK_BITS file ids, so
+# updating one file rewrites small blobs instead of whole lists
+BLOCK_BITS = 10
+
+# Commit every N files while building so a crash loses little work
+COMMIT_EVERY = 200
+
+
+class IndexedFile(NamedTuple):
+    file_id: int
+    path: str
+    text_length: int  # Characters of stored text
+    mtime_ns: int
+    digest: Optional[str] = None  # Content digest, if the file was hashed (it has a known copy)
+
+
+class RankingCandidates(NamedTuple):
+    """Candidate files of a ranked search, and the corpus statistics for scoring them"""
+    files: List[IndexedFile]
+    possible_queries: Dict[int, List[int]]  # File id -> indexes of the queries it may contain (absent: any)
+    document_counts: List[Optional[int]]  # Per query: files that may contain it, None if unknown
+    total_files: int
+    average_length: float
+
+
+def normalize_folder(folder: str) -> str:
+    """Normalize a folder path the same way for storage and lookup"""
+    return os.path.normpath(os.path.abspath(folder))
+
+
+def _under_clause(folders: List[str], column: str = "f.path") -> Tuple[str, list]:
+    """SQL condition selecting paths located inside any of the folders"""
+    conditions = []
+    params = []
+    for folder in folders:
+        prefix = folder.rstrip(os.sep) + os.sep
+        conditions.append(f"substr({column}, 1, ?) = ?")
+        params.extend([len(prefix), prefix])
+    return "(" + " OR ".join(conditions or ["0"]) + ")", params
+
+
+class SearchIndex:
+    """Inverted indexes over extracted text: lowercased word terms to the chunks
+    that contain them, and trigrams to the files that contain them"""
+
+    def __init__(self, db_path: str, dedup: bool = False):
+        self.db_path = db_path
+        self.dedup = dedup
+        self._write_lock = threading.RLock()  # Re-entered when a build opens the first connection
+        self._build_thread = None
+        self._build_status = {"state": "idle"}
+        self._initialized = False
+        self._query_stats = {"queries": 0, "files_considered": 0, "candidate_files": 0}
+        self.commits = 0  # Bumped on every write, so readers can tell the index changed
+        # Trigram postings are batched per commit: (trigram, block) -> file ids
+        self._pending_postings: Dict[Tuple[int, int], List[int]] = {}
+        self._pending_files: Set[int] = set()
+        self._pending_conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection, creating (or migrating) the schema on first use"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < INDEX_VERSION:
+                with self._write_lock:
+                    if version < 2:
+                        self._add_missing_trigrams(conn)
+                    if version < 3:
+                        self._add_text_lengths(conn)
+                    if version < 4:
+                        self._add_digests(conn)
+                    conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+                    self._commit(conn)
+            self._initialized = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _add_text_lengths(self, conn: sqlite3.Connection):
+        """Record text lengths (used for ranking) of files indexed before they were stored"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+        if "text_length" not in columns:
+            conn.execute("ALTER TABLE files ADD COLUMN text_length INTEGER NOT NULL DEFAULT 0")
+        conn.execute(
+            "UPDATE files SET text_length = (SELECT COALESCE(SUM(length(text)), 0) FROM chunks WHERE file_id = files.id)"
+        )
+
+    def _add_digests(self, conn: sqlite3.Connection):
+        """Add the digest column (files are hashed when a copy of them is indexed)"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+        if "digest" not in columns:
+            conn.execute("ALTER TABLE files ADD COLUMN digest TEXT")
+
+    def _add_missing_trigrams(self, conn: sqlite3.Connection):
+        """Build trigram postings for files indexed before trigrams existed (from stored text)"""
+        missing = conn.execute(
+            "SELECT id FROM files WHERE id NOT IN (SELECT file_id FROM file_trigrams)"
+        ).fetchall()
+        for (file_id,) in missing:
+            texts = (text for (text,) in conn.execute("SELECT text FROM chunks WHERE file_id = ?", (file_id,)))
+            self._add_trigrams(conn, file_id, text_trigrams(texts))
+
+    # ---------- Writing ----------
+
+    def _delete_file(self, conn: sqlite3.Connection, path: str):
+        """Remove a file and its chunks/postings from the index"""
+        row = conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        file_id = row[0]
+        self._remove_trigrams(conn, file_id)
+        conn.execute("DELETE FROM postings WHERE chunk_id IN (SELECT id FROM chunks WHERE file_id = ?)", (file_id,))
+        conn.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+        conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _find_copy(self, conn: sqlite3.Connection, path: str, stat: os.stat_result) -> Tuple[Optional[Tuple[int, str]], Optional[str]]:
+        """((file id, path) of an indexed file with the same contents, or None; path's digest if it was hashed).
+
+        Only files of the same size are hashed, and only while unchanged since
+        they were indexed, so a copy's stored chunks are always current.
+        """
+        candidates = conn.execute(
+            "SELECT id, path, mtime_ns, digest FROM files WHERE size = ? AND path != ?", (stat.st_size, path)
+        ).fetchall()
+        if not candidates:
+            return None, None
+        digest = content_hash.digests.digest(path, stat.st_size, stat.st_mtime_ns)
+        if digest is None:
+            return None, None
+        for file_id, other, mtime_ns, other_digest in candidates:
+            if other_digest is None:
+                other_digest = content_hash.digests.digest(other, stat.st_size, mtime_ns)
+                if other_digest is None:
+                    continue  # Changed or gone since it was indexed
+                conn.execute("UPDATE files SET digest = ? WHERE id = ?", (other_digest, file_id))
+            elif other_digest == digest:
+                try:
+                    other_stat = os.stat(other)
+                except OSError:
+                    continue
+                if (other_stat.st_size, other_stat.st_mtime_ns) != (stat.st_size, mtime_ns):
+                    continue
+            if other_digest == digest:
+                return (file_id, other), digest
+        return None, digest
+
+    def _copy_file(self, conn: sqlite3.Connection, source: Tuple[int, str], path: str, stat: os.stat_result, digest: str):
+        """Index path as a copy of an indexed file with the same contents: its chunks, postings and trigrams"""
+        source_id, source_path = source
+        file_id = conn.execute(
+            "INSERT INTO files (path, name, size, mtime_ns, indexed_at, text_length, digest) "
+            "SELECT ?, ?, size, ?, ?, text_length, ? FROM files WHERE id = ?",
+            (path, os.path.basename(path), stat.st_mtime_ns, time.time(), digest, source_id)
+        ).lastrowid
+        rows = conn.execute("SELECT id, location, line_number, text FROM chunks WHERE file_id = ? ORDER BY id", (source_id,)).fetchall()
+        for chunk_id, location, line_number, text in rows:
+            if location.startswith(source_path):
+                location = path + location[len(source_path):]
+            copy_id = conn.execute(
+                "INSERT INTO chunks (file_id, location, line_number, text) VALUES (?, ?, ?, ?)",
+                (file_id, location, line_number, text)
+            ).lastrowid
+            conn.execute("INSERT INTO postings (term_id, chunk_id) SELECT term_id, ? FROM postings WHERE chunk_id = ?", (copy_id, chunk_id))
+        row = conn.execute("SELECT trigrams FROM file_trigrams WHERE file_id = ?", (source_id,)).fetchone()
+        self._add_trigrams(conn, file_id, decode_trigram_set(row[0]) if row else set())
+        content_hash.record_saved("index", stat.st_size)
+
+    def _index_file(self, conn: sqlite3.Connection, path: str, stat: os.stat_result, extract: Callable[[str], Iterable[Chunk]]):
+        """(Re)index a single file from its extracted chunks (or from an identical indexed file)"""
+        self._delete_file(conn, path)
+        digest = None
+        if self.dedup:
+            source, digest = self._find_copy(conn, path, stat)
+            if source is not None:
+                self._copy_file(conn, source, path, stat, digest)
+                return
+        cur = conn.execute(
+            "INSERT INTO files (path, name, size, mtime_ns, indexed_at, digest) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, os.path.basename(path), stat.st_size, stat.st_mtime_ns, time.time(), digest)
+        )
+        file_id = cur.lastrowid
+        texts = []
+        for location, line_number, text in extract(path):
+            if not text or not text.strip():
+                continue
+            texts.append(text)
+            chunk_id = conn.execute(
+                "INSERT INTO chunks (file_id, location, line_number, text) VALUES (?, ?, ?, ?)",
+                (file_id, location, line_number, text)
+            ).lastrowid
+            terms = [(term,) for term in set(TOKEN_RE.findall(text.lower()))]
+            conn.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)", terms)
+            conn.executemany(
+                "INSERT OR IGNORE INTO postings (term_id, chunk_id) SELECT id, ? FROM terms WHERE term = ?",
+                [(chunk_id, term) for (term,) in terms]
+            )
+        conn.execute("UPDATE files SET text_length = ? WHERE id = ?", (sum(len(text) for text in texts), file_id))
+        self._add_trigrams(conn, file_id, text_trigrams(texts))
+
+    def _add_trigrams(self, conn: sqlite3.Connection, file_id: int, trigrams: Set[int]):
+        """Queue a file for the posting lists of its trigrams (written by _commit)"""
+        if conn is not self._pending_conn:
+            # Anything queued on another connection was rolled back with it
+            self._pending_postings.clear()
+            self._pending_files.clear()
+            self._pending_conn = conn
+        block = file_id >> BLOCK_BITS
+        for trigram in trigrams:
+            self._pending_postings.setdefault((trigram, block), []).append(file_id)
+        self._pending_files.add(file_id)
+        conn.execute(
+            "INSERT OR REPLACE INTO file_trigrams (file_id, trigrams) VALUES (?, ?)",
+            (file_id, encode_trigram_set(trigrams))
+        )
+
+    def _flush_trigrams(self, conn: sqlite3.Connection):
+        """Merge queued files into the trigram posting lists, one write per list"""
+        if conn is not self._pending_conn:
+            return
+        for (trigram, block), file_ids in self._pending_postings.items():
+            row = conn.execute(
+                "SELECT file_ids FROM trigram_postings WHERE trigram = ? AND block = ?", (trigram, block)
+            ).fetchone()
+            ids = sorted(set(decode_ids(row[0])).union(file_ids)) if row else sorted(file_ids)
+            conn.execute(
+                "INSERT OR REPLACE INTO trigram_postings (trigram, block, file_ids) VALUES (?, ?, ?)",
+                (trigram, block, encode_ids(ids))
+            )
+        self._pending_postings.clear()
+        self._pending_files.clear()
+
+    def _commit(self, conn: sqlite3.Connection):
+        """Write queued trigram postings and commit (callers hold the write lock)"""
+        self._flush_trigrams(conn)
+        conn.commit()
+        self.commits += 1
+
+    def _remove_trigrams(self, conn: sqlite3.Connection, file_id: int):
+        """Take a file out of the posting lists of its trigrams"""
+        if conn is self._pending_conn and file_id in self._pending_files:
+            self._flush_trigrams(conn)
+        row = conn.execute("SELECT trigrams FROM file_trigrams WHERE file_id = ?", (file_id,)).fetchone()
+        if row is None:
+            return
+        block = file_id >> BLOCK_BITS
+        for trigram in decode_trigram_set(row[0]):
+            posting = conn.execute(
+                "SELECT file_ids FROM trigram_postings WHERE trigram = ? AND block = ?", (trigram, block)
+            ).fetchone()
+            if posting is None:
+                continue
+            ids = [i for i in decode_ids(posting[0]) if i != file_id]
+            if ids:
+                conn.execute(
+                    "UPDATE trigram_postings SET file_ids = ? WHERE trigram = ? AND block = ?",
+                    (encode_ids(ids), trigram, block)
+                )
+            else:
+                conn.execute("DELETE FROM trigram_postings WHERE trigram = ? AND block = ?", (trigram, block))
+        conn.execute("DELETE FROM file_trigrams WHERE file_id = ?", (file_id,))
+
+    def update_file(self, path: str, extract: Callable[[str], Iterable[Chunk]]) -> bool:
+        """Re-extract and reindex one file; returns False if it no longer exists"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.remove_path(path)
+            return False
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                self._index_file(conn, path, stat, extract)
+                self._commit(conn)
+            finally:
+                conn.close()
+        return True
+
+    def remove_path(self, path: str):
+        """Drop a file, or every file below a directory, from the index"""
+        path = normalize_folder(path)
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                self._delete_file(conn, path)
+                under, params = _under_clause([path], "path")
+                for (file_path,) in conn.execute(f"SELECT path FROM files WHERE {under}", params).fetchall():
+                    self._delete_file(conn, file_path)
+                self._commit(conn)
+            finally:
+                conn.close()
+
+    def build(self, folders: List[str], list_files: Callable[[str], List[str]], extract: Callable[[str], Iterable[Chunk]]):
+        """Index (or incrementally refresh) folders; unchanged files are skipped"""
+        folders = [normalize_folder(f) for f in folders]
+        self._build_status = {
+            "state": "building",
+            "folders": folders,
+            "started_at": time.time(),
+            "files_total": 0,
+            "files_processed": 0,
+            "files_indexed": 0,
+            "files_removed": 0
+        }
+        try:
+            with self._write_lock:
+                conn = self._connect()
+                try:
+                    for folder in folders:
+                        self._build_folder(conn, folder, list_files, extract)
+                        conn.execute(
+                            "INSERT OR REPLACE INTO roots (folder, built_at) VALUES (?, ?)",
+                            (folder, time.time())
+                        )
+                        self._commit(conn)
+                finally:
+                    conn.close()
+            self._build_status["state"] = "idle"
+        except Exception as e:
+            print(f"Error building search index: {e}")
+            self._build_status["state"] = "error"
+            self._build_status["error"] = str(e)
+        self._build_status["finished_at"] = time.time()
+
+    def _build_folder(self, conn: sqlite3.Connection, folder: str, list_files: Callable[[str], List[str]], extract: Callable[[str], Iterable[Chunk]]):
+        """Index all supported files below one folder"""
+        status = self._build_status
+        under, params = _under_clause([folder], "path")
+        known = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in conn.execute(f"SELECT path, size, mtime_ns FROM files WHERE {under}", params)
+        }
+        file_paths = list_files(folder)
+        status["files_total"] += len(file_paths)
+        seen = set()
+        pending = 0
+        for path in file_paths:
+            status["files_processed"] += 1
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            self._index_file(conn, path, stat, extract)
+            status["files_indexed"] += 1
+            pending += 1
+            if pending >= COMMIT_EVERY:
+                self._commit(conn)
+                pending = 0
+        for path in known:
+            if path not in seen:
+                self._delete_file(conn, path)
+                status["files_removed"] += 1
+
+    def start_build(self, folders: List[str], list_files: Callable[[str], List[str]], extract: Callable[[str], Iterable[Chunk]]) -> bool:
+        """Run build() on a background thread; returns False if a build is already running"""
+        if self.is_building():
+            return False
+        self._build_status = {"state": "building", "folders": [normalize_folder(f) for f in folders]}
+        self._build_thread = threading.Thread(target=self.build, args=(folders, list_files, extract), daemon=True)
+        self._build_thread.start()
+        return True
+
+    def is_building(self) -> bool:
+        return self._build_thread is not None and self._build_thread.is_alive()
+
+    def drop(self, folder: Optional[str] = None):
+        """Drop the whole index, or only the files under one indexed folder"""
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                if folder is None:
+                    conn.executescript(
+                        "DELETE FROM postings; DELETE FROM chunks; DELETE FROM files; DELETE FROM terms; DELETE FROM roots; "
+                        "DELETE FROM trigram_postings; DELETE FROM file_trigrams;"
+                    )
+                    self._commit(conn)
+                    conn.execute("VACUUM")
+                else:
+                    folder = normalize_folder(folder)
+                    under, params = _under_clause([folder], "path")
+                    for (path,) in conn.execute(f"SELECT path FROM files WHERE {under}", params).fetchall():
+                        self._delete_file(conn, path)
+                    conn.execute("DELETE FROM roots WHERE folder = ?", (folder,))
+                    self._commit(conn)
+            finally:
+                conn.close()
+
+    # ---------- Reading ----------
+
+    def roots(self) -> List[str]:
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT folder FROM roots ORDER BY folder")]
+        finally:
+            conn.close()
+
+    def is_indexed_path(self, path: str) -> bool:
+        """True if path lies inside an indexed root (whether or not a build is running)"""
+        path = normalize_folder(path)
+        return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in self.roots())
+
+    def covers(self, folders: List[str]) -> bool:
+        """True if every folder lies inside an indexed root and no build is running"""
+        if self.is_building() or not folders:
+            return False
+        return all(self.is_indexed_path(folder) for folder in folders)
+
+    def count_files(self, folders: List[str]) -> int:
+        conn = self._connect()
+        try:
+            under, params = _under_clause([normalize_folder(f) for f in folders])
+            return conn.execute(f"SELECT COUNT(*) FROM files f WHERE {under}", params).fetchone()[0]
+        finally:
+            conn.close()
+
+    def file_paths(self, folders: List[str]) -> Iterator[str]:
+        """All indexed file paths inside the folders"""
+        conn = self._connect()
+        try:
+            under, params = _under_clause([normalize_folder(f) for f in folders])
+            for (path,) in conn.execute(f"SELECT path FROM files f WHERE {under} ORDER BY path", params):
+                yield path
+        finally:
+            conn.close()
+
+    def content_digests(self, paths: List[str]) -> Dict[str, str]:
+        """Digests of those paths that were hashed (those with a known copy)"""
+        conn = self._connect()
+        try:
+            digests = {}
+            for start in range(0, len(paths), 500):
+                batch = paths[start:start + 500]
+                digests.update(conn.execute(
+                    f"SELECT path, digest FROM files WHERE digest IS NOT NULL AND path IN ({', '.join('?' * len(batch))})", batch
+                ).fetchall())
+            return digests
+        finally:
+            conn.close()
+
+    def copies(self, folders: List[str], digests: Iterable[str]) -> Dict[str, List[str]]:
+        """Digest -> every indexed path inside the folders with those contents, sorted"""
+        digests = list(set(digests))
+        under, params = _under_clause([normalize_folder(f) for f in folders])
+        conn = self._connect()
+        try:
+            found: Dict[str, List[str]] = {}
+            for start in range(0, len(digests), 500):
+                batch = digests[start:start + 500]
+                for digest, path in conn.execute(
+                    f"SELECT f.digest, f.path FROM files f WHERE {under} AND f.digest IN ({', '.join('?' * len(batch))}) ORDER BY f.path",
+                    params + batch
+                ):
+                    found.setdefault(digest, []).append(path)
+            return found
+        finally:
+            conn.close()
+
+    def _term_condition(self, token: str, position: str) -> Tuple[str, list]:
+        """Vocabulary condition for a query token given where it sits in the query"""
+        if position == "only":
+            return "instr(t.term, ?) > 0", [token]
+        if position == "first":
+            # Followed by a separator in the query, so it must end a term
+            return "substr(t.term, ?) = ?", [-len(token), token]
+        if position == "last":
+            # Preceded by a separator, so it must start a term
+            return "t.term >= ? AND t.term < ?", [token, token + "\U0010ffff"]
+        return "t.term = ?", [token]
+
+    def _query_chunks(self, query: str) -> Optional[Tuple[str, list]]:
+        """SQL selecting the ids of chunks that may contain query, or None if it has no tokens"""
+        tokens = TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return None
+        subqueries = []
+        params = []
+        for i, token in enumerate(tokens):
+            if len(tokens) == 1:
+                position = "only"
+            elif i == 0:
+                position = "first"
+            elif i == len(tokens) - 1:
+                position = "last"
+            else:
+                position = "middle"
+            condition, condition_params = self._term_condition(token, position)
+            subqueries.append(f"SELECT p.chunk_id FROM terms t JOIN postings p ON p.term_id = t.id WHERE {condition}")
+            params.extend(condition_params)
+        return " INTERSECT ".join(subqueries), params
+
+    def _trigram_files(self, conn: sqlite3.Connection, query: TrigramQuery, cache: Dict[int, Set[int]]) -> Set[int]:
+        """Ids of files satisfying a (non-empty) trigram query"""
+        if isinstance(query, int):
+            if query not in cache:
+                ids = set()
+                for (data,) in conn.execute("SELECT file_ids FROM trigram_postings WHERE trigram = ?", (query,)):
+                    ids.update(decode_ids(data))
+                cache[query] = ids
+            return cache[query]
+        op, parts = query
+        if op == "or":
+            return set().union(*(self._trigram_files(conn, part, cache) for part in parts))
+        result = None
+        for part in parts:
+            ids = self._trigram_files(conn, part, cache)
+            result = set(ids) if result is None else result & ids
+            if not result:
+                break
+        return result
+
+    def _file_chunks(self, conn: sqlite3.Connection, folders: List[str], file_ids: Set[int]) -> Iterator[Tuple[str, List[Chunk]]]:
+        """Yield (file_path, chunks) for the given files inside the folders, by path"""
+        under, params = _under_clause([normalize_folder(f) for f in folders])
+        files = conn.execute(f"SELECT f.id, f.path FROM files f WHERE {under} ORDER BY f.path", params).fetchall()
+        self._query_stats["files_considered"] += len(files)
+        for file_id, path in files:
+            if file_id not in file_ids:
+                continue
+            self._query_stats["candidate_files"] += 1
+            chunks = self._read_chunks(conn, file_id)
+            if chunks:
+                yield path, chunks
+
+    def _read_chunks(self, conn: sqlite3.Connection, file_id: int) -> List[Chunk]:
+        rows = conn.execute("SELECT location, line_number, text FROM chunks WHERE file_id = ? ORDER BY id", (file_id,))
+        return [tuple(row) for row in rows]
+
+    def file_chunks(self, file_id: int) -> List[Chunk]:
+        """Stored chunks of one indexed file"""
+        conn = self._connect()
+        try:
+            return self._read_chunks(conn, file_id)
+        finally:
+            conn.close()
+
+    def ranking_candidates(self,
+                           folders: List[str],
+                           queries: List[str],
+                           mode: str = "substring",
+                           case_sensitive: bool = False,
+                           include: Optional[Callable[[str], bool]] = None) -> RankingCandidates:
+        """Files that may match any of the queries, with the statistics ranking needs.
+
+        Files are narrowed down by trigrams as in candidates(); if any query has
+        no usable trigrams every file is a candidate. include(path) adds files
+        whatever their text (e.g. those whose name matches).
+        """
+        under, params = _under_clause([normalize_folder(f) for f in folders])
+        conn = self._connect()
+        try:
+            in_scope = [
+                IndexedFile(*row) for row in conn.execute(
+                    f"SELECT f.id, f.path, f.text_length, f.mtime_ns, f.digest FROM files f WHERE {under} ORDER BY f.path", params
+                )
+            ]
+            cache = {}
+            per_query = []
+            for query in queries:
+                trigram_query = term_query(query, mode, case_sensitive)
+                per_query.append(None if trigram_query is None else self._trigram_files(conn, trigram_query, cache))
+        finally:
+            conn.close()
+
+        self._query_stats["queries"] += 1
+        self._query_stats["files_considered"] += len(in_scope)
+        if per_query and all(ids is not None for ids in per_query):
+            matching = set().union(*per_query)
+            files = [f for f in in_scope if f.file_id in matching or (include is not None and include(f.path))]
+        else:
+            files = in_scope
+        self._query_stats["candidate_files"] += len(files)
+        possible_queries = {}
+        if any(ids is not None for ids in per_query):
+            for f in files:
+                possible_queries[f.file_id] = [i for i, ids in enumerate(per_query) if ids is None or f.file_id in ids]
+        scope_ids = {f.file_id for f in in_scope}
+        return RankingCandidates(
+            files=files,
+            possible_queries=possible_queries,
+            document_counts=[None if ids is None else len(ids & scope_ids) for ids in per_query],
+            total_files=len(in_scope),
+            average_length=sum(f.text_length for f in in_scope) / len(in_scope) if in_scope else 0.0
+        )
+
+    def candidates(self, folders: List[str], queries: List[str], mode: str = "substring", case_sensitive: bool = False) -> Iterator[Tuple[str, List[Chunk]]]:
+        """Yield (file_path, chunks) for chunks that may contain any of the queries.
+
+        Candidates are a superset of the real matches; callers verify them with
+        the same matcher used for live scans, which handles case sensitivity.
+        Files are narrowed down by the trigrams every match must contain; queries
+        with no usable trigrams (under three characters, or regexes without
+        literal text) fall back to the word index, or to all stored text.
+        """
+        self._query_stats["queries"] += 1
+        trigram_queries = [term_query(query, mode, case_sensitive) for query in queries]
+        if trigram_queries and all(query is not None for query in trigram_queries):
+            conn = self._connect()
+            try:
+                cache = {}
+                file_ids = set().union(*(self._trigram_files(conn, query, cache) for query in trigram_queries))
+                yield from self._file_chunks(conn, folders, file_ids)
+            finally:
+                conn.close()
+            return
+        
+        # Regexes can't be looked up by word, nor can non-ASCII text unless it's
+        # lowercased exactly the way the index does it
+        if mode == "regex" or ((case_sensitive or mode != "substring") and not all(query.isascii() for query in queries)):
+            lookups = [None]
+        else:
+            lookups = [self._query_chunks(query) for query in queries]
+        under, params = _under_clause([normalize_folder(f) for f in folders])
+        if all(lookups):
+            if len(lookups) == 1:
+                chunk_sql, chunk_params = lookups[0]
+            else:
+                # SQLite can't parenthesize compound selects, so wrap each INTERSECT
+                chunk_sql = " UNION ".join(f"SELECT chunk_id FROM ({sql})" for sql, _ in lookups)
+                chunk_params = [param for _, lookup_params in lookups for param in lookup_params]
+            sql = (
+                "SELECT f.path, c.location, c.line_number, c.text FROM chunks c JOIN files f ON f.id = c.file_id "
+                f"WHERE c.id IN ({chunk_sql}) AND {under} ORDER BY f.path, c.id"
+            )
+            params = chunk_params + params
+        else:
+            # A query with no word characters to look up (e.g. punctuation only): scan stored text
+            sql = (
+                "SELECT f.path, c.location, c.line_number, c.text FROM chunks c JOIN files f ON f.id = c.file_id "
+                f"WHERE {under} ORDER BY f.path, c.id"
+            )
+        conn = self._connect()
+        try:
+            current_path = None
+            current_chunks = []
+            for path, location, line_number, text in conn.execute(sql, params):
+                if path != current_path:
+                    if current_chunks:
+                        yield current_path, current_chunks
+                    current_path = path
+                    current_chunks = []
+                current_chunks.append((location, line_number, text))
+            if current_chunks:
+                yield current_path, current_chunks
+        finally:
+            conn.close()
+
+    def get_status(self) -> Dict:
+        """Index size and build progress"""
+        status = dict(self._build_status)
+        conn = self._connect()
+        try:
+            status["roots"] = [
+                {"folder": folder, "built_at": built_at}
+                for folder, built_at in conn.execute("SELECT folder, built_at FROM roots ORDER BY folder")
+            ]
+            status["files"] = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            status["chunks"] = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            status["terms"] = conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+            status["trigrams"] = conn.execute("SELECT COUNT(DISTINCT trigram) FROM trigram_postings").fetchone()[0]
+        finally:
+            conn.close()
+        status["queries"] = dict(self._query_stats)
+        status["db_path"] = self.db_path
+        status["db_size"] = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+        return status
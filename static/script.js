@@ -20,7 +20,7 @@ document.addEventListener('DOMContentLoaded', function() {
     let folders = [];
     let searchStartTime = null;
     let timeInterval = null;
-    let currentEventSource = null;
+    let currentSearchController = null;
 
     // Add floating particles animation
     createParticles();
@@ -164,6 +164,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const exactMatch = document.getElementById('exactMatch').checked;
         const caseSensitive = document.getElementById('caseSensitive').checked;
         const searchFilenames = document.getElementById('searchFilenames').checked;
+        const collapseDuplicates = document.getElementById('collapseDuplicates').checked;
 
         if (!query) {
             showAlert('Please enter a search query.', 'warning');
@@ -175,15 +176,18 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
-        // Stop any existing search
-        if (currentEventSource) {
-            currentEventSource.close();
+        // Stop any existing search (closing the stream cancels it on the server)
+        if (currentSearchController) {
+            currentSearchController.abort();
         }
+        const searchController = new AbortController();
+        currentSearchController = searchController;
 
         // Show loading state
         setLoadingState(true);
         resultsSection.classList.remove('d-none');
         resultsContainer.innerHTML = '';
+        resultElements.clear();
         resultsCount.textContent = '0';
         searchProgress.style.display = 'block';
         searchProgress.querySelector('.progress-bar').style.width = '0%';
@@ -205,18 +209,23 @@ document.addEventListener('DOMContentLoaded', function() {
                     folders: folders,
                     exact_match: exactMatch,
                     case_sensitive: caseSensitive,
-                    search_filenames: searchFilenames
-                })
+                    search_filenames: searchFilenames,
+                    collapse_duplicates: collapseDuplicates
+                }),
+                signal: searchController.signal
             });
 
             if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
+                // e.g. 400 for an invalid regular expression
+                const error = await response.json().catch(() => ({}));
+                throw new Error(error.detail || `HTTP error! status: ${response.status}`);
             }
 
             const reader = response.body.getReader();
             const decoder = new TextDecoder();
             let buffer = '';
             let resultCount = 0;
+            let skippedCount = 0;
 
             while (true) {
                 const { done, value } = await reader.read();
@@ -236,15 +245,34 @@ document.addEventListener('DOMContentLoaded', function() {
                             } else if (data.type === 'progress') {
                                 const progress = data.progress || 0;
                                 searchProgress.querySelector('.progress-bar').style.width = progress + '%';
-                                searchStatus.textContent = `Processing ${data.files_processed}/${data.total_files} files... (${data.results_found || 0} results found)`;
-                            } else if (data.type === 'result') {
-                                resultCount++;
-                                displaySingleResult(data.data, query);
+                                // While folders are still being walked the total is an estimate
+                                const total = data.estimated ? `~${data.total_files}` : data.total_files;
+                                searchStatus.textContent = `Processing ${data.files_processed}/${total} files... (${data.results_found || 0} results found)`;
+                            } else if (data.type === 'results') {
+                                // Matching files arrive in batches
+                                for (const fileResult of data.data) {
+                                    // A collapsed copy of a file already shown comes without matches
+                                    const original = fileResult.duplicate_of && fileResult.matches.length === 0
+                                        ? resultElements.get(fileResult.duplicate_of) : null;
+                                    if (original) {
+                                        addDuplicatePath(original, fileResult.file_path);
+                                        continue;
+                                    }
+                                    resultCount++;
+                                    displaySingleResult(fileResult, query);
+                                }
                                 resultsCount.textContent = resultCount;
+                            } else if (data.type === 'skipped') {
+                                // Unreadable, oversized or too slow to search
+                                skippedCount++;
+                                console.warn(`Skipped ${data.file_path}: ${data.reason}`);
                             } else if (data.type === 'complete') {
                                 stopTimeTracking();
                                 searchProgress.style.display = 'none';
-                                searchStatus.textContent = `Search completed! Found ${data.total_results || resultCount} result(s) in ${formatTime((Date.now() - searchStartTime) / 1000)}`;
+                                const verb = data.cancelled ? 'Search cancelled' : 'Search completed!';
+                                searchStatus.textContent = `${verb} Found ${data.total_results || resultCount} result(s) in ${formatTime((Date.now() - searchStartTime) / 1000)}` +
+                                    (skippedCount ? ` (${skippedCount} file(s) skipped)` : '') +
+                                    (data.duplicates ? ` (${data.duplicates.files} identical file(s) searched once)` : '');
                                 setLoadingState(false);
                                 
                                 // Refresh history
@@ -258,6 +286,10 @@ document.addEventListener('DOMContentLoaded', function() {
             }
 
         } catch (error) {
+            if (error.name === 'AbortError') {
+                // Replaced by a newer search
+                return;
+            }
             console.error('Search error:', error);
             showAlert(`Error performing search: ${error.message}`, 'danger');
             stopTimeTracking();
@@ -313,6 +345,25 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Result element by file path, so copies of a file can be listed with it
+    const resultElements = new Map();
+
+    function addDuplicatePath(fileDiv, filePath) {
+        let list = fileDiv.querySelector('.duplicate-paths');
+        if (!list) {
+            list = document.createElement('div');
+            list.className = 'duplicate-paths small text-muted mb-2';
+            list.innerHTML = '<i class="fas fa-clone me-1"></i>Also at:';
+            fileDiv.querySelector('.matches-container').before(list);
+        }
+        const pathEl = document.createElement('div');
+        pathEl.className = 'ms-3';
+        pathEl.style.cursor = 'pointer';
+        pathEl.textContent = filePath;
+        pathEl.addEventListener('click', () => openFile(filePath));
+        list.appendChild(pathEl);
+    }
+
     function displaySingleResult(fileResult, query) {
         const fileDiv = document.createElement('div');
         fileDiv.className = 'result-item';
@@ -328,6 +379,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     <i class="fas fa-hashtag me-1"></i>${fileResult.total_occurrences} occurrence(s)
                 </span>
             </div>
+            ${fileResult.duplicate_of ? `
+                <div class="small text-muted mb-2">
+                    <i class="fas fa-clone me-1"></i>Same contents as ${escapeHtml(fileResult.duplicate_of)}
+                </div>
+            ` : ''}
             <div class="matches-container">
                 ${fileResult.matches.map((match, matchIndex) => `
                     <div class="match-item clickable-match" 
@@ -364,6 +420,9 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         });
         
+        (fileResult.duplicates || []).forEach(path => addDuplicatePath(fileDiv, path));
+        resultElements.set(fileResult.file_path, fileDiv);
+        
         resultsContainer.appendChild(fileDiv);
         
         // Smooth scroll to new result
@@ -459,7 +518,8 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function loadSearchHistory() {
-        fetch(`${API_BASE}/api/history`)
+        // Only the newest entries; /api/history pages through the rest
+        fetch(`${API_BASE}/api/history?limit=50`)
             .then(response => response.json())
             .then(data => {
                 displayHistory(data.history);
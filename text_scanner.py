@@ -0,0 +1,125 @@
+"""
+Text Scanner Module for Anvesh
+Memory-mapped search of plain text files of any size
+"""
+import codecs
+import mmap
+import os
+from typing import Iterator, Tuple
+
+# Bytes searched per step; memory use stays around this regardless of file size
+BLOCK_SIZE = 8 * 1024 * 1024
+
+# Lines longer than this are previewed around the first hit instead of decoded whole
+MAX_LINE_PREVIEW = 64 * 1024
+PREVIEW_BEFORE = 100
+PREVIEW_AFTER = 400
+
+
+def detect_encoding(head: bytes) -> Tuple[str, int]:
+    """Return (encoding, bytes to skip) from a file's first bytes"""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig", len(codecs.BOM_UTF8)
+    if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16", 0
+    return "utf-8", 0
+
+
+def scan_text_file(file_path: str, query: str, case_sensitive: bool) -> Iterator[Tuple[int, str, int]]:
+    """Yield (line_number, line, occurrences) for every line containing query.
+
+    UTF-8 files (with or without BOM) are memory-mapped and searched as raw
+    bytes; only lines with hits are located and decoded. Case-insensitive
+    search takes this path for ASCII queries by lowercasing one block at a
+    time. UTF-16 files and non-ASCII case-insensitive queries are streamed
+    line by line instead. Either way memory use does not grow with file size.
+    Lines end at \\n (so \\r\\n too), or at \\r in files with old Mac line
+    endings, as when reading the file as text.
+    """
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        encoding, start = detect_encoding(f.read(4))
+        # Queries spanning lines can't match line by line; let the line scanner say so
+        if not query or "\n" in query or "\r" in query or encoding == "utf-16" or not (case_sensitive or query.isascii()):
+            yield from _scan_lines(file_path, query, case_sensitive, encoding)
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _scan_mmap(mm, start, query, case_sensitive, _line_separator(mm, start))
+
+
+def _scan_lines(file_path: str, query: str, case_sensitive: bool, encoding: str) -> Iterator[Tuple[int, str, int]]:
+    """Decode and match line by line (streaming, but decodes every line)"""
+    search_query = query if case_sensitive else query.lower()
+    with open(file_path, "r", encoding=encoding, errors="ignore") as f:
+        for line_num, line in enumerate(f, 1):
+            search_line = line if case_sensitive else line.lower()
+            if search_query in search_line:
+                yield line_num, line, search_line.count(search_query)
+
+
+def _line_separator(mm: mmap.mmap, start: int) -> bytes:
+    """What ends a line: \\r for old Mac line endings (a first block with \\r but no \\n), else \\n"""
+    first_block = mm[start:start + BLOCK_SIZE]
+    return b"\r" if b"\n" not in first_block and b"\r" in first_block else b"\n"
+
+
+def _count_newlines(mm: mmap.mmap, start: int, end: int, newline: bytes = b"\n") -> int:
+    count = 0
+    while start < end:
+        stop = min(end, start + BLOCK_SIZE)
+        count += mm[start:stop].count(newline)
+        start = stop
+    return count
+
+
+def _preview(mm: mmap.mmap, line_start: int, line_end: int, first_hit: int) -> str:
+    if line_end - line_start <= MAX_LINE_PREVIEW:
+        return mm[line_start:line_end].decode("utf-8", errors="ignore")
+    # Very long line: show the text around the first hit
+    window_start = max(line_start, first_hit - PREVIEW_BEFORE)
+    window_end = min(line_end, first_hit + PREVIEW_AFTER)
+    return mm[window_start:window_end].decode("utf-8", errors="ignore")
+
+
+def _scan_mmap(mm: mmap.mmap, start: int, query: str, case_sensitive: bool,
+               newline: bytes = b"\n") -> Iterator[Tuple[int, str, int]]:
+    needle = query.encode("utf-8")
+    if not case_sensitive:
+        needle = needle.lower()
+    size = len(mm)
+    line_number = 1
+    counted_to = start  # newlines before this offset are included in line_number
+    pos = start  # next offset where a (non-overlapping) match may start
+    current = None  # [line_start, line_end, line_number, occurrences, first_hit]
+
+    block_start = start
+    while block_start < size:
+        # Overlap blocks by len(needle) - 1 so matches spanning a boundary are found
+        block_end = min(size, block_start + BLOCK_SIZE + len(needle) - 1)
+        block = mm[block_start:block_end]
+        if not case_sensitive:
+            block = block.lower()
+
+        i = block.find(needle, max(pos, block_start) - block_start)
+        while i != -1:
+            hit = block_start + i
+            if current and hit < current[1]:
+                current[3] += 1
+            else:
+                if current:
+                    yield current[2], _preview(mm, current[0], current[1], current[4]), current[3]
+                line_start = mm.rfind(newline, start, hit) + 1 or start
+                line_end = mm.find(newline, hit)
+                if line_end == -1:
+                    line_end = size
+                line_number += _count_newlines(mm, counted_to, line_start, newline)
+                counted_to = line_start
+                current = [line_start, line_end, line_number, 1, hit]
+            pos = hit + len(needle)
+            i = block.find(needle, pos - block_start)
+        block_start += BLOCK_SIZE
+
+    if current:
+        yield current[2], _preview(mm, current[0], current[1], current[4]), current[3]
@@ -0,0 +1,175 @@
+"""
+Trigrams Module for Anvesh
+Trigram extraction, compact posting lists and the trigram queries that
+substring and regex searches must satisfy (in the style of code search engines)
+"""
+import re
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+from typing import Iterable, List, Set, Union
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# A trigram query: None matches every file, an int is one trigram that must be
+# present, ("and", [...]) / ("or", [...]) combine sub-queries
+TrigramQuery = Union[None, int, tuple]
+
+# Letters that case-insensitive regexes match against non-ASCII characters
+# (e.g. "k" matches the Kelvin sign), so their trigrams can't be trusted
+UNSAFE_IGNORECASE = set("iks")
+
+
+def _byte_trigrams(data: bytes) -> Set[int]:
+    return {int.from_bytes(data[i:i + 3], "big") for i in range(len(data) - 2)}
+
+
+def text_trigrams(texts: Iterable[str]) -> Set[int]:
+    """Trigrams (of UTF-8 bytes, packed into 24-bit ints) of the lowercased texts, each text on its own"""
+    distinct = set()
+    for text in texts:
+        distinct.update(_byte_trigrams(text.lower().encode("utf-8")))
+    return distinct
+
+
+# ---------- Posting lists ----------
+
+def encode_ids(ids: List[int]) -> bytes:
+    """Sorted integers as delta-encoded varints"""
+    deltas = [value - previous for previous, value in zip([0] + ids, ids)]
+    if not deltas or max(deltas) < 0x80:
+        return bytes(deltas)  # Dense lists: one byte per id
+    out = bytearray()
+    for delta in deltas:
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_ids(data: bytes) -> List[int]:
+    if not data or max(data) < 0x80:
+        return list(accumulate(data))
+    ids = []
+    value = 0
+    delta = 0
+    shift = 0
+    for byte in data:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        value += delta
+        ids.append(value)
+        delta = 0
+        shift = 0
+    return ids
+
+
+def encode_trigram_set(trigrams: Set[int]) -> bytes:
+    """A file's trigrams, stored so they can be removed from the postings later"""
+    values = array("I", sorted(trigrams))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return zlib.compress(values.tobytes())
+
+
+def decode_trigram_set(data: bytes) -> List[int]:
+    values = array("I")
+    values.frombytes(zlib.decompress(data))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
+
+
+# ---------- Queries ----------
+
+def _and(parts: List[TrigramQuery]) -> TrigramQuery:
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    return ("and", parts)
+
+
+def _or(parts: List[TrigramQuery]) -> TrigramQuery:
+    if not parts or any(part is None for part in parts):
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    return ("or", parts)
+
+
+def literal_query(text: str, exact_lower: bool, ignore_case: bool = False) -> TrigramQuery:
+    """Trigrams a chunk must contain to contain text.
+
+    exact_lower means the matcher compares text.lower() with the lowercased
+    chunk, exactly as the index does, so every trigram can be used. Otherwise
+    only ASCII runs are used (lowercasing them is the same in any context),
+    leaving out letters that case-insensitive regexes match against non-ASCII.
+    """
+    if exact_lower:
+        runs = [text.lower().encode("utf-8")]
+    else:
+        runs = []
+        current = []
+        for ch in text:
+            if ch.isascii() and not (ignore_case and ch.lower() in UNSAFE_IGNORECASE):
+                current.append(ch.lower())
+            else:
+                runs.append("".join(current).encode("ascii"))
+                current = []
+        runs.append("".join(current).encode("ascii"))
+    return _and(sorted(set().union(*(_byte_trigrams(run) for run in runs))))
+
+
+def _regex_query(parsed) -> TrigramQuery:
+    """Trigrams required by a parsed regex (literal runs that every match contains)"""
+    parts = []
+    run = []
+
+    def flush():
+        if run:
+            parts.append(literal_query("".join(run), exact_lower=False, ignore_case=True))
+            run.clear()
+
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            run.append(chr(av))
+        elif op == sre_parse.AT:
+            continue  # Anchors match no characters, so literals around them stay adjacent
+        elif op == sre_parse.SUBPATTERN:
+            flush()
+            parts.append(_regex_query(av[3]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)):
+            flush()
+            if av[0] >= 1:
+                parts.append(_regex_query(av[2]))
+        elif op == sre_parse.BRANCH:
+            flush()
+            parts.append(_or([_regex_query(branch) for branch in av[1]]))
+        elif op == getattr(sre_parse, "ATOMIC_GROUP", None):
+            flush()
+            parts.append(_regex_query(av))
+        else:
+            flush()
+    flush()
+    return _and(parts)
+
+
+def term_query(term: str, mode: str, case_sensitive: bool) -> TrigramQuery:
+    """Trigram query for one search term in a match mode (see matchers.MATCH_MODES)"""
+    if mode == "regex":
+        try:
+            return _regex_query(sre_parse.parse(term))
+        except re.error:
+            return None
+    if mode == "substring":
+        return literal_query(term, exact_lower=not case_sensitive)
+    return literal_query(term, exact_lower=False, ignore_case=not case_sensitive)